@@ -5,7 +5,9 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from backend.api.config import settings
 from backend.api.database import connect, disconnect
-from backend.api.routes import counties, export, geojson, search, specialties, zipcodes
+from backend.api.routes import (
+    counties, export, geojson, scenarios, search, specialties, zipcodes,
+)
 
 
 @asynccontextmanager
@@ -35,6 +37,7 @@ app.include_router(zipcodes.router)
 app.include_router(search.router)
 app.include_router(export.router)
 app.include_router(geojson.router)
+app.include_router(scenarios.router)
 
 
 @app.get("/")
@@ -86,3 +86,29 @@ class GeoJSONFeature(BaseModel):
 class GeoJSONFeatureCollection(BaseModel):
     type: str = "FeatureCollection"
     features: list[GeoJSONFeature]
+
+
+# --- Weighting scenarios ---
+
+class ScenarioGeography(BaseModel):
+    geo_id: str
+    dearth_score: float
+    dearth_label: str
+    baseline_score: float
+    baseline_label: str
+
+
+class ScenarioResult(BaseModel):
+    weights: dict[str, float]
+    baseline_weights: dict[str, float]
+    geo_type: str
+    specialty: str | None
+    rows: int
+    labels: dict[str, int]
+    baseline_labels: dict[str, int]
+    label_changes: int
+    worse: int
+    better: int
+    mean_abs_shift: float
+    max_abs_shift: float
+    geographies: list[ScenarioGeography]  # only when a specialty is given
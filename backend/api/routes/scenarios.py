@@ -0,0 +1,73 @@
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Query
+
+from backend.api.database import database
+from backend.api.models.schemas import ScenarioGeography, ScenarioResult
+from backend.etl import scoring
+from backend.etl.scenarios import ScenarioEngine
+
+router = APIRouter(prefix="/api/scenarios", tags=["scenarios"])
+
+# Metrics are loaded and ranked once per process; each request only
+# re-weights them (see backend.etl.scenarios).
+_engine: ScenarioEngine | None = None
+_engine_lock = asyncio.Lock()
+
+
+def _build_engine(rows) -> ScenarioEngine:
+    return ScenarioEngine(scoring.metrics_from_rows([tuple(r._mapping.values()) for r in rows]))
+
+
+async def _get_engine(refresh: bool) -> ScenarioEngine:
+    global _engine
+    async with _engine_lock:
+        if _engine is None or refresh:
+            rows = await database.fetch_all(scoring.METRICS_QUERY)
+            _engine = await asyncio.to_thread(_build_engine, rows)
+    return _engine
+
+
+@router.get("", response_model=ScenarioResult)
+async def run_scenario(
+    weights: str = Query(..., description='Component weights, e.g. "density=0.5,drivetime=0.5"'),
+    geo_type: str = Query("county", pattern="^(county|zipcode)$"),
+    specialty: str | None = Query(None, description="Specialty code; also returns per-geography scores"),
+    refresh: bool = Query(False, description="Reload metrics from the database first"),
+):
+    try:
+        weight_vector = scoring.parse_weights(weights)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    engine = await _get_engine(refresh)
+    mask = engine.select(geo_type, specialty)
+    summary = engine.compare(weight_vector, mask)
+
+    geographies = []
+    if specialty:
+        dearth, label = engine.evaluate(weight_vector, mask)
+        geographies = sorted(
+            (
+                ScenarioGeography(
+                    geo_id=geo_id,
+                    dearth_score=round(float(score), 2),
+                    dearth_label=lab,
+                    baseline_score=round(float(base), 2),
+                    baseline_label=base_lab,
+                )
+                for geo_id, score, lab, base, base_lab in zip(
+                    engine.geo_id[mask], dearth, label,
+                    engine.baseline_score[mask], engine.baseline_label[mask],
+                )
+            ),
+            key=lambda g: g.dearth_score,
+            reverse=True,
+        )
+
+    return ScenarioResult(
+        geo_type=geo_type,
+        specialty=specialty,
+        geographies=geographies,
+        **summary,
+    )
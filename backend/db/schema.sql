@@ -53,6 +53,7 @@ CREATE TABLE providers (
     location GEOMETRY(Point, 4326),
     taxonomy_codes TEXT[],
     specialties VARCHAR(50)[],
+    specialty_mask INTEGER NOT NULL DEFAULT 0,  -- bit i = SPECIALTY_CODES[i] (seed order)
     enumeration_date DATE,
     last_updated DATE,
     is_active BOOLEAN DEFAULT TRUE
@@ -63,6 +64,96 @@ CREATE INDEX idx_providers_state ON providers(state);
 CREATE INDEX idx_providers_zip ON providers(zipcode);
 CREATE INDEX idx_providers_specialties ON providers USING GIN(specialties);
 
+-- Per-specialty partial spatial indexes: KNN scans for one specialty only
+-- touch its active providers. Queries must filter with the same literal
+-- predicate, e.g. is_active AND (specialty_mask & 8) <> 0 for nephrology.
+CREATE INDEX idx_providers_geom_primary_care ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 1) <> 0;
+CREATE INDEX idx_providers_geom_cardiology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 2) <> 0;
+CREATE INDEX idx_providers_geom_neurology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 4) <> 0;
+CREATE INDEX idx_providers_geom_nephrology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 8) <> 0;
+CREATE INDEX idx_providers_geom_oncology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 16) <> 0;
+CREATE INDEX idx_providers_geom_psychiatry ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 32) <> 0;
+CREATE INDEX idx_providers_geom_obgyn ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 64) <> 0;
+CREATE INDEX idx_providers_geom_orthopedics ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 128) <> 0;
+CREATE INDEX idx_providers_geom_general_surgery ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 256) <> 0;
+CREATE INDEX idx_providers_geom_emergency ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 512) <> 0;
+CREATE INDEX idx_providers_geom_radiology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 1024) <> 0;
+CREATE INDEX idx_providers_geom_pathology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 2048) <> 0;
+CREATE INDEX idx_providers_geom_dermatology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 4096) <> 0;
+CREATE INDEX idx_providers_geom_ophthalmology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 8192) <> 0;
+CREATE INDEX idx_providers_geom_pediatrics ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 16384) <> 0;
+
+-- Distinct active-provider locations (providers are geocoded to ZCTA
+-- centroids). Arrays are indexed in taxonomy_mapping.SPECIALTY_CODES order,
+-- i.e. the specialties seed order below.
+CREATE TABLE provider_sites (
+    id SERIAL PRIMARY KEY,
+    location GEOMETRY(Point, 4326) NOT NULL,
+    provider_count INTEGER NOT NULL,
+    specialty_counts INTEGER[] NOT NULL,       -- active providers per specialty
+    specialty_mask INTEGER NOT NULL,           -- specialties with a nonzero count
+    representative_npis VARCHAR(10)[] NOT NULL -- lowest NPI per specialty (NULL if none)
+);
+
+CREATE INDEX idx_provider_sites_geom ON provider_sites USING GIST(location);
+CREATE INDEX idx_provider_sites_geom_primary_care ON provider_sites USING GIST(location) WHERE (specialty_mask & 1) <> 0;
+CREATE INDEX idx_provider_sites_geom_cardiology ON provider_sites USING GIST(location) WHERE (specialty_mask & 2) <> 0;
+CREATE INDEX idx_provider_sites_geom_neurology ON provider_sites USING GIST(location) WHERE (specialty_mask & 4) <> 0;
+CREATE INDEX idx_provider_sites_geom_nephrology ON provider_sites USING GIST(location) WHERE (specialty_mask & 8) <> 0;
+CREATE INDEX idx_provider_sites_geom_oncology ON provider_sites USING GIST(location) WHERE (specialty_mask & 16) <> 0;
+CREATE INDEX idx_provider_sites_geom_psychiatry ON provider_sites USING GIST(location) WHERE (specialty_mask & 32) <> 0;
+CREATE INDEX idx_provider_sites_geom_obgyn ON provider_sites USING GIST(location) WHERE (specialty_mask & 64) <> 0;
+CREATE INDEX idx_provider_sites_geom_orthopedics ON provider_sites USING GIST(location) WHERE (specialty_mask & 128) <> 0;
+CREATE INDEX idx_provider_sites_geom_general_surgery ON provider_sites USING GIST(location) WHERE (specialty_mask & 256) <> 0;
+CREATE INDEX idx_provider_sites_geom_emergency ON provider_sites USING GIST(location) WHERE (specialty_mask & 512) <> 0;
+CREATE INDEX idx_provider_sites_geom_radiology ON provider_sites USING GIST(location) WHERE (specialty_mask & 1024) <> 0;
+CREATE INDEX idx_provider_sites_geom_pathology ON provider_sites USING GIST(location) WHERE (specialty_mask & 2048) <> 0;
+CREATE INDEX idx_provider_sites_geom_dermatology ON provider_sites USING GIST(location) WHERE (specialty_mask & 4096) <> 0;
+CREATE INDEX idx_provider_sites_geom_ophthalmology ON provider_sites USING GIST(location) WHERE (specialty_mask & 8192) <> 0;
+CREATE INDEX idx_provider_sites_geom_pediatrics ON provider_sites USING GIST(location) WHERE (specialty_mask & 16384) <> 0;
+
+-- Provider changes applied by incremental (weekly delta) NPPES loads.
+-- Old/new location and specialties let downstream stages recompute only
+-- the (geo, specialty) pairs a change can affect.
+CREATE TABLE provider_changes (
+    id SERIAL PRIMARY KEY,
+    batch_id VARCHAR(100) NOT NULL,
+    npi VARCHAR(10) NOT NULL,
+    change_type VARCHAR(10) NOT NULL,  -- insert, update, deactivate
+    old_location GEOMETRY(Point, 4326),
+    new_location GEOMETRY(Point, 4326),
+    old_specialties VARCHAR(50)[],
+    new_specialties VARCHAR(50)[],
+    recorded_at TIMESTAMP DEFAULT NOW(),
+    processed_at TIMESTAMP
+);
+
+CREATE INDEX idx_provider_changes_pending ON provider_changes(id) WHERE processed_at IS NULL;
+
+-- Checkpoints of long-running ETL loads (resumed with --resume)
+CREATE TABLE etl_checkpoints (
+    stage VARCHAR(50) PRIMARY KEY,
+    source_key TEXT NOT NULL,        -- JSON identity of the source file
+    byte_offset BIGINT NOT NULL,     -- resume position (start of a record)
+    batch_no INTEGER NOT NULL,       -- last committed batch
+    counters JSONB NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- OSRM durations kept across pipeline runs, keyed by the road-network
+-- version and (origin, destination) rounded to DRIVETIME_CACHE_DECIMALS
+-- degrees (stored as scaled integers). NULL duration = OSRM found no route.
+CREATE TABLE drivetime_cache (
+    dataset_version VARCHAR(100) NOT NULL,
+    origin_lon BIGINT NOT NULL,
+    origin_lat BIGINT NOT NULL,
+    dest_lon BIGINT NOT NULL,
+    dest_lat BIGINT NOT NULL,
+    duration_seconds FLOAT,
+    routed_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (dataset_version, origin_lon, origin_lat, dest_lon, dest_lat)
+);
+
 -- Pre-computed dearth scores
 CREATE TABLE dearth_scores (
     id SERIAL PRIMARY KEY,
@@ -83,6 +174,7 @@ CREATE TABLE dearth_scores (
     nearest_provider_lon FLOAT,
     nearest_provider_lat FLOAT,
     drive_time_is_estimated BOOLEAN DEFAULT FALSE,
+    drive_time_provider_npi VARCHAR(10),  -- provider the drive time leads to
 
     -- Scores (0-100, higher = worse access)
     density_score FLOAT,
@@ -0,0 +1,124 @@
+-- US Healthcare Dearth Map - Upgrade an existing database to schema.sql
+--
+-- schema.sql only runs when the database is first created (docker-compose
+-- mounts it into docker-entrypoint-initdb.d). This script brings a database
+-- created from an older schema.sql up to date; every statement is
+-- idempotent, so it is safe to run on any version, including a current one:
+--
+--   psql "$DATABASE_URL" -f backend/db/upgrade.sql
+
+BEGIN;
+
+-- Provider specialty bitmask (bit i = SPECIALTY_CODES[i]), backfilled from
+-- specialties, and the per-specialty partial spatial indexes
+ALTER TABLE providers ADD COLUMN IF NOT EXISTS specialty_mask INTEGER NOT NULL DEFAULT 0;
+
+UPDATE providers p SET specialty_mask = m.mask
+FROM (
+    SELECT pr.npi, SUM(b.bit)::INTEGER AS mask
+    FROM providers pr
+    CROSS JOIN LATERAL unnest(pr.specialties) AS s (code)
+    JOIN (VALUES
+        ('primary_care', 1),
+        ('cardiology', 2),
+        ('neurology', 4),
+        ('nephrology', 8),
+        ('oncology', 16),
+        ('psychiatry', 32),
+        ('obgyn', 64),
+        ('orthopedics', 128),
+        ('general_surgery', 256),
+        ('emergency', 512),
+        ('radiology', 1024),
+        ('pathology', 2048),
+        ('dermatology', 4096),
+        ('ophthalmology', 8192),
+        ('pediatrics', 16384)
+    ) AS b (code, bit) ON b.code = s.code
+    GROUP BY pr.npi
+) m
+WHERE p.npi = m.npi AND p.specialty_mask = 0;
+
+CREATE INDEX IF NOT EXISTS idx_providers_geom_primary_care ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 1) <> 0;
+CREATE INDEX IF NOT EXISTS idx_providers_geom_cardiology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 2) <> 0;
+CREATE INDEX IF NOT EXISTS idx_providers_geom_neurology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 4) <> 0;
+CREATE INDEX IF NOT EXISTS idx_providers_geom_nephrology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 8) <> 0;
+CREATE INDEX IF NOT EXISTS idx_providers_geom_oncology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 16) <> 0;
+CREATE INDEX IF NOT EXISTS idx_providers_geom_psychiatry ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 32) <> 0;
+CREATE INDEX IF NOT EXISTS idx_providers_geom_obgyn ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 64) <> 0;
+CREATE INDEX IF NOT EXISTS idx_providers_geom_orthopedics ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 128) <> 0;
+CREATE INDEX IF NOT EXISTS idx_providers_geom_general_surgery ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 256) <> 0;
+CREATE INDEX IF NOT EXISTS idx_providers_geom_emergency ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 512) <> 0;
+CREATE INDEX IF NOT EXISTS idx_providers_geom_radiology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 1024) <> 0;
+CREATE INDEX IF NOT EXISTS idx_providers_geom_pathology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 2048) <> 0;
+CREATE INDEX IF NOT EXISTS idx_providers_geom_dermatology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 4096) <> 0;
+CREATE INDEX IF NOT EXISTS idx_providers_geom_ophthalmology ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 8192) <> 0;
+CREATE INDEX IF NOT EXISTS idx_providers_geom_pediatrics ON providers USING GIST(location) WHERE is_active AND (specialty_mask & 16384) <> 0;
+
+-- Distinct active-provider locations
+CREATE TABLE IF NOT EXISTS provider_sites (
+    id SERIAL PRIMARY KEY,
+    location GEOMETRY(Point, 4326) NOT NULL,
+    provider_count INTEGER NOT NULL,
+    specialty_counts INTEGER[] NOT NULL,       -- active providers per specialty
+    specialty_mask INTEGER NOT NULL,           -- specialties with a nonzero count
+    representative_npis VARCHAR(10)[] NOT NULL -- lowest NPI per specialty (NULL if none)
+);
+
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom ON provider_sites USING GIST(location);
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom_primary_care ON provider_sites USING GIST(location) WHERE (specialty_mask & 1) <> 0;
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom_cardiology ON provider_sites USING GIST(location) WHERE (specialty_mask & 2) <> 0;
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom_neurology ON provider_sites USING GIST(location) WHERE (specialty_mask & 4) <> 0;
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom_nephrology ON provider_sites USING GIST(location) WHERE (specialty_mask & 8) <> 0;
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom_oncology ON provider_sites USING GIST(location) WHERE (specialty_mask & 16) <> 0;
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom_psychiatry ON provider_sites USING GIST(location) WHERE (specialty_mask & 32) <> 0;
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom_obgyn ON provider_sites USING GIST(location) WHERE (specialty_mask & 64) <> 0;
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom_orthopedics ON provider_sites USING GIST(location) WHERE (specialty_mask & 128) <> 0;
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom_general_surgery ON provider_sites USING GIST(location) WHERE (specialty_mask & 256) <> 0;
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom_emergency ON provider_sites USING GIST(location) WHERE (specialty_mask & 512) <> 0;
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom_radiology ON provider_sites USING GIST(location) WHERE (specialty_mask & 1024) <> 0;
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom_pathology ON provider_sites USING GIST(location) WHERE (specialty_mask & 2048) <> 0;
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom_dermatology ON provider_sites USING GIST(location) WHERE (specialty_mask & 4096) <> 0;
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom_ophthalmology ON provider_sites USING GIST(location) WHERE (specialty_mask & 8192) <> 0;
+CREATE INDEX IF NOT EXISTS idx_provider_sites_geom_pediatrics ON provider_sites USING GIST(location) WHERE (specialty_mask & 16384) <> 0;
+
+-- Weekly delta change log, load checkpoints and the OSRM drive time cache
+CREATE TABLE IF NOT EXISTS provider_changes (
+    id SERIAL PRIMARY KEY,
+    batch_id VARCHAR(100) NOT NULL,
+    npi VARCHAR(10) NOT NULL,
+    change_type VARCHAR(10) NOT NULL,  -- insert, update, deactivate
+    old_location GEOMETRY(Point, 4326),
+    new_location GEOMETRY(Point, 4326),
+    old_specialties VARCHAR(50)[],
+    new_specialties VARCHAR(50)[],
+    recorded_at TIMESTAMP DEFAULT NOW(),
+    processed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_provider_changes_pending ON provider_changes(id) WHERE processed_at IS NULL;
+
+CREATE TABLE IF NOT EXISTS etl_checkpoints (
+    stage VARCHAR(50) PRIMARY KEY,
+    source_key TEXT NOT NULL,        -- JSON identity of the source file
+    byte_offset BIGINT NOT NULL,     -- resume position (start of a record)
+    batch_no INTEGER NOT NULL,       -- last committed batch
+    counters JSONB NOT NULL,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS drivetime_cache (
+    dataset_version VARCHAR(100) NOT NULL,
+    origin_lon BIGINT NOT NULL,
+    origin_lat BIGINT NOT NULL,
+    dest_lon BIGINT NOT NULL,
+    dest_lat BIGINT NOT NULL,
+    duration_seconds FLOAT,
+    routed_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (dataset_version, origin_lon, origin_lat, dest_lon, dest_lat)
+);
+
+-- Provider each drive time leads to
+ALTER TABLE dearth_scores ADD COLUMN IF NOT EXISTS drive_time_provider_npi VARCHAR(10);
+
+COMMIT;
@@ -0,0 +1,80 @@
+"""Set-based bulk writes: COPY rows into a temp table, apply in one statement.
+
+compute_metrics, compute_drivetimes, compute_scores and drivetime_cache
+produce tens of thousands of per-row results. Instead of one UPDATE round
+trip (and index lookup) per row, the rows are streamed into a temporary
+table with COPY and applied with a single UPDATE ... FROM join (or
+INSERT ... SELECT).
+"""
+
+import io
+import math
+
+import numpy as np
+
+
+def _copy_value(value) -> str:
+    """One field of a text-format COPY row."""
+    if value is None:
+        return r"\N"
+    if isinstance(value, (bool, np.bool_)):
+        return "t" if value else "f"
+    if isinstance(value, (float, np.floating)):
+        return r"\N" if math.isnan(value) else repr(float(value))
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def copy_rows(cur, table: str, columns: list[str], rows) -> None:
+    """COPY `rows` (tuples in `columns` order) into `table`."""
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join(_copy_value(v) for v in row))
+        buf.write("\n")
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buf)
+
+
+def temp_table(cur, name: str, columns: list[tuple[str, str]], rows) -> None:
+    """Create temp table `name` with (column, SQL type) `columns` and fill it.
+
+    The table is dropped at commit; callers drop it earlier if they may
+    create it again in the same transaction.
+    """
+    cur.execute(f"""
+        CREATE TEMP TABLE {name} (
+            {', '.join(f'{col} {sql_type}' for col, sql_type in columns)}
+        ) ON COMMIT DROP
+    """)
+    copy_rows(cur, name, [col for col, _ in columns], rows)
+    cur.execute(f"ANALYZE {name}")
+
+
+def update_from(cur, table: str, columns: list[tuple[str, str]], rows,
+                key: list[str], assign: dict[str, str] | None = None,
+                where: str = "") -> int:
+    """UPDATE `table` from `rows` with one COPY and one UPDATE ... FROM.
+
+    `columns` names and types the row fields. Target rows (alias `t`) are
+    matched to row values (alias `v`) on the `key` columns. By default every
+    other column is assigned to the target column of the same name;
+    `assign` instead maps target columns to SQL expressions over `v.` and
+    `t.` columns. `where` adds conditions on `t`. Returns rows updated.
+    """
+    staging = f"bulk_{table}"
+    temp_table(cur, staging, columns, rows)
+    if assign is None:
+        assign = {col: f"v.{col}" for col, _ in columns if col not in key}
+    conditions = [f"t.{col} = v.{col}" for col in key]
+    if where:
+        conditions.append(where)
+    cur.execute(f"""
+        UPDATE {table} t SET {', '.join(f'{col} = {expr}' for col, expr in assign.items())}
+        FROM {staging} v
+        WHERE {' AND '.join(conditions)}
+    """)
+    updated = cur.rowcount
+    cur.execute(f"DROP TABLE {staging}")
+    return updated
@@ -1,146 +1,200 @@
-"""Compute actual drive times via OSRM road-network routing.
-
-Queries the OSRM routing engine for each (county centroid -> nearest provider)
-pair. Falls back to a distance-based proxy when OSRM is unavailable.
+"""Compute actual drive times via road-network routing.
+
+Routes each county or ZCTA centroid to its DRIVETIME_CANDIDATES nearest
+provider sites by straight-line distance and keeps the shortest drive;
+near rivers, mountains and state lines the nearest provider by road is
+often the second or third. Each distinct (origin, provider) pair is
+resolved once across all specialties: from drivetime_cache if an earlier
+run routed it on the same road network, otherwise from the routing
+backend (etl.routing: live OSRM, a recorded replay, or a fitted proxy
+model). Any row the backend cannot answer falls back to a distance-based
+proxy; when the backend is unavailable, uncached rows keep their proxy
+drive times.
 
 Runs between compute_metrics (which stores nearest provider coords) and
 compute_scores (which uses drive_time_minutes for percentile scoring).
 """
 
-import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
-
-import requests
+import numpy as np
 
-from .config import OSRM_URL, DRIVETIME_PROXY_FACTOR
+from . import bulk, drivetime_cache, provider_index, routing
+from .config import DRIVETIME_CANDIDATES, DRIVETIME_PROXY_FACTOR, ROUTING_BACKEND
 
 
-def _check_osrm(session: requests.Session) -> bool:
-    """Check if OSRM is reachable with a test route."""
-    try:
-        resp = session.get(
-            f"{OSRM_URL}/route/v1/driving/-73.98,40.74;-73.97,40.75",
-            params={"overview": "false"},
-            timeout=5,
-        )
-        return resp.status_code == 200 and resp.json().get("code") == "Ok"
-    except (requests.ConnectionError, requests.Timeout, ValueError):
-        return False
+def _fetch_rows(conn, row_ids: list[int] | None = None) -> tuple[dict, dict]:
+    """Rows with nearest provider coords to route, grouped by specialty.
 
+    Each row is (id, origin, [(npi, (lon, lat), straight-line miles)]), the
+    candidate list holding just the nearest provider stored by
+    compute_metrics. Also returns the state abbreviation of every origin.
+    """
+    only_rows = "AND ds.id = ANY(%(row_ids)s)" if row_ids is not None else ""
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT
+                ds.specialty_code,
+                ds.id,
+                ST_X(COALESCE(c.centroid, z.centroid)) AS origin_lon,
+                ST_Y(COALESCE(c.centroid, z.centroid)) AS origin_lat,
+                COALESCE(c.state_abbr, z.state_abbr) AS origin_state,
+                ds.nearest_provider_npi,
+                ds.nearest_provider_lon,
+                ds.nearest_provider_lat,
+                ds.nearest_distance_miles
+            FROM dearth_scores ds
+            LEFT JOIN counties c
+                ON ds.geo_type = 'county' AND c.fips = ds.geo_id
+            LEFT JOIN zipcodes z
+                ON ds.geo_type = 'zipcode' AND z.zcta = ds.geo_id
+            WHERE COALESCE(c.centroid, z.centroid) IS NOT NULL
+              AND ds.nearest_provider_lon IS NOT NULL
+              AND ds.nearest_provider_lat IS NOT NULL
+              {only_rows}
+            ORDER BY ds.specialty_code
+        """, {"row_ids": row_ids})
+        rows_by_spec, states = {}, {}
+        for spec, row_id, o_lon, o_lat, state, npi, p_lon, p_lat, dist in cur.fetchall():
+            rows_by_spec.setdefault(spec, []).append(
+                (row_id, (o_lon, o_lat), [(npi, (p_lon, p_lat), dist)])
+            )
+            states[(o_lon, o_lat)] = state
+    conn.commit()
+    return rows_by_spec, states
 
-def _route_one(session: requests.Session, row: tuple) -> tuple:
-    """Query OSRM for a single county->provider route.
 
-    Args:
-        session: reusable requests session
-        row: (id, county_lon, county_lat, provider_lon, provider_lat, distance_miles)
+def _add_candidates(conn, rows_by_spec: dict[str, list[tuple]], k: int) -> None:
+    """Replace each row's candidates with its `k` nearest provider sites.
 
-    Returns:
-        (id, drive_time_minutes, is_estimated)
+    Uses the same provider_sites BallTrees as compute_metrics, so the first
+    candidate is the stored nearest provider. Specialties without an index
+    keep their stored candidate.
     """
-    row_id, c_lon, c_lat, p_lon, p_lat, dist_miles = row
-
-    try:
-        resp = session.get(
-            f"{OSRM_URL}/route/v1/driving/{c_lon},{c_lat};{p_lon},{p_lat}",
-            params={"overview": "false"},
-            timeout=10,
+    with conn.cursor() as cur:
+        indexes = provider_index.load(cur)
+    conn.commit()
+
+    for spec, rows in rows_by_spec.items():
+        index = indexes.get(spec)
+        if index is None:
+            continue
+        lon = np.array([origin[0] for _, origin, _ in rows], dtype=np.float64)
+        lat = np.array([origin[1] for _, origin, _ in rows], dtype=np.float64)
+        dist, idx = index.query(lon, lat, k)
+        rows_by_spec[spec] = [
+            (row_id, origin, [
+                (str(index.npis[j]), (float(index.lon[j]), float(index.lat[j])), float(d))
+                for d, j in zip(dist[i], idx[i])
+            ])
+            for i, (row_id, origin, _) in enumerate(rows)
+        ]
+
+
+def _write_results(conn, results: list[tuple]) -> int:
+    """Store (id, drive_time_minutes, is_estimated, provider npi) results."""
+    with conn.cursor() as cur:
+        updated = bulk.update_from(
+            cur, "dearth_scores",
+            [("id", "INTEGER"), ("drive_time_minutes", "FLOAT"),
+             ("drive_time_is_estimated", "BOOLEAN"), ("drive_time_provider_npi", "VARCHAR(10)")],
+            results, key=["id"],
         )
-        data = resp.json()
+    conn.commit()
+    return updated
 
-        if data.get("code") == "Ok" and data.get("routes"):
-            duration_sec = data["routes"][0]["duration"]
-            drive_minutes = duration_sec / 60.0
-            return (row_id, drive_minutes, False)
 
-    except (requests.ConnectionError, requests.Timeout, ValueError, KeyError,
-            IndexError):
-        pass
+def run(conn, row_ids: list[int] | None = None,
+        candidates: int = DRIVETIME_CANDIDATES, backend: str = ROUTING_BACKEND):
+    """Compute drive times for all geography-specialty pairs.
 
-    # Fallback: proxy estimate
-    return (row_id, dist_miles * DRIVETIME_PROXY_FACTOR, True)
-
-
-def run(conn):
-    """Compute drive times for all county-specialty pairs via OSRM."""
-    print("=== Computing Drive Times (OSRM) ===")
-
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(
-        pool_connections=25,
-        pool_maxsize=25,
-        max_retries=1,
-    )
-    session.mount("http://", adapter)
-
-    # Check OSRM availability
-    if not _check_osrm(session):
-        print("  WARNING: OSRM not reachable. Keeping proxy drive times.")
-        print("  To enable OSRM: docker compose up osrm")
+    The distinct (origin, provider) pairs of all specialties are resolved
+    once, from the cache or the `backend` (see etl.routing); results are
+    then written with one bulk UPDATE. `row_ids` limits routing to those
+    dearth_scores rows (e.g. the ones compute_metrics.run_incremental
+    recomputed). Each row routes its `candidates` nearest provider sites
+    and keeps the fastest.
+    """
+    print(f"=== Computing Drive Times ({backend}) ===")
+    if row_ids is not None and not row_ids:
+        print("  No rows to route")
+        print("=== Drive Time Computation Complete ===")
         return
 
-    print(f"  OSRM connected at {OSRM_URL}")
-
-    with conn.cursor() as cur:
-        # Get specialties
-        cur.execute("SELECT code FROM specialties ORDER BY code")
-        specialty_codes = [row[0] for row in cur.fetchall()]
-
-        total_routed = 0
-        total_estimated = 0
-
-        for i, spec in enumerate(specialty_codes, 1):
-            sys.stdout.write(f"\r  [{i}/{len(specialty_codes)}] {spec:<20}")
-            sys.stdout.flush()
-
-            # Fetch rows that have nearest provider coords
-            cur.execute("""
-                SELECT
-                    ds.id,
-                    ST_X(c.centroid) AS county_lon,
-                    ST_Y(c.centroid) AS county_lat,
-                    ds.nearest_provider_lon,
-                    ds.nearest_provider_lat,
-                    ds.nearest_distance_miles
-                FROM dearth_scores ds
-                JOIN counties c ON c.fips = ds.geo_id
-                WHERE ds.geo_type = 'county'
-                  AND ds.specialty_code = %s
-                  AND ds.nearest_provider_lon IS NOT NULL
-                  AND ds.nearest_provider_lat IS NOT NULL
-            """, (spec,))
-            rows = cur.fetchall()
-
-            if not rows:
-                continue
-
-            # Query OSRM in parallel
-            results = []
-            with ThreadPoolExecutor(max_workers=25) as pool:
-                futures = {
-                    pool.submit(_route_one, session, row): row
-                    for row in rows
-                }
-                for future in as_completed(futures):
-                    results.append(future.result())
-
-            # Batch update
-            routed = sum(1 for _, _, est in results if not est)
-            estimated = sum(1 for _, _, est in results if est)
-            total_routed += routed
-            total_estimated += estimated
-
-            # Use executemany for batch update
-            cur.executemany(
-                """UPDATE dearth_scores
-                   SET drive_time_minutes = %s,
-                       drive_time_is_estimated = %s
-                   WHERE id = %s""",
-                [(dt, est, rid) for rid, dt, est in results],
-            )
-            conn.commit()
-
-        print()  # newline after progress
-        print(f"  Routed: {total_routed:,} | Estimated (fallback): {total_estimated:,}")
+    rows_by_spec, states = _fetch_rows(conn, row_ids)
+    router = routing.get_backend(backend, conn)
+    available = router.open()
+    version = router.dataset_version()
+
+    # Check backend availability
+    if not available:
+        print(f"  WARNING: {router.name} routing not available. Keeping proxy drive times.")
+        if router.name in ("osrm", "record"):
+            print("  To enable OSRM: docker compose up osrm")
+        if version is None:
+            return
+        print(f"  Applying cached drive times of dataset {version} only")
+    else:
+        print(f"  Routing via {router.describe()}")
+
+    if candidates > 1:
+        _add_candidates(conn, rows_by_spec, candidates)
+        print(f"  Routing the {candidates} nearest provider sites per row")
+
+    # Resolve each distinct pair once: specialties share origins, and
+    # providers sit on ZCTA centroids, so many specialties share (origin,
+    # provider) pairs. Pairs already cached for this road network are not
+    # routed.
+    n_requested = sum(len(cands) for rows in rows_by_spec.values() for *_, cands in rows)
+    pairs = list(dict.fromkeys(
+        (origin, dest)
+        for rows in rows_by_spec.values()
+        for _, origin, cands in rows
+        for _, dest, _ in cands
+    ))
+    durations = drivetime_cache.lookup(conn, version, pairs) if version else {}
+    misses = [p for p in pairs if p not in durations]
+    print(f"  {n_requested:,} row candidates -> {len(pairs):,} distinct pairs | "
+          f"cache ({version}): {len(pairs) - len(misses):,} hits, {len(misses):,} misses")
+
+    estimated_pairs = set()
+    if available and misses:
+        answers = router.route(misses, states)
+        if router.estimated:
+            estimated_pairs.update(answers)
+        elif version:
+            drivetime_cache.store(conn, version, answers)
+        durations.update(answers)
+    router.close(durations)
+
+    # Fan durations out to every row; each takes its fastest candidate.
+    # Rows with no answer fall back to the distance proxy of the nearest
+    # candidate; rows never sent to a backend (it is unavailable and they
+    # are not cached) keep their value.
+    results = {}
+    for spec, rows in rows_by_spec.items():
+        spec_results = []
+        for row_id, origin, cands in rows:
+            answered = [(durations[(origin, dest)], npi, (origin, dest) in estimated_pairs)
+                        for npi, dest, _ in cands
+                        if durations.get((origin, dest)) is not None]
+            if answered:
+                duration_sec, npi, is_estimated = min(answered)
+                spec_results.append((row_id, duration_sec / 60.0, is_estimated, npi))
+            elif available or any((origin, dest) in durations for _, dest, _ in cands):
+                npi, _, dist_miles = cands[0]
+                spec_results.append(
+                    (row_id, dist_miles * DRIVETIME_PROXY_FACTOR, True, npi)
+                )
+        results[spec] = spec_results
+        if spec_results:
+            n_estimated = sum(1 for *_, est, _ in spec_results if est)
+            print(f"    {spec:<28} {len(spec_results):>6,} rows | "
+                  f"estimated {n_estimated / len(spec_results):.1%}")
+
+    _write_results(conn, [r for spec_results in results.values() for r in spec_results])
+
+    total_estimated = sum(est for spec_results in results.values()
+                          for _, _, est, _ in spec_results)
+    total_routed = sum(len(r) for r in results.values()) - total_estimated
+    print(f"  Routed: {total_routed:,} | Estimated: {total_estimated:,}")
 
     print("=== Drive Time Computation Complete ===")
@@ -1,16 +1,58 @@
-"""Compute provider metrics per (county, specialty) pair.
+"""Compute provider metrics per (geography, specialty) pair.
 
-Two-phase approach optimized for ~3,143 counties x 15 specialties:
+Two-phase approach for ~3,109 counties and ~33,000 ZCTAs x 15 specialties
+(~540k rows):
 
 Phase 1 (fast, no spatial): Provider counts and density via zipcode joins.
-Phase 2 (spatial, per-specialty): Nearest-provider distance using PostGIS KNN.
+Phase 2 (spatial, per-specialty): Nearest-provider and average nearest-k
+distances, searched over provider_sites (distinct provider locations
+weighted by per-specialty counts) using one of two engines:
+  - "balltree": in-memory haversine BallTree per specialty (provider_index),
+    one vectorized query for all centroids of a geography, written back
+    in bulk
+  - "postgis": PostGIS KNN (<->) LATERAL subqueries, one UPDATE per
+    (geography, specialty); per-origin SQL, far slower at ZCTA level
+The per-(geography, specialty) UPDATEs of either engine run concurrently
+on a pool of `workers` connections (etl.parallel).
+
+`run_incremental` instead applies pending `provider_changes` (weekly NPPES
+deltas): it recomputes only the (geography, specialty) pairs whose counts
+or nearest-k providers a change can affect.
 """
 
-import sys
+from collections import defaultdict
+
+import numpy as np
+
+from psycopg2.extras import execute_values
+
+from . import bulk, parallel, provider_index
+from .config import (
+    DB_WORKERS, DRIVETIME_PROXY_FACTOR, METRICS_ENGINE, METRICS_GEO_TYPES, NEAREST_K,
+)
+from .taxonomy_mapping import SPECIALTY_BITS, SPECIALTY_CODES
+
+# geo_type -> (table, id column, zipcodes column that assigns ZCTAs to it)
+GEOGRAPHIES = {
+    "county": ("counties", "fips", "county_fips"),
+    "zipcode": ("zipcodes", "zcta", "zcta"),
+}
 
 
-def run(conn):
-    """Compute metrics and insert into dearth_scores."""
+def run(conn, engine: str = METRICS_ENGINE, k: int = NEAREST_K,
+        geo_types: tuple[str, ...] = METRICS_GEO_TYPES, workers: int = DB_WORKERS):
+    """Compute metrics and insert into dearth_scores.
+
+    `k` is the number of nearest providers averaged into
+    avg_distance_top3_miles (3 by default). `geo_types` selects the
+    geographies (keys of GEOGRAPHIES) to compute. `workers` is the number
+    of database connections used for the Phase 2 updates.
+    """
+    if engine not in ("balltree", "postgis"):
+        raise ValueError(f"Unknown metrics engine: {engine}")
+    for geo_type in geo_types:
+        if geo_type not in GEOGRAPHIES:
+            raise ValueError(f"Unknown geography: {geo_type}")
     print("=== Computing Provider Metrics ===")
 
     with conn.cursor() as cur:
@@ -22,132 +64,452 @@ def run(conn):
         # Phase 1: Provider counts and density (no spatial query)
         # -------------------------------------------------------
         print("  Phase 1: Computing provider counts and density...")
-        cur.execute("""
-            INSERT INTO dearth_scores (
-                geo_type, geo_id, specialty_code,
-                provider_count, provider_density,
-                nearest_distance_miles, avg_distance_top3_miles,
-                drive_time_minutes, wait_time_days,
-                data_version
+        for geo_type in geo_types:
+            rows = _insert_counts(cur, geo_type)
+            conn.commit()
+            print(f"    {geo_type}: {rows:,} metric rows")
+        print("  Phase 1 complete")
+
+        # -------------------------------------------------------
+        # Phase 2: Distance metrics per specialty
+        # -------------------------------------------------------
+        print(f"  Phase 2: Computing distance metrics per specialty ({engine})...")
+        if engine == "balltree":
+            indexes = provider_index.load(cur)
+            tasks = []
+            for geo_type in geo_types:
+                tasks.extend(_nearest_balltree(cur, indexes, geo_type, k))
+            conn.commit()
+            counts = parallel.for_each(
+                conn, tasks, _write_distances, workers,
+                describe=lambda t: f"{t[0]} {t[1]}",
             )
-            SELECT
-                'county' AS geo_type,
-                c.fips AS geo_id,
-                s.code AS specialty_code,
-                COALESCE(cnt.n, 0) AS provider_count,
-                CASE
-                    WHEN c.population > 0
-                    THEN COALESCE(cnt.n, 0) * 100000.0 / c.population
+            print(f"  Updated {sum(counts):,} geography-specialty distances")
+        else:
+            tasks = [(geo_type, spec) for geo_type in geo_types for spec in SPECIALTY_CODES]
+            parallel.for_each(
+                conn, tasks, lambda c, t: _distances_postgis(c, t[0], t[1], k),
+                workers, describe=lambda t: f"{t[0]} {t[1]}",
+            )
+        print("  Phase 2 complete")
+
+        # A full recompute covers any pending provider changes
+        cur.execute("UPDATE provider_changes SET processed_at = NOW() WHERE processed_at IS NULL")
+        conn.commit()
+
+    print("=== Metrics Computation Complete ===")
+
+
+def _insert_counts(cur, geo_type: str) -> int:
+    """Insert one row per (geography, specialty) with counts and density."""
+    table, id_col, zip_key = GEOGRAPHIES[geo_type]
+    cur.execute(f"""
+        INSERT INTO dearth_scores (
+            geo_type, geo_id, specialty_code,
+            provider_count, provider_density,
+            nearest_distance_miles, avg_distance_top3_miles,
+            drive_time_minutes, wait_time_days,
+            data_version
+        )
+        SELECT
+            %(geo_type)s AS geo_type,
+            g.{id_col} AS geo_id,
+            s.code AS specialty_code,
+            COALESCE(cnt.n, 0) AS provider_count,
+            CASE
+                WHEN g.population > 0
+                THEN COALESCE(cnt.n, 0) * 100000.0 / g.population
+                ELSE 0
+            END AS provider_density,
+            999.0 AS nearest_distance_miles,
+            999.0 AS avg_distance_top3_miles,
+            999.0 AS drive_time_minutes,
+            14.0 AS wait_time_days,
+            'nppes_v1' AS data_version
+        FROM {table} g
+        CROSS JOIN specialties s
+        LEFT JOIN (
+            SELECT z.{zip_key} AS geo_id, spec.val AS specialty,
+                   COUNT(DISTINCT p.npi) AS n
+            FROM providers p
+            JOIN zipcodes z ON z.zcta = p.zipcode
+            CROSS JOIN LATERAL unnest(p.specialties) AS spec(val)
+            WHERE p.is_active = TRUE
+            GROUP BY z.{zip_key}, spec.val
+        ) cnt ON cnt.geo_id = g.{id_col} AND cnt.specialty = s.code
+        ON CONFLICT (geo_type, geo_id, specialty_code) DO UPDATE SET
+            provider_count = EXCLUDED.provider_count,
+            provider_density = EXCLUDED.provider_density,
+            computed_at = NOW(),
+            data_version = EXCLUDED.data_version;
+    """, {"geo_type": geo_type})
+    return cur.rowcount
+
+
+def _load_origins(cur, geo_type: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(geo ids, centroid lon, centroid lat) of every unit of a geography."""
+    table, id_col, _ = GEOGRAPHIES[geo_type]
+    cur.execute(f"""
+        SELECT {id_col}, ST_X(centroid), ST_Y(centroid)
+        FROM {table}
+        WHERE centroid IS NOT NULL
+        ORDER BY {id_col}
+    """)
+    origins = cur.fetchall()
+    return (
+        np.array([r[0] for r in origins], dtype=object),
+        np.array([r[1] for r in origins], dtype=np.float64),
+        np.array([r[2] for r in origins], dtype=np.float64),
+    )
+
+
+def _distance_rows(index, geo_ids, lon, lat, k: int) -> list[tuple]:
+    """(geo_id, nearest, avg nearest-k, npi, lon, lat) rows for origins."""
+    nearest_miles, avg_miles, nearest = index.nearest(lon, lat, k)
+    return list(zip(
+        geo_ids.tolist(),
+        nearest_miles.tolist(), avg_miles.tolist(),
+        index.npis[nearest].tolist(),
+        index.lon[nearest].tolist(), index.lat[nearest].tolist(),
+    ))
+
+
+def _nearest_balltree(cur, indexes: dict, geo_type: str, k: int) -> list[tuple]:
+    """Nearest-provider distances for all centroids of a geography.
+
+    Returns one (geo_type, specialty, rows) write task per specialty with
+    providers; specialties without providers keep their 999 defaults.
+    """
+    geo_ids, lon, lat = _load_origins(cur, geo_type)
+    return [
+        (geo_type, spec, _distance_rows(index, geo_ids, lon, lat, k))
+        for spec, index in sorted(indexes.items())
+    ]
+
+
+def _write_distances(conn, task: tuple) -> int:
+    """Write one (geo_type, specialty) batch of BallTree distances."""
+    geo_type, spec, rows = task  # GEOGRAPHIES and SPECIALTY_CODES keys
+    with conn.cursor() as cur:
+        bulk.update_from(
+            cur, "dearth_scores",
+            [("geo_id", "VARCHAR(10)"), ("nearest_miles", "FLOAT"), ("avg_miles", "FLOAT"),
+             ("npi", "VARCHAR(10)"), ("lon", "FLOAT"), ("lat", "FLOAT")],
+            rows, key=["geo_id"],
+            assign={
+                "nearest_distance_miles": "v.nearest_miles",
+                "avg_distance_top3_miles": "v.avg_miles",
+                "drive_time_minutes": f"v.nearest_miles * {DRIVETIME_PROXY_FACTOR}",
+                "nearest_provider_npi": "v.npi",
+                "drive_time_provider_npi": "v.npi",
+                "nearest_provider_lon": "v.lon",
+                "nearest_provider_lat": "v.lat",
+                "drive_time_is_estimated": "TRUE",
+            },
+            where=f"t.geo_type = '{geo_type}' AND t.specialty_code = '{spec}'",
+        )
+    return len(rows)
+
+
+def _pending_changes(cur) -> tuple[list[int], dict, dict]:
+    """Load unprocessed provider_changes.
+
+    Returns (change ids, {specialty: set of changed (lon, lat) points},
+    {specialty: number of changed providers}), where a change contributes
+    its old location to its old specialties and its new location to its
+    new ones.
+    """
+    cur.execute("""
+        SELECT id, npi,
+            ST_X(old_location), ST_Y(old_location), COALESCE(old_specialties, '{}'),
+            ST_X(new_location), ST_Y(new_location), COALESCE(new_specialties, '{}')
+        FROM provider_changes
+        WHERE processed_at IS NULL
+    """)
+    ids = []
+    points = defaultdict(set)
+    npis = defaultdict(set)
+    for change_id, npi, o_lon, o_lat, o_specs, n_lon, n_lat, n_specs in cur.fetchall():
+        ids.append(change_id)
+        if o_lon is not None:
+            for spec in o_specs:
+                points[spec].add((o_lon, o_lat))
+                npis[spec].add(npi)
+        if n_lon is not None:
+            for spec in n_specs:
+                points[spec].add((n_lon, n_lat))
+                npis[spec].add(npi)
+    return ids, points, {spec: len(changed) for spec, changed in npis.items()}
+
+
+def _count_pairs(cur, geo_type: str, points: dict) -> set[tuple[str, str]]:
+    """(geo_id, specialty) pairs whose provider counts a change can alter.
+
+    Providers are geocoded to ZCTA centroids, so a changed location
+    identifies the ZCTA (and county) it was counted in.
+    """
+    _, _, zip_key = GEOGRAPHIES[geo_type]
+    cur.execute(f"SELECT {zip_key}, ST_X(centroid), ST_Y(centroid) FROM zipcodes")
+    by_point = {(lon, lat): geo_id for geo_id, lon, lat in cur.fetchall()}
+    return {
+        (by_point[pt], spec)
+        for spec, pts in points.items() for pt in pts if pt in by_point
+    }
+
+
+def _distance_pairs(cur, geo_type: str, points: dict, changed: dict,
+                    indexes: dict, k: int) -> set[tuple[str, str]]:
+    """(geo_id, specialty) pairs whose nearest-k providers a change can alter.
+
+    A unit's nearest-k set can only change if a provider appears or
+    disappears within its current k-th neighbour distance. That distance
+    is at most k times the stored nearest-k average, so it bounds the
+    search radius (with 1% slack for haversine vs. spheroid distances).
+    The bound needs the stored average to span k providers, so
+    specialties that may have had fewer than k before the changes (fewer
+    than k plus their `changed` provider count now) are recomputed
+    everywhere.
+    """
+    geo_ids, lon, lat = _load_origins(cur, geo_type)
+    position = {geo_id: i for i, geo_id in enumerate(geo_ids.tolist())}
+    pairs = set()
+    for spec, pts in points.items():
+        index = indexes.get(spec)
+        if index is None or index.counts.sum() < k + changed.get(spec, 0):
+            pairs.update((geo_id, spec) for geo_id in geo_ids.tolist())
+            continue
+
+        cur.execute("""
+            SELECT geo_id, avg_distance_top3_miles
+            FROM dearth_scores
+            WHERE geo_type = %s AND specialty_code = %s
+        """, (geo_type, spec))
+        radius = np.full(len(geo_ids), np.inf)
+        for geo_id, avg_miles in cur.fetchall():
+            if geo_id in position and avg_miles is not None:
+                radius[position[geo_id]] = k * avg_miles * 1.01
+
+        pts_lon, pts_lat = zip(*pts)
+        dist = provider_index.nearest_distance(pts_lon, pts_lat, lon, lat)
+        pairs.update((geo_id, spec) for geo_id in geo_ids[dist <= radius].tolist())
+    return pairs
+
+
+def _update_counts(conn, task: tuple) -> int:
+    """Recount providers and density for a batch of (geo_id, specialty) pairs."""
+    geo_type, pairs = task  # geo_type is a GEOGRAPHIES key
+    table, id_col, zip_key = GEOGRAPHIES[geo_type]
+    with conn.cursor() as cur:
+        execute_values(cur, f"""
+            UPDATE dearth_scores ds SET
+                provider_count = sub.n,
+                provider_density = CASE
+                    WHEN g.population > 0 THEN sub.n * 100000.0 / g.population
                     ELSE 0
-                END AS provider_density,
-                999.0 AS nearest_distance_miles,
-                999.0 AS avg_distance_top3_miles,
-                999.0 AS drive_time_minutes,
-                14.0 AS wait_time_days,
-                'nppes_v1' AS data_version
-            FROM counties c
-            CROSS JOIN specialties s
-            LEFT JOIN (
-                SELECT z.county_fips, spec.val AS specialty,
-                       COUNT(DISTINCT p.npi) AS n
-                FROM providers p
-                JOIN zipcodes z ON z.zcta = p.zipcode
-                CROSS JOIN LATERAL unnest(p.specialties) AS spec(val)
-                WHERE p.is_active = TRUE
-                GROUP BY z.county_fips, spec.val
-            ) cnt ON cnt.county_fips = c.fips AND cnt.specialty = s.code
-            ON CONFLICT (geo_type, geo_id, specialty_code) DO UPDATE SET
-                provider_count = EXCLUDED.provider_count,
-                provider_density = EXCLUDED.provider_density,
-                computed_at = NOW(),
-                data_version = EXCLUDED.data_version;
-        """)
-        rows = cur.rowcount
+                END,
+                computed_at = NOW()
+            FROM (
+                SELECT v.geo_id, v.spec, (
+                    SELECT COUNT(DISTINCT p.npi)
+                    FROM providers p
+                    JOIN zipcodes z ON z.zcta = p.zipcode
+                    WHERE z.{zip_key} = v.geo_id
+                      AND p.is_active = TRUE
+                      AND v.spec = ANY(p.specialties)
+                ) AS n
+                FROM (VALUES %s) AS v(geo_id, spec)
+            ) sub
+            JOIN {table} g ON g.{id_col} = sub.geo_id
+            WHERE ds.geo_type = '{geo_type}'
+              AND ds.geo_id = sub.geo_id
+              AND ds.specialty_code = sub.spec
+        """, sorted(pairs), page_size=10000)
+    return len(pairs)
+
+
+def _reset_distances(conn, task: tuple) -> int:
+    """Restore the no-provider defaults for a specialty with no providers left."""
+    geo_type, spec, geo_ids = task
+    with conn.cursor() as cur:
+        cur.execute("""
+            UPDATE dearth_scores SET
+                nearest_distance_miles = 999.0,
+                avg_distance_top3_miles = 999.0,
+                drive_time_minutes = 999.0,
+                nearest_provider_npi = NULL,
+                drive_time_provider_npi = NULL,
+                nearest_provider_lon = NULL,
+                nearest_provider_lat = NULL,
+                drive_time_is_estimated = FALSE
+            WHERE geo_type = %s AND specialty_code = %s AND geo_id = ANY(%s)
+        """, (geo_type, spec, list(geo_ids)))
+    return len(geo_ids)
+
+
+def run_incremental(conn, k: int = NEAREST_K,
+                    geo_types: tuple[str, ...] = METRICS_GEO_TYPES,
+                    workers: int = DB_WORKERS) -> list[int]:
+    """Recompute metrics affected by pending provider_changes.
+
+    Expects provider_sites to have been rebuilt after the changes were
+    applied. Counts are recomputed for the units a changed provider was or
+    is counted in; distances for the units whose nearest-k providers the
+    change could alter (see _distance_pairs). Marks the changes processed.
+
+    Returns the ids of the recomputed dearth_scores rows.
+    """
+    for geo_type in geo_types:
+        if geo_type not in GEOGRAPHIES:
+            raise ValueError(f"Unknown geography: {geo_type}")
+    print("=== Updating Provider Metrics (incremental) ===")
+
+    with conn.cursor() as cur:
+        change_ids, points, changed = _pending_changes(cur)
+        if not change_ids:
+            print("  No pending provider changes")
+            print("=== Incremental Metrics Complete ===")
+            return []
+        print(f"  Pending changes: {len(change_ids):,} "
+              f"(specialties: {', '.join(sorted(points)) or 'none'})")
+
+        indexes = provider_index.load(cur)
+        count_tasks, distance_tasks, reset_tasks = [], [], []
+        affected = []
+        for geo_type in geo_types:
+            count_pairs = _count_pairs(cur, geo_type, points)
+            distance_pairs = _distance_pairs(cur, geo_type, points, changed, indexes, k)
+            print(f"    {geo_type}: {len(count_pairs):,} count pairs, "
+                  f"{len(distance_pairs):,} distance pairs")
+            if count_pairs:
+                count_tasks.append((geo_type, count_pairs))
+
+            by_spec = defaultdict(set)
+            for geo_id, spec in distance_pairs:
+                by_spec[spec].add(geo_id)
+            geo_ids, lon, lat = _load_origins(cur, geo_type)
+            for spec, ids in sorted(by_spec.items()):
+                if spec not in indexes:
+                    reset_tasks.append((geo_type, spec, sorted(ids)))
+                    continue
+                mask = np.isin(geo_ids, list(ids))
+                distance_tasks.append((geo_type, spec, _distance_rows(
+                    indexes[spec], geo_ids[mask], lon[mask], lat[mask], k,
+                )))
+            affected.extend((geo_type, geo_id, spec)
+                            for geo_id, spec in count_pairs | distance_pairs)
         conn.commit()
-        print(f"  Phase 1 complete: {rows:,} metric rows")
 
-        # -------------------------------------------------------
-        # Phase 2: Distance metrics per specialty using PostGIS KNN
-        # -------------------------------------------------------
-        print("  Phase 2: Computing distance metrics per specialty...")
+    parallel.for_each(conn, count_tasks, _update_counts, workers,
+                      describe=lambda t: f"{t[0]} counts")
+    parallel.for_each(conn, distance_tasks, _write_distances, workers,
+                      describe=lambda t: f"{t[0]} {t[1]}")
+    parallel.for_each(conn, reset_tasks, _reset_distances, workers,
+                      describe=lambda t: f"{t[0]} {t[1]} (no providers)")
 
-        # Get list of specialties
-        cur.execute("SELECT code FROM specialties ORDER BY code")
-        specialty_codes = [row[0] for row in cur.fetchall()]
+    with conn.cursor() as cur:
+        row_ids = []
+        if affected:
+            row_ids = [r[0] for r in execute_values(cur, """
+                SELECT ds.id
+                FROM (VALUES %s) AS v(geo_type, geo_id, spec)
+                JOIN dearth_scores ds
+                  ON ds.geo_type = v.geo_type
+                 AND ds.geo_id = v.geo_id
+                 AND ds.specialty_code = v.spec
+            """, affected, page_size=10000, fetch=True)]
+        cur.execute(
+            "UPDATE provider_changes SET processed_at = NOW() WHERE id = ANY(%s)",
+            (change_ids,),
+        )
+    conn.commit()
 
-        for i, spec in enumerate(specialty_codes, 1):
-            sys.stdout.write(f"\r  [{i}/{len(specialty_codes)}] {spec:<20}")
-            sys.stdout.flush()
+    print(f"  Recomputed {len(row_ids):,} of the geography-specialty rows")
+    print("=== Incremental Metrics Complete ===")
+    return row_ids
 
-            # Count providers with this specialty
-            cur.execute(
-                "SELECT COUNT(*) FROM providers WHERE %s = ANY(specialties) AND is_active",
-                (spec,),
-            )
-            provider_count = cur.fetchone()[0]
-
-            if provider_count == 0:
-                # No providers for this specialty: leave distances at 999
-                continue
-
-            # Update nearest distance, avg top-3 distance, and nearest provider info
-            # Uses PostGIS KNN operator (<->) with GIST index for fast lookups
-            cur.execute("""
-                UPDATE dearth_scores ds SET
-                    nearest_distance_miles = sub.nearest_miles,
-                    avg_distance_top3_miles = sub.avg_top3_miles,
-                    drive_time_minutes = sub.nearest_miles * 1.5,
-                    nearest_provider_npi = sub.nearest_npi,
-                    nearest_provider_lon = sub.nearest_lon,
-                    nearest_provider_lat = sub.nearest_lat,
-                    drive_time_is_estimated = FALSE
-                FROM (
-                    SELECT c.fips,
-                        nearest.d_miles AS nearest_miles,
-                        nearest.npi AS nearest_npi,
-                        nearest.lon AS nearest_lon,
-                        nearest.lat AS nearest_lat,
-                        top3.avg_miles AS avg_top3_miles
-                    FROM counties c
-                    LEFT JOIN LATERAL (
-                        SELECT
-                            ST_Distance(
-                                c.centroid::geography,
-                                p.location::geography
-                            ) / 1609.34 AS d_miles,
-                            p.npi,
-                            ST_X(p.location) AS lon,
-                            ST_Y(p.location) AS lat
-                        FROM providers p
-                        WHERE %(spec)s = ANY(p.specialties)
-                          AND p.is_active = TRUE
-                        ORDER BY c.centroid <-> p.location
-                        LIMIT 1
-                    ) nearest ON TRUE
-                    LEFT JOIN LATERAL (
-                        SELECT AVG(
-                            ST_Distance(
-                                c.centroid::geography,
-                                p.location::geography
-                            ) / 1609.34
-                        ) AS avg_miles
-                        FROM (
-                            SELECT location
-                            FROM providers p
-                            WHERE %(spec)s = ANY(p.specialties)
-                              AND p.is_active = TRUE
-                            ORDER BY c.centroid <-> p.location
-                            LIMIT 3
-                        ) AS p
-                    ) top3 ON TRUE
-                ) sub
-                WHERE ds.geo_type = 'county'
-                  AND ds.geo_id = sub.fips
-                  AND ds.specialty_code = %(spec)s;
-            """, {"spec": spec})
-            conn.commit()
 
-        print()  # newline after progress
-        print("  Phase 2 complete")
+def _distances_postgis(conn, geo_type: str, spec: str, k: int):
+    """Nearest-provider distances for one (geography, specialty) via PostGIS KNN."""
+    table, id_col, _ = GEOGRAPHIES[geo_type]
+    idx = SPECIALTY_CODES.index(spec) + 1  # SQL arrays are 1-based
 
-    print("=== Metrics Computation Complete ===")
+    # The bit is a literal in every filter so the planner can use the
+    # specialty's partial GiST index.
+    bit = SPECIALTY_BITS[spec]
+    with conn.cursor() as cur:
+        # Count sites with this specialty
+        cur.execute(
+            "SELECT COUNT(*) FROM provider_sites WHERE (specialty_mask & %s) <> 0",
+            (bit,),
+        )
+        site_count = cur.fetchone()[0]
+
+        if site_count == 0:
+            # No providers for this specialty: leave distances at 999
+            return
+
+        # Update nearest distance, avg top-k distance, and nearest provider info.
+        # Uses PostGIS KNN operator (<->) with GIST index for fast lookups; the
+        # top-k average weights the k nearest sites by their provider counts.
+        cur.execute(f"""
+            UPDATE dearth_scores ds SET
+                nearest_distance_miles = sub.nearest_miles,
+                avg_distance_top3_miles = sub.avg_top3_miles,
+                drive_time_minutes = sub.nearest_miles * {DRIVETIME_PROXY_FACTOR},
+                nearest_provider_npi = sub.nearest_npi,
+                drive_time_provider_npi = sub.nearest_npi,
+                nearest_provider_lon = sub.nearest_lon,
+                nearest_provider_lat = sub.nearest_lat,
+                drive_time_is_estimated = TRUE
+            FROM (
+                SELECT c.{id_col} AS geo_id,
+                    nearest.d_miles AS nearest_miles,
+                    nearest.npi AS nearest_npi,
+                    nearest.lon AS nearest_lon,
+                    nearest.lat AS nearest_lat,
+                    top3.avg_miles AS avg_top3_miles
+                FROM {table} c
+                LEFT JOIN LATERAL (
+                    SELECT
+                        ST_Distance(
+                            c.centroid::geography,
+                            s.location::geography
+                        ) / 1609.34 AS d_miles,
+                        s.representative_npis[%(idx)s] AS npi,
+                        ST_X(s.location) AS lon,
+                        ST_Y(s.location) AS lat
+                    FROM provider_sites s
+                    WHERE (s.specialty_mask & %(bit)s) <> 0
+                    ORDER BY c.centroid <-> s.location
+                    LIMIT 1
+                ) nearest ON TRUE
+                LEFT JOIN LATERAL (
+                    SELECT
+                        SUM(t.d_miles * LEAST(t.n, GREATEST(%(k)s - t.before, 0)))
+                        / LEAST(%(k)s, SUM(t.n)) AS avg_miles
+                    FROM (
+                        SELECT d_miles, n,
+                            COALESCE(SUM(n) OVER (
+                                ORDER BY knn
+                                ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                            ), 0) AS before
+                        FROM (
+                            SELECT
+                                ST_Distance(
+                                    c.centroid::geography,
+                                    s.location::geography
+                                ) / 1609.34 AS d_miles,
+                                s.specialty_counts[%(idx)s] AS n,
+                                c.centroid <-> s.location AS knn
+                            FROM provider_sites s
+                            WHERE (s.specialty_mask & %(bit)s) <> 0
+                            ORDER BY c.centroid <-> s.location
+                            LIMIT %(k)s
+                        ) nearest_sites
+                    ) t
+                ) top3 ON TRUE
+            ) sub
+            WHERE ds.geo_type = %(geo_type)s
+              AND ds.geo_id = sub.geo_id
+              AND ds.specialty_code = %(spec)s;
+        """, {"spec": spec, "idx": idx, "bit": bit, "k": k, "geo_type": geo_type})
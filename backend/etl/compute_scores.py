@@ -1,9 +1,12 @@
 """Compute dearth scores from provider metrics.
 
-Scoring methodology:
-- density_score = 100 * (1 - percentile_rank(density))
-- drivetime_score = 100 * percentile_rank(drive_time_minutes)
-- dearth_score = 0.6*density + 0.4*drivetime
+Scoring methodology (see etl.scoring):
+- each weighted component scores its metric by percentile rank within
+  (geo_type, specialty), e.g.
+    density_score = 100 * (1 - percentile_rank(density))
+    drivetime_score = 100 * percentile_rank(drive_time_minutes)
+- dearth_score = sum of weight * component score (SCORE_WEIGHTS,
+  by default 0.6*density + 0.4*drivetime)
 
 Labels:
   0-20  Well Served
@@ -11,95 +14,85 @@ Labels:
   41-60 Moderate Shortage
   61-80 Significant Shortage
   81-100 Severe Shortage
+
+Ranks, scores and labels are computed in one NumPy pass and written back
+with a single bulk UPDATE that skips rows whose values did not change, so
+a rescore rewrites each changed row once and leaves unchanged rows alone.
 """
 
-from .config import (
-    WEIGHT_DENSITY,
-    WEIGHT_DRIVETIME,
-    DEARTH_LABELS,
-)
+import time
+
+from . import bulk, scoring
+from .config import SCORE_WEIGHTS
+
+
+def _write_scores(conn, data: dict, result: dict, weights: dict[str, float]) -> int:
+    """Store component scores, dearth scores and labels; returns rows changed.
+
+    Components without a weight are cleared so stale scores do not linger.
+    """
+    score_columns = [score_col for _, score_col, _ in scoring.COMPONENTS.values()]
+    component_values = [
+        result[name] if name in weights else [None] * len(data["id"])
+        for name in scoring.COMPONENTS
+    ]
+    rows = zip(data["id"], *component_values, result["dearth_score"], result["dearth_label"])
+
+    columns = ([("id", "INTEGER")] + [(col, "FLOAT") for col in score_columns]
+               + [("dearth_score", "FLOAT"), ("dearth_label", "VARCHAR(20)")])
+    targets = score_columns + ["dearth_score", "dearth_label"]
+    assign = {col: f"v.{col}" for col in targets}
+    assign["computed_at"] = "NOW()"
+    with conn.cursor() as cur:
+        updated = bulk.update_from(
+            cur, "dearth_scores", columns, rows, key=["id"], assign=assign,
+            where=(f"({', '.join(f't.{col}' for col in targets)}) IS DISTINCT FROM "
+                   f"({', '.join(f'v.{col}' for col in targets)})"),
+        )
+    conn.commit()
+    return updated
+
 
+def run(conn, weights: dict[str, float] | None = None):
+    """Compute dearth scores using percentile ranks within each specialty.
 
-def run(conn):
-    """Compute dearth scores using percentile ranks within each specialty."""
+    Counties and ZCTAs are ranked separately (partitioned by geo_type).
+    `weights` maps scoring components to weights (default SCORE_WEIGHTS).
+    """
     print("=== Computing Dearth Scores ===")
+    weights = scoring.check_weights(SCORE_WEIGHTS if weights is None else weights)
+    print("  Weights: " + ", ".join(f"{name}={w:g}" for name, w in weights.items()))
 
+    start = time.perf_counter()
     with conn.cursor() as cur:
-        # Step 1: Compute percentile-based component scores
-        print("  Computing component scores (percentile ranks)...")
-        cur.execute("""
-            UPDATE dearth_scores ds SET
-                density_score = sub.density_score,
-                drivetime_score = sub.drivetime_score,
-                computed_at = NOW()
-            FROM (
-                SELECT
-                    id,
-                    100.0 * (1.0 - PERCENT_RANK() OVER (
-                        PARTITION BY specialty_code
-                        ORDER BY provider_density
-                    )) AS density_score,
-                    100.0 * PERCENT_RANK() OVER (
-                        PARTITION BY specialty_code
-                        ORDER BY drive_time_minutes
-                    ) AS drivetime_score
-                FROM dearth_scores
-            ) sub
-            WHERE ds.id = sub.id;
-        """)
-        conn.commit()
-        print(f"  Updated {cur.rowcount} component scores")
+        data = scoring.load_metrics(cur)
+    conn.commit()
+    loaded = time.perf_counter()
 
-        # Step 2: Compute composite dearth_score
-        print("  Computing composite dearth scores...")
-        cur.execute("""
-            UPDATE dearth_scores SET
-                dearth_score = LEAST(100.0, GREATEST(0.0,
-                    %(w_density)s * COALESCE(density_score, 50) +
-                    %(w_drivetime)s * COALESCE(drivetime_score, 50)
-                )),
-                computed_at = NOW();
-        """, {
-            "w_density": WEIGHT_DENSITY,
-            "w_drivetime": WEIGHT_DRIVETIME,
-        })
-        conn.commit()
-        print(f"  Updated {cur.rowcount} composite scores")
-
-        # Step 3: Assign labels based on score ranges
-        print("  Assigning dearth labels...")
-        for threshold, label in DEARTH_LABELS:
-            if label == DEARTH_LABELS[0][1]:
-                cur.execute(
-                    "UPDATE dearth_scores SET dearth_label = %s WHERE dearth_score <= %s",
-                    (label, threshold),
-                )
-            else:
-                prev_threshold = 0
-                for t, l in DEARTH_LABELS:
-                    if l == label:
-                        break
-                    prev_threshold = t
-                cur.execute(
-                    "UPDATE dearth_scores SET dearth_label = %s WHERE dearth_score > %s AND dearth_score <= %s",
-                    (label, prev_threshold, threshold),
-                )
-        conn.commit()
+    result = scoring.score(data, weights)
+    scored = time.perf_counter()
 
-        # Step 4: Refresh materialized view
+    updated = _write_scores(conn, data, result, weights)
+    written = time.perf_counter()
+    print(f"  Scored {len(data['id']):,} rows, {updated:,} changed | "
+          f"load {loaded - start:.2f}s, score {scored - loaded:.3f}s, "
+          f"write {written - scored:.2f}s")
+
+    with conn.cursor() as cur:
+        # Refresh materialized view
         print("  Refreshing materialized view county_dearth_summary...")
         cur.execute("REFRESH MATERIALIZED VIEW county_dearth_summary;")
         conn.commit()
 
         # Print summary stats
         cur.execute("""
-            SELECT dearth_label, COUNT(*)
+            SELECT geo_type, dearth_label, COUNT(*)
             FROM dearth_scores
-            GROUP BY dearth_label
-            ORDER BY MIN(dearth_score);
+            GROUP BY geo_type, dearth_label
+            ORDER BY geo_type, MIN(dearth_score);
         """)
         print("  Score distribution:")
         for row in cur.fetchall():
-            print(f"    {row[0]}: {row[1]}")
+            print(f"    {row[0]} {row[1]}: {row[2]}")
 
     print("=== Dearth Score Computation Complete ===")
@@ -13,6 +13,7 @@ DATABASE_URL = os.getenv(
 # Data directories (large files on SSD)
 DATA_DIR = os.getenv("DATA_DIR", "/Volumes/Anand-SSD/healthcare-data")
 RAW_DIR = os.path.join(DATA_DIR, "raw")
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
 
 # Parse DATABASE_URL into components for psycopg2
 def get_db_params() -> dict:
@@ -40,9 +41,52 @@ def get_db_params() -> dict:
 WEIGHT_DENSITY = 0.6
 WEIGHT_DRIVETIME = 0.4
 
+# Weighted scoring components (etl.scoring.COMPONENTS), e.g.
+# SCORE_WEIGHTS="density=0.5,drivetime=0.3,distance=0.2"
+SCORE_WEIGHTS = {
+    name.strip(): float(weight)
+    for name, weight in (
+        item.split("=", 1)
+        for item in os.getenv(
+            "SCORE_WEIGHTS", f"density={WEIGHT_DENSITY},drivetime={WEIGHT_DRIVETIME}"
+        ).split(",")
+        if item.strip()
+    )
+}
+
+# Database connections used for concurrent per-specialty work (etl.parallel)
+DB_WORKERS = int(os.getenv("DB_WORKERS", "8"))
+
+# Nearest-provider metrics (compute_metrics)
+METRICS_ENGINE = os.getenv("METRICS_ENGINE", "balltree")  # or "postgis"
+NEAREST_K = int(os.getenv("NEAREST_K", "3"))  # providers averaged per geography
+METRICS_GEO_TYPES = tuple(os.getenv("METRICS_GEO_TYPES", "county,zipcode").split(","))
+
 # OSRM routing
 OSRM_URL = os.getenv("OSRM_URL", "http://localhost:5000")
+# Comma-separated osrm-routed instances to balance routing across
+OSRM_URLS = [url.strip() for url in os.getenv("OSRM_URLS", OSRM_URL).split(",") if url.strip()]
 DRIVETIME_PROXY_FACTOR = 2.0  # fallback: minutes = 2.0 * distance_miles
+OSRM_CONCURRENCY = int(os.getenv("OSRM_CONCURRENCY", "64"))  # adaptive limit ceiling per instance
+OSRM_RETRIES = int(os.getenv("OSRM_RETRIES", "3"))  # retries per failed request
+OSRM_TIMEOUT = float(os.getenv("OSRM_TIMEOUT", "30"))  # seconds per request
+# Coordinates per /table request (osrm-routed --max-table-size, default 100);
+# 0 routes every pair with its own /route request instead
+OSRM_TABLE_SIZE = int(os.getenv("OSRM_TABLE_SIZE", "100"))
+# Road-network version keying the drive-time cache; by default taken from
+# OSRM (data_version, set by setup_osrm.sh). Without either, nothing is cached
+OSRM_DATASET_VERSION = os.getenv("OSRM_DATASET_VERSION")
+# Straight-line nearest provider sites routed per geography and specialty;
+# the drive time is the shortest of them (1 = route only the nearest)
+DRIVETIME_CANDIDATES = int(os.getenv("DRIVETIME_CANDIDATES", "3"))
+DRIVETIME_CACHE_DECIMALS = 5  # cache key precision, degrees (~1 m)
+# Drive-time source (etl.routing): "osrm", "record" (osrm + save a
+# recording), "replay" (the recording, no OSRM) or "proxy" (model fitted on
+# cached OSRM drive times)
+ROUTING_BACKEND = os.getenv("ROUTING_BACKEND", "osrm")
+ROUTING_RECORDING = os.getenv(
+    "ROUTING_RECORDING", os.path.join(CACHE_DIR, "osrm_recording.jsonl")
+)
 
 # Dearth label thresholds
 DEARTH_LABELS = [
@@ -1,18 +1,43 @@
 """Download public datasets for the Healthcare Dearth Map ETL pipeline.
 
 Downloads to DATA_DIR/raw/:
-  1. NPPES NPI Registry (~1GB zipped, ~8GB extracted)
+  1. NPPES NPI Registry (~1GB zipped, ~8GB extracted; read from the zip
+     by load_providers unless extraction is requested)
   2. Census County Gazetteer (~138KB zipped)
   3. ZCTA-County Crosswalk (~1MB)
   4. Census ZCTA Gazetteer (~1MB zipped)
   5. Census County Population Estimates (~4MB)
+  6. Census ZCTA Population, 2020 Decennial DHC (~1MB JSON from the Census API)
+
+Files are fetched concurrently. Large files are split into HTTP Range
+segments downloaded in parallel; progress is kept in `<file>.part` plus a
+`<file>.part.json` segment map, so an interrupted download resumes where it
+stopped. A file is only renamed to its final name once complete.
+
+DATA_DIR/raw/manifest.json records each file's URL, ETag, Last-Modified,
+size and sha256. Existing files are revalidated with conditional requests
+(If-None-Match / If-Modified-Since) and only re-downloaded when the server
+has a newer version; archives are only re-extracted when their sha256
+changes. run() returns the datasets whose content changed.
+
+DATA_DIR/raw/processed.json records inputs_digest() of the inputs the
+pipeline last ran to completion on (run_pipeline --if-changed).
+
+Any single file can be fetched the same way from the command line (used by
+setup_osrm.sh for the OSM PBF):
+    python -m backend.etl.download_data --url URL --dest PATH
 """
 
+import argparse
+import hashlib
+import json
 import os
-import sys
+import threading
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from .config import RAW_DIR
 
@@ -45,99 +70,479 @@ DOWNLOADS = {
         "filename": "co-est2024-alldata.csv",
         "description": "Census County Population Estimates",
     },
+    "zcta_population": {
+        "url": "https://api.census.gov/data/2020/dec/dhc?get=P1_001N&for=zip%20code%20tabulation%20area:*",
+        "filename": "zcta_population_2020.json",
+        "description": "Census ZCTA Population",
+    },
 }
 
 
-def _download_file(url: str, dest_path: str, description: str) -> None:
-    """Download a file with progress display. Skip if already exists."""
-    if os.path.exists(dest_path):
-        size_mb = os.path.getsize(dest_path) / (1024 * 1024)
-        print(f"  [SKIP] {description} already exists ({size_mb:.1f} MB)")
+# Parallel/resumable download settings
+CHUNK_SIZE = 1024 * 1024  # 1MB reads
+RANGE_THRESHOLD = 64 * 1024 * 1024  # split files larger than this into segments
+RANGE_SEGMENTS = 8  # parallel Range requests per large file
+STATE_SAVE_INTERVAL = 16 * 1024 * 1024  # persist segment progress every 16MB
+MANIFEST_FILE = "manifest.json"
+PROCESSED_FILE = "processed.json"  # inputs_digest() of the last completed pipeline run
+
+
+def _new_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=len(DOWNLOADS),
+        pool_maxsize=len(DOWNLOADS) * RANGE_SEGMENTS,
+        max_retries=2,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _load_manifest(directory: str) -> dict:
+    """Load the download manifest ({filename: entry}) for a directory."""
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(directory: str, manifest: dict) -> None:
+    path = os.path.join(directory, MANIFEST_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def inputs_digest() -> str:
+    """Fingerprint of the downloaded inputs: a hash of their manifest sha256s."""
+    manifest = _load_manifest(RAW_DIR)
+    digest = hashlib.sha256()
+    for info in DOWNLOADS.values():
+        entry = manifest.get(info["filename"]) or {}
+        digest.update(f"{info['filename']}:{entry.get('sha256')}\n".encode())
+    return digest.hexdigest()
+
+
+def last_processed() -> str | None:
+    """inputs_digest() the pipeline last ran to completion on, if any."""
+    try:
+        with open(os.path.join(RAW_DIR, PROCESSED_FILE)) as f:
+            return json.load(f).get("inputs")
+    except (OSError, ValueError):
+        return None
+
+
+def mark_processed(digest: str) -> None:
+    """Record that the pipeline completed on inputs with this digest."""
+    os.makedirs(RAW_DIR, exist_ok=True)
+    path = os.path.join(RAW_DIR, PROCESSED_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"inputs": digest}, f)
+    os.replace(path + ".tmp", path)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(4 * CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _probe(session: requests.Session, url: str,
+           entry: dict | None = None) -> requests.Response | None:
+    """HEAD `url`, conditionally on a previous manifest entry's validators.
+
+    Returns the response (status 200 or 304), or None if the server did
+    not answer the HEAD request.
+    """
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    try:
+        resp = session.head(url, headers=headers, allow_redirects=True, timeout=60)
+        resp.raise_for_status()
+    except requests.RequestException:
+        return None
+    return resp
+
+
+def _is_unchanged(resp: requests.Response, entry: dict) -> bool:
+    """True if a (conditional) HEAD response matches a manifest entry."""
+    if resp.status_code == 304:
+        return True
+    etag = resp.headers.get("etag")
+    if etag and entry.get("etag"):
+        return etag == entry["etag"]
+    last_modified = resp.headers.get("last-modified")
+    if last_modified and entry.get("last_modified"):
+        return last_modified == entry["last_modified"]
+    return False
+
+
+class _Progress:
+    """Thread-safe byte counter that reports every 10% of a file."""
+
+    def __init__(self, description: str, total: int, done: int = 0):
+        self.description = description
+        self.total = total
+        self.done = done
+        self._lock = threading.Lock()
+        self._next_report = self._step(done)
+
+    def _step(self, done: int) -> int:
+        if self.total <= 0:
+            return -1
+        return (done * 10 // self.total + 1) * self.total // 10
+
+    def add(self, n: int) -> None:
+        with self._lock:
+            self.done += n
+            if 0 <= self._next_report <= self.done:
+                pct = self.done * 100 / self.total
+                mb = self.done / (1024 * 1024)
+                print(f"    {self.description}: {mb:.1f} MB ({pct:.0f}%)")
+                self._next_report = self._step(self.done)
+
+
+def _load_segments(state_path: str, url: str, size: int,
+                   validator: str | None) -> list[list[int]] | None:
+    """Load [start, end, done] segments of a partial download, if they match."""
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (state.get("url") != url or state.get("size") != size
+            or state.get("validator") != validator):
+        return None
+    return state["segments"]
+
+
+def _save_segments(state_path: str, url: str, size: int, validator: str | None,
+                   segments: list[list[int]]) -> None:
+    tmp = state_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"url": url, "size": size, "validator": validator,
+                   "segments": segments}, f)
+    os.replace(tmp, state_path)
+
+
+def _fetch_segment(session, url, part_path, segment, progress, on_progress) -> None:
+    """Download one [start, end] byte range into its place in the part file."""
+    start, end, done = segment
+    if start + done > end:
         return
+    resp = session.get(
+        url, headers={"Range": f"bytes={start + done}-{end}"},
+        stream=True, timeout=60,
+    )
+    resp.raise_for_status()
+    if resp.status_code != 206:
+        raise IOError(f"Server ignored Range request for {url}")
+    with open(part_path, "r+b") as f:
+        f.seek(start + done)
+        for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+            f.write(chunk)
+            segment[2] += len(chunk)
+            progress.add(len(chunk))
+            on_progress(len(chunk))
+
+
+def _download_ranged(session, url, part_path, size, validator, description) -> None:
+    """Download `size` bytes as parallel Range segments, resuming if possible.
+
+    A partial download is only resumed if the server's ETag/Last-Modified
+    (`validator`) is the one it was started with.
+    """
+    state_path = part_path + ".json"
+    segments = None
+    if os.path.exists(part_path):
+        segments = _load_segments(state_path, url, size, validator)
+    if segments is None:
+        seg_size = -(-size // RANGE_SEGMENTS)
+        segments = [[start, min(start + seg_size, size) - 1, 0]
+                    for start in range(0, size, seg_size)]
+        with open(part_path, "wb") as f:
+            f.truncate(size)
+    else:
+        print(f"    Resuming partial download of {description}")
+
+    lock = threading.Lock()
+    unsaved = [0]
+
+    def on_progress(n: int) -> None:
+        with lock:
+            unsaved[0] += n
+            if unsaved[0] >= STATE_SAVE_INTERVAL:
+                unsaved[0] = 0
+                _save_segments(state_path, url, size, validator, segments)
+
+    progress = _Progress(description, size, sum(seg[2] for seg in segments))
+    _save_segments(state_path, url, size, validator, segments)
+    try:
+        with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+            futures = [
+                pool.submit(_fetch_segment, session, url, part_path, seg,
+                            progress, on_progress)
+                for seg in segments
+            ]
+            for future in futures:
+                future.result()
+    finally:
+        with lock:
+            _save_segments(state_path, url, size, validator, segments)
+
+    if progress.done != size:
+        raise IOError(f"Incomplete download of {url}: {progress.done} / {size} bytes")
+    os.remove(state_path)
+
+
+def _download_stream(session, url, part_path, size, accepts_ranges, validator,
+                     description) -> None:
+    """Download in one stream, appending to an existing part file if possible.
+
+    A part file is only resumed if it was started against the same
+    ETag/Last-Modified (`validator`), and the resume request carries
+    If-Range, so a server whose file changed since sends the whole new file.
+    """
+    state_path = part_path + ".json"
+    done = 0
+    if (os.path.exists(part_path)
+            and _load_segments(state_path, url, size, validator) is not None):
+        done = os.path.getsize(part_path)
+    headers = {}
+    if done and accepts_ranges and validator:
+        headers["Range"] = f"bytes={done}-"
+        headers["If-Range"] = validator
+        print(f"    Resuming partial download of {description}")
+
+    _save_segments(state_path, url, size, validator, [])
+    resp = session.get(url, headers=headers, stream=True, timeout=60)
+    resp.raise_for_status()
+    if resp.status_code != 206:
+        done = 0  # full response: start over
+    total = size or done + int(resp.headers.get("content-length", 0))
+
+    progress = _Progress(description, total, done)
+    with open(part_path, "ab" if done else "wb") as f:
+        for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+            f.write(chunk)
+            progress.add(len(chunk))
+    os.remove(state_path)
+
+
+def _download_file(url: str, dest_path: str, description: str,
+                   session: requests.Session | None = None,
+                   entry: dict | None = None) -> tuple[dict, bool]:
+    """Download a file unless the existing copy is current.
+
+    `entry` is the file's previous manifest entry. An existing file is
+    revalidated with a conditional HEAD request and kept if the server
+    reports it unchanged; a file that predates the manifest is kept if its
+    size matches, and any existing file is kept if the server cannot be
+    reached. Otherwise the file is downloaded, resuming a partial `.part`
+    file: files larger than RANGE_THRESHOLD from servers that accept Range
+    requests are fetched as RANGE_SEGMENTS parallel segments. The finished
+    file is moved into place with an atomic rename.
+
+    Returns (new manifest entry, whether the file's content changed).
+    """
+    session = session or _new_session()
+    if entry and entry.get("url") != url:
+        entry = None
+    exists = os.path.exists(dest_path)
+    resp = _probe(session, url, entry if exists else None)
+
+    if exists and resp is None:
+        # Server unreachable (offline, flaky): keep the local copy
+        size_mb = os.path.getsize(dest_path) / (1024 * 1024)
+        print(f"  [SKIP] {description} could not be revalidated; "
+              f"keeping local copy ({size_mb:.1f} MB)")
+        return entry or _manifest_entry(url, dest_path, None, None), False
+
+    if exists and resp is not None:
+        local_size = os.path.getsize(dest_path)
+        size_mb = local_size / (1024 * 1024)
+        if entry and _is_unchanged(resp, entry):
+            print(f"  [SKIP] {description} unchanged ({size_mb:.1f} MB)")
+            return entry, False
+        remote_size = int(resp.headers.get("content-length", 0))
+        if entry is None and remote_size in (0, local_size):
+            print(f"  [SKIP] {description} already exists ({size_mb:.1f} MB)")
+            return _manifest_entry(url, dest_path, resp, entry), True
 
     print(f"  Downloading {description}...")
     print(f"    URL: {url}")
 
-    response = requests.get(url, stream=True, timeout=60)
-    response.raise_for_status()
+    part_path = dest_path + ".part"
+    size, accepts_ranges, validator = 0, False, None
+    if resp is not None and resp.status_code == 200:
+        size = int(resp.headers.get("content-length", 0))
+        accepts_ranges = resp.headers.get("accept-ranges", "").lower() == "bytes"
+        validator = resp.headers.get("etag") or resp.headers.get("last-modified")
 
-    total = int(response.headers.get("content-length", 0))
-    downloaded = 0
-    chunk_size = 8192 * 16  # 128KB chunks
+    if accepts_ranges and size > RANGE_THRESHOLD:
+        _download_ranged(session, url, part_path, size, validator, description)
+    else:
+        _download_stream(session, url, part_path, size, accepts_ranges, validator,
+                         description)
 
-    with open(dest_path, "wb") as f:
-        for chunk in response.iter_content(chunk_size=chunk_size):
-            f.write(chunk)
-            downloaded += len(chunk)
-            if total > 0:
-                pct = downloaded * 100 / total
-                mb = downloaded / (1024 * 1024)
-                total_mb = total / (1024 * 1024)
-                sys.stdout.write(
-                    f"\r    {mb:.1f} / {total_mb:.1f} MB ({pct:.1f}%)"
-                )
-                sys.stdout.flush()
-
-    if total > 0:
-        print()  # newline after progress
+    os.replace(part_path, dest_path)
     size_mb = os.path.getsize(dest_path) / (1024 * 1024)
-    print(f"    Done: {size_mb:.1f} MB")
+    print(f"    Done: {description} ({size_mb:.1f} MB)")
+
+    new_entry = _manifest_entry(url, dest_path, resp, entry)
+    changed = entry is None or new_entry["sha256"] != entry.get("sha256")
+    return new_entry, changed
+
+
+def _manifest_entry(url: str, path: str, resp: requests.Response | None,
+                    previous: dict | None) -> dict:
+    """Describe a downloaded file; extraction records carry over from `previous`."""
+    headers = resp.headers if resp is not None else {}
+    entry = {
+        "url": url,
+        "etag": headers.get("etag"),
+        "last_modified": headers.get("last-modified"),
+        "size": os.path.getsize(path),
+        "sha256": _sha256(path),
+    }
+    if previous and "extracted" in previous:
+        entry["extracted"] = previous["extracted"]
+    return entry
+
+
+def _is_extracted(entry: dict, directory: str) -> bool:
+    """True if `entry`'s archive, at its current hash, has been extracted."""
+    extracted = entry.get("extracted")
+    return bool(
+        extracted and extracted["sha256"] == entry["sha256"]
+        and all(os.path.exists(os.path.join(directory, n)) for n in extracted["files"])
+    )
+
+
+def _record_extraction(entry: dict, directory: str, names: list[str]) -> None:
+    """Note which files `entry`'s archive extracted to, removing stale ones."""
+    previous = entry.get("extracted") or {"files": []}
+    for name in set(previous["files"]) - set(names):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+    entry["extracted"] = {"sha256": entry["sha256"], "files": names}
 
 
-def _extract_zip(zip_path: str, description: str) -> None:
-    """Extract all files from a small zip archive."""
+def _extract_zip(zip_path: str, description: str, entry: dict) -> None:
+    """Extract all files from a small zip archive, unless already extracted."""
     extract_dir = os.path.dirname(zip_path)
+    if _is_extracted(entry, extract_dir):
+        print(f"  [SKIP] {description} already extracted")
+        return
     print(f"  Extracting {description}...")
     with zipfile.ZipFile(zip_path, "r") as zf:
         zf.extractall(extract_dir)
         for name in zf.namelist():
             print(f"    -> {name}")
-
-
-def _extract_nppes(zip_path: str) -> None:
-    """Extract the main NPPES CSV from the zip file."""
+        _record_extraction(entry, extract_dir, zf.namelist())
+
+
+def find_nppes_member(zf: zipfile.ZipFile) -> str | None:
+    """Find the main data file (npidata_pfile_*.csv) in the NPPES zip."""
+    csv_files = [
+        n for n in zf.namelist()
+        if n.startswith("npidata_pfile") and n.endswith(".csv")
+        and not n.endswith("_fileheader.csv")
+    ]
+    if not csv_files:
+        # Fallback: find largest CSV
+        csv_files = sorted(
+            [n for n in zf.namelist() if n.endswith(".csv")],
+            key=lambda n: zf.getinfo(n).file_size,
+            reverse=True,
+        )
+    return csv_files[0] if csv_files else None
+
+
+def _extract_nppes(zip_path: str, entry: dict) -> None:
+    """Extract the main NPPES CSV from the zip file, unless already extracted."""
     extract_dir = os.path.dirname(zip_path)
-    # Check if already extracted
-    for f in os.listdir(extract_dir):
-        if f.startswith("npidata_pfile") and f.endswith(".csv"):
-            size_mb = os.path.getsize(os.path.join(extract_dir, f)) / (1024 * 1024)
-            print(f"  [SKIP] NPPES CSV already extracted: {f} ({size_mb:.1f} MB)")
-            return
+    if _is_extracted(entry, extract_dir):
+        name = entry["extracted"]["files"][0]
+        size_mb = os.path.getsize(os.path.join(extract_dir, name)) / (1024 * 1024)
+        print(f"  [SKIP] NPPES CSV already extracted: {name} ({size_mb:.1f} MB)")
+        return
 
-    print("  Extracting NPPES zip (this may take a few minutes)...")
     with zipfile.ZipFile(zip_path, "r") as zf:
-        # Find the main data file (npidata_pfile_*.csv), skip header/readme
-        csv_files = [
-            n for n in zf.namelist()
-            if n.startswith("npidata_pfile") and n.endswith(".csv")
-        ]
-        if not csv_files:
-            # Fallback: find largest CSV
-            csv_files = sorted(
-                [n for n in zf.namelist() if n.endswith(".csv")],
-                key=lambda n: zf.getinfo(n).file_size,
-                reverse=True,
-            )
+        target = find_nppes_member(zf)
+        dest = os.path.join(extract_dir, target) if target else None
+        if ("extracted" not in entry and dest and os.path.exists(dest)
+                and os.path.getsize(dest) == zf.getinfo(target).file_size):
+            # Extracted before the manifest existed
+            _record_extraction(entry, extract_dir, [target])
+            size_mb = os.path.getsize(dest) / (1024 * 1024)
+            print(f"  [SKIP] NPPES CSV already extracted: {target} ({size_mb:.1f} MB)")
+            return
 
-        if csv_files:
-            target = csv_files[0]
+        print("  Extracting NPPES zip (this may take a few minutes)...")
+        if target:
             print(f"    Extracting {target}...")
             zf.extract(target, extract_dir)
             print(f"    Extracted to {os.path.join(extract_dir, target)}")
+            _record_extraction(entry, extract_dir, [target])
         else:
             print("    WARNING: No CSV found in NPPES zip!")
 
 
+def _remove_stale_extracts(entry: dict, directory: str) -> None:
+    """Delete files extracted from an older version of `entry`'s archive.
+
+    Keeps an outdated NPPES CSV from shadowing a newer zip that
+    load_providers would otherwise stream from.
+    """
+    extracted = entry.get("extracted")
+    if extracted and extracted["sha256"] != entry["sha256"]:
+        _record_extraction(entry, directory, [])
+        del entry["extracted"]
+
+
 def get_nppes_csv_path() -> str:
     """Find the extracted NPPES CSV file path."""
     for f in os.listdir(RAW_DIR):
-        if f.startswith("npidata_pfile") and f.endswith(".csv"):
+        if (f.startswith("npidata_pfile") and f.endswith(".csv")
+                and not f.endswith("_fileheader.csv")):
             return os.path.join(RAW_DIR, f)
     raise FileNotFoundError(
         f"NPPES CSV not found in {RAW_DIR}. Run download_data first."
     )
 
 
+def get_nppes_source() -> tuple[str, str | None]:
+    """Locate the NPPES data for load_providers.
+
+    Returns (csv_path, None) when the CSV has been extracted, otherwise
+    (zip_path, member) so the CSV can be streamed straight out of the zip.
+    """
+    try:
+        return get_nppes_csv_path(), None
+    except FileNotFoundError:
+        pass
+
+    zip_path = os.path.join(RAW_DIR, DOWNLOADS["nppes"]["filename"])
+    if os.path.exists(zip_path):
+        with zipfile.ZipFile(zip_path, "r") as zf:
+            member = find_nppes_member(zf)
+        if member:
+            return zip_path, member
+    raise FileNotFoundError(
+        f"NPPES CSV or zip not found in {RAW_DIR}. Run download_data first."
+    )
+
+
 def get_county_gazetteer_path() -> str:
     """Find the county gazetteer txt file."""
     for f in os.listdir(RAW_DIR):
@@ -168,28 +573,85 @@ def get_population_csv_path() -> str:
     )
 
 
-def run():
-    """Download all datasets."""
-    print("=== Downloading Public Data ===")
+def get_zcta_population_path() -> str:
+    """Find the ZCTA population JSON (Census API response)."""
+    path = os.path.join(RAW_DIR, DOWNLOADS["zcta_population"]["filename"])
+    if os.path.exists(path):
+        return path
+    raise FileNotFoundError(
+        f"ZCTA population not found in {RAW_DIR}. Run download_data first."
+    )
 
-    os.makedirs(RAW_DIR, exist_ok=True)
-    print(f"  Data directory: {RAW_DIR}")
 
-    for key, info in DOWNLOADS.items():
-        dest = os.path.join(RAW_DIR, info["filename"])
-        _download_file(info["url"], dest, info["description"])
+def run(extract_nppes: bool = False) -> list[str]:
+    """Download all datasets that are missing or have changed upstream.
 
-        # Extract small census zip files
-        if info.get("extract") and os.path.exists(dest):
-            _extract_zip(dest, info["description"])
+    The NPPES CSV is only extracted when `extract_nppes` is set;
+    load_providers otherwise streams it directly from the zip.
 
-    # Extract NPPES zip
-    nppes_zip = os.path.join(RAW_DIR, DOWNLOADS["nppes"]["filename"])
-    if os.path.exists(nppes_zip):
-        _extract_nppes(nppes_zip)
+    Returns the DOWNLOADS keys whose content changed since the last run.
+    """
+    print("=== Downloading Public Data ===")
 
+    os.makedirs(RAW_DIR, exist_ok=True)
+    print(f"  Data directory: {RAW_DIR}")
+    manifest = _load_manifest(RAW_DIR)
+
+    # Fetch all files concurrently
+    session = _new_session()
+    with ThreadPoolExecutor(max_workers=len(DOWNLOADS)) as pool:
+        futures = {
+            key: pool.submit(
+                _download_file, info["url"],
+                os.path.join(RAW_DIR, info["filename"]),
+                info["description"], session, manifest.get(info["filename"]),
+            )
+            for key, info in DOWNLOADS.items()
+        }
+        changed = []
+        for key, future in futures.items():
+            manifest[DOWNLOADS[key]["filename"]], file_changed = future.result()
+            if file_changed:
+                changed.append(key)
+    _save_manifest(RAW_DIR, manifest)
+
+    # Extract small census zip files
+    for info in DOWNLOADS.values():
+        if info.get("extract"):
+            dest = os.path.join(RAW_DIR, info["filename"])
+            _extract_zip(dest, info["description"], manifest[info["filename"]])
+
+    # Extract NPPES zip (optional: load_providers can read the zip directly)
+    nppes_zip = os.path.join(RAW_DIR, DOWNLOADS["nppes"]["filename"])
+    nppes_entry = manifest[DOWNLOADS["nppes"]["filename"]]
+    if extract_nppes:
+        _extract_nppes(nppes_zip, nppes_entry)
+    else:
+        _remove_stale_extracts(nppes_entry, RAW_DIR)
+    _save_manifest(RAW_DIR, manifest)
+
+    if changed:
+        print(f"  Changed: {', '.join(changed)}")
+    else:
+        print("  All inputs unchanged")
     print("=== Downloads Complete ===")
+    return changed
 
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="Download ETL input data")
+    parser.add_argument("--url", help="Download a single file from this URL")
+    parser.add_argument("--dest", help="Destination path for --url")
+    args = parser.parse_args()
+    if args.url:
+        if not args.dest:
+            parser.error("--dest is required with --url")
+        dest_dir = os.path.dirname(os.path.abspath(args.dest))
+        name = os.path.basename(args.dest)
+        manifest = _load_manifest(dest_dir)
+        manifest[name], _ = _download_file(
+            args.url, args.dest, name, entry=manifest.get(name),
+        )
+        _save_manifest(dest_dir, manifest)
+    else:
+        run()
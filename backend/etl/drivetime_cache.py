@@ -0,0 +1,100 @@
+"""Persistent cache of OSRM drive times across pipeline runs.
+
+County and ZCTA centroids never move and provider sites (ZCTA centroids)
+rarely do, so most (origin, destination) pairs of a run were already routed
+by the previous one. `drivetime_cache` stores every OSRM answer keyed by
+the road-network dataset version and the pair's coordinates rounded to
+DRIVETIME_CACHE_DECIMALS; compute_drivetimes routes only the misses.
+
+A pair OSRM answered with "no route" is cached as NULL, so it is not
+retried either. A new road network gets a new dataset version and
+therefore an empty cache.
+"""
+
+from . import bulk
+from .config import DRIVETIME_CACHE_DECIMALS, OSRM_DATASET_VERSION
+
+_SCALE = 10 ** DRIVETIME_CACHE_DECIMALS
+_KEY_COLUMNS = [("origin_lon", "BIGINT"), ("origin_lat", "BIGINT"),
+                ("dest_lon", "BIGINT"), ("dest_lat", "BIGINT")]
+
+
+def quantize(pair: tuple) -> tuple:
+    """Quantize ((lon, lat), (lon, lat)) to scaled integers."""
+    (o_lon, o_lat), (d_lon, d_lat) = pair
+    return (round(o_lon * _SCALE), round(o_lat * _SCALE),
+            round(d_lon * _SCALE), round(d_lat * _SCALE))
+
+
+def dataset_version(probe: dict | None) -> str | None:
+    """Road-network version of the OSRM dataset.
+
+    OSRM_DATASET_VERSION if set; otherwise the `data_version` OSRM reports
+    (osrm-extract --data_version, set by setup_osrm.sh). None, and so no
+    caching, if neither is available: nothing else reliably changes when
+    the road network is rebuilt.
+    """
+    if OSRM_DATASET_VERSION:
+        return OSRM_DATASET_VERSION
+    if probe is None:
+        return None
+    if probe.get("data_version"):
+        return str(probe["data_version"])
+    print("  WARNING: OSRM reports no data_version and OSRM_DATASET_VERSION is unset;")
+    print("  drive times will not be cached. Re-extract with setup_osrm.sh")
+    print("  (osrm-extract --data_version) or set OSRM_DATASET_VERSION.")
+    return None
+
+
+def lookup(conn, version: str, pairs) -> dict:
+    """Cached durations (seconds, or None for no route) of the given pairs.
+
+    Pairs are ((origin_lon, origin_lat), (dest_lon, dest_lat)); pairs not in
+    the cache are absent from the result.
+    """
+    by_key = {}
+    for pair in pairs:
+        by_key.setdefault(quantize(pair), []).append(pair)
+    if not by_key:
+        return {}
+
+    with conn.cursor() as cur:
+        bulk.temp_table(cur, "drivetime_lookup", _KEY_COLUMNS, list(by_key))
+        cur.execute("""
+            SELECT c.origin_lon, c.origin_lat, c.dest_lon, c.dest_lat, c.duration_seconds
+            FROM drivetime_lookup l
+            JOIN drivetime_cache c
+                ON c.dataset_version = %s
+                AND (c.origin_lon, c.origin_lat, c.dest_lon, c.dest_lat)
+                    = (l.origin_lon, l.origin_lat, l.dest_lon, l.dest_lat)
+        """, (version,))
+        cached = {}
+        for *key, duration in cur.fetchall():
+            for pair in by_key[tuple(key)]:
+                cached[pair] = duration
+    conn.commit()
+    return cached
+
+
+def store(conn, version: str, durations: dict) -> None:
+    """Cache OSRM answers: {pair: seconds, or None for no route}."""
+    values = {quantize(pair): duration for pair, duration in durations.items()}
+    if not values:
+        return
+    with conn.cursor() as cur:
+        bulk.temp_table(
+            cur, "drivetime_new", _KEY_COLUMNS + [("duration_seconds", "FLOAT")],
+            [(*key, duration) for key, duration in values.items()],
+        )
+        cur.execute("""
+            INSERT INTO drivetime_cache (
+                dataset_version, origin_lon, origin_lat, dest_lon, dest_lat,
+                duration_seconds
+            )
+            SELECT %s, origin_lon, origin_lat, dest_lon, dest_lat, duration_seconds
+            FROM drivetime_new
+            ON CONFLICT (dataset_version, origin_lon, origin_lat, dest_lon, dest_lat)
+            DO UPDATE SET duration_seconds = EXCLUDED.duration_seconds,
+                          routed_at = NOW()
+        """, (version,))
+    conn.commit()
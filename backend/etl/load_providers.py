@@ -1,23 +1,47 @@
 """Load healthcare providers from the NPPES NPI Registry.
 
-Processes the ~8GB NPPES CSV in chunks of 50,000 rows:
+Processes the ~8GB NPPES CSV in shards of whole records:
   - Filters to Entity Type 1 (individuals)
   - Matches taxonomy codes to our specialty mapping
   - Geocodes via ZCTA centroid lookup
-  - Batch inserts into the `providers` table
+  - Streams rows into an UNLOGGED staging table with binary COPY
+  - Merges the staging table into `providers` in one statement
+
+The CSV is read either from an extracted file (split into byte-range
+shards) or streamed straight out of the NPPES zip (cut into blocks on
+record boundaries as it is decompressed). Shards/blocks are parsed
+in-process by default, or in a pool of worker processes when
+`workers > 1`. Each one is encoded as a binary COPY payload by the
+process that parsed it.
+
+A full parse also writes every individual to a Parquet cache (see
+provider_cache). When the cache matches the NPPES source, later runs
+rebuild the table from it instead of parsing the CSV.
 
 Expected output: ~200K-400K providers after specialty filtering.
+
+`run_incremental` applies a weekly NPPES delta file instead: changed NPIs
+are upserted, NPIs that were deactivated or no longer qualify are marked
+inactive, and every location/specialty change is recorded in
+`provider_changes` for downstream stages.
 """
 
 import csv
+import hashlib
+import io
+import json
+import multiprocessing
 import os
+import re
+import struct
 import sys
-
-from psycopg2.extras import execute_values
+import zipfile
+from collections import Counter, deque
 
 from .config import RAW_DIR
-from .download_data import get_nppes_csv_path
-from .taxonomy_mapping import SPECIALTY_MAPPING, ALL_TAXONOMY_CODES
+from .download_data import find_nppes_member, get_nppes_source
+from . import provider_cache
+from .taxonomy_mapping import SPECIALTY_MAPPING, ALL_TAXONOMY_CODES, specialty_mask
 
 # NPPES CSV column indices (0-indexed)
 COL_NPI = 0
@@ -28,6 +52,8 @@ COL_PRACTICE_ADDRESS = 28
 COL_PRACTICE_CITY = 30
 COL_PRACTICE_STATE = 31
 COL_PRACTICE_ZIP = 32
+COL_DEACTIVATION_DATE = 39
+COL_REACTIVATION_DATE = 40
 # Taxonomy codes are at columns 47, 50, 53, ... (every 3 from 47)
 TAXONOMY_COL_START = 47
 TAXONOMY_COL_STEP = 4  # Columns: taxonomy, license_num, license_state, primary_switch
@@ -66,132 +92,866 @@ def _map_specialties(taxonomy_codes: list[str]) -> list[str]:
     return sorted(specialties)
 
 
-def run(conn):
-    """Load providers from NPPES into the database."""
-    print("=== Loading Providers from NPPES ===")
+def _individual_fields(row: list[str]) -> tuple | None:
+    """Extract the fields we keep from an Entity Type 1 (individual) row.
+
+    Returns (npi, name, address, city, state, zipcode, taxonomy_codes),
+    or None for organizations and malformed rows.
+    """
+    # Filter: Entity Type 1 = Individual
+    if len(row) <= COL_ENTITY_TYPE or row[COL_ENTITY_TYPE].strip() != "1":
+        return None
+
+    npi = row[COL_NPI].strip()
+    first_name = row[COL_FIRST_NAME].strip() if COL_FIRST_NAME < len(row) else ""
+    last_name = row[COL_LAST_NAME].strip() if COL_LAST_NAME < len(row) else ""
+    name = f"{first_name} {last_name}".strip()
+
+    address = row[COL_PRACTICE_ADDRESS].strip()[:200] if COL_PRACTICE_ADDRESS < len(row) else ""
+    city = row[COL_PRACTICE_CITY].strip()[:100] if COL_PRACTICE_CITY < len(row) else ""
+    state = row[COL_PRACTICE_STATE].strip()[:2] if COL_PRACTICE_STATE < len(row) else ""
+    zipcode = row[COL_PRACTICE_ZIP].strip()[:5] if COL_PRACTICE_ZIP < len(row) else ""
+
+    return (npi, name, address, city, state, zipcode, _extract_taxonomy_codes(row))
 
-    csv_path = get_nppes_csv_path()
-    print(f"  NPPES CSV: {csv_path}")
+
+def _to_provider(fields: tuple, zcta_lookup: dict, counters: Counter):
+    """Map an individual's taxonomies to specialties and geocode it.
+
+    Returns a provider insert tuple, or None if the individual is filtered out.
+    """
+    npi, name, address, city, state, zipcode, taxonomy_codes = fields
+
+    # Check if any taxonomy code matches our mapping
+    matched_taxonomies = [c for c in taxonomy_codes if c in ALL_TAXONOMY_CODES]
+    if not matched_taxonomies:
+        return None
+
+    specialties = _map_specialties(matched_taxonomies)
+    counters["matched"] += 1
+
+    # Geocode via ZCTA centroid
+    coords = zcta_lookup.get(zipcode)
+    if not coords:
+        return None
+
+    counters["geocoded"] += 1
+    lat, lon = coords
+
+    return (
+        npi, 1, name, address, city, state, zipcode,
+        _point_wkb(lon, lat),
+        matched_taxonomies, specialties, True,
+    )
+
+
+def _process_row(row: list[str], zcta_lookup: dict, counters: Counter):
+    """Filter, map and geocode one NPPES row.
+
+    Returns a provider insert tuple, or None if the row is filtered out.
+    """
+    counters["read"] += 1
+    fields = _individual_fields(row)
+    if fields is None:
+        return None
+    return _to_provider(fields, zcta_lookup, counters)
+
+
+# ---------------------------------------------------------------------------
+# Binary COPY encoding (PostgreSQL COPY ... FROM STDIN (FORMAT binary))
+# ---------------------------------------------------------------------------
+
+STAGING_TABLE = "providers_staging"
+# Weekly deltas stage into a temp table of their own, so applying one never
+# touches the rows (and checkpoint) of an interrupted full load.
+DELTA_STAGING_TABLE = "providers_delta_staging"
+
+# Column order shared by the staging table, the COPY payload and the merge.
+# specialty_mask is derived from specialties while encoding.
+PROVIDER_COLUMNS = (
+    "npi", "entity_type", "name", "address_line1", "city", "state",
+    "zipcode", "location", "taxonomy_codes", "specialties", "specialty_mask",
+    "is_active",
+)
+
+_COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_COPY_TRAILER = struct.pack("!h", -1)
+_TEXT_OID = 25
+
+
+def _point_wkb(lon: float, lat: float) -> bytes:
+    """Encode a point as little-endian WKB (SRID applied during the merge)."""
+    return struct.pack("<BIdd", 1, 1, lon, lat)
+
+
+def _copy_bytes(value: bytes) -> bytes:
+    return struct.pack("!i", len(value)) + value
+
+
+def _copy_text(value: str) -> bytes:
+    return _copy_bytes(value.encode("utf-8"))
+
+
+def _copy_text_array(values: list[str]) -> bytes:
+    """Encode a one-dimensional text[] in PostgreSQL's array_recv format."""
+    if not values:
+        return _copy_bytes(struct.pack("!iii", 0, 0, _TEXT_OID))
+    parts = [struct.pack("!iiiii", 1, 0, _TEXT_OID, len(values), 1)]
+    parts.extend(_copy_text(v) for v in values)
+    return _copy_bytes(b"".join(parts))
+
+
+def _encode_copy(rows: list[tuple]) -> bytes:
+    """Encode provider rows as a complete binary COPY stream."""
+    field_count = struct.pack("!h", len(PROVIDER_COLUMNS))
+    out = [_COPY_HEADER]
+    for (npi, entity_type, name, address, city, state, zipcode, wkb,
+         taxonomy_codes, specialties, is_active) in rows:
+        out.append(b"".join((
+            field_count,
+            _copy_text(npi),
+            struct.pack("!ii", 4, entity_type),
+            _copy_text(name),
+            _copy_text(address),
+            _copy_text(city),
+            _copy_text(state),
+            _copy_text(zipcode),
+            _copy_bytes(wkb),
+            _copy_text_array(taxonomy_codes),
+            _copy_text_array(specialties),
+            struct.pack("!ii", 4, specialty_mask(specialties)),
+            struct.pack("!i?", 1, is_active),
+        )))
+    out.append(_COPY_TRAILER)
+    return b"".join(out)
+
+
+_STAGING_COLUMNS = """
+    npi VARCHAR(10),
+    entity_type INTEGER,
+    name TEXT,
+    address_line1 TEXT,
+    city TEXT,
+    state TEXT,
+    zipcode TEXT,
+    location BYTEA,
+    taxonomy_codes TEXT[],
+    specialties TEXT[],
+    specialty_mask INTEGER,
+    is_active BOOLEAN
+"""
+
+
+def _create_staging(cur) -> None:
+    """Create (or empty) the UNLOGGED staging table for bulk loads."""
+    cur.execute(f"CREATE UNLOGGED TABLE IF NOT EXISTS {STAGING_TABLE} ({_STAGING_COLUMNS})")
+    cur.execute(f"TRUNCATE {STAGING_TABLE}")
+
+
+def _create_delta_staging(cur) -> None:
+    """Create the temp staging table of a weekly delta (dropped at commit)."""
+    cur.execute(f"CREATE TEMP TABLE {DELTA_STAGING_TABLE} ({_STAGING_COLUMNS}) ON COMMIT DROP")
+
+
+def _copy_to_staging(cur, payload: bytes, table: str = STAGING_TABLE) -> None:
+    """Stream one binary COPY payload into a staging table."""
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(PROVIDER_COLUMNS)}) "
+        "FROM STDIN (FORMAT binary)",
+        io.BytesIO(payload),
+    )
+
+
+def _merge_staging(cur, table: str = STAGING_TABLE) -> int:
+    """Upsert a staging table into `providers` in one statement."""
+    cur.execute(f"""
+        INSERT INTO providers ({', '.join(PROVIDER_COLUMNS)})
+        SELECT DISTINCT ON (npi)
+            npi, entity_type, name, address_line1, city, state, zipcode,
+            ST_GeomFromWKB(location, 4326), taxonomy_codes, specialties,
+            specialty_mask, is_active
+        FROM {table}
+        ORDER BY npi
+        ON CONFLICT (npi) DO UPDATE SET
+            name = EXCLUDED.name,
+            address_line1 = EXCLUDED.address_line1,
+            city = EXCLUDED.city,
+            state = EXCLUDED.state,
+            zipcode = EXCLUDED.zipcode,
+            location = EXCLUDED.location,
+            taxonomy_codes = EXCLUDED.taxonomy_codes,
+            specialties = EXCLUDED.specialties,
+            specialty_mask = EXCLUDED.specialty_mask,
+            is_active = EXCLUDED.is_active
+    """)
+    return cur.rowcount
+
+
+# ---------------------------------------------------------------------------
+# Sharding: split the CSV into byte ranges that start on a record boundary
+# ---------------------------------------------------------------------------
+
+SHARD_SIZE = 256 * 1024 * 1024  # ~256MB of CSV per shard
+
+# Every NPPES record starts with a quoted 10-digit NPI followed by the next
+# quoted field. A newline embedded in a quoted field is never followed by
+# this pattern, so it marks a safe place to cut the file.
+_ROW_START = re.compile(rb'"\d{10}","')
+
+
+def _next_row_start(f, offset: int, file_size: int) -> int:
+    """Return the byte offset of the first record starting at/after `offset`."""
+    if offset >= file_size:
+        return file_size
+    f.seek(offset - 1)
+    f.readline()  # finish the (possibly partial) line containing offset - 1
+    pos = f.tell()
+    while pos < file_size:
+        line = f.readline()
+        if _ROW_START.match(line):
+            return pos
+        pos += len(line)
+    return file_size
+
+
+def _plan_shards(csv_path: str, workers: int,
+                 start: int | None = None) -> list[tuple[int, int]]:
+    """Split the CSV into (start, end) byte ranges on record boundaries.
+
+    Covers everything after the header, or from `start` (a record
+    boundary, e.g. a checkpoint) when given.
+    """
     file_size = os.path.getsize(csv_path)
-    print(f"  File size: {file_size / (1024**3):.1f} GB")
+    with open(csv_path, "rb") as f:
+        if start is None:
+            f.readline()  # header row
+            data_start = f.tell()
+        else:
+            data_start = start
+        n_shards = max(workers, -(-(file_size - data_start) // SHARD_SIZE), 1)
+        step = (file_size - data_start) // n_shards or 1
+
+        bounds = [data_start]
+        for i in range(1, n_shards):
+            cut = _next_row_start(f, data_start + i * step, file_size)
+            if cut > bounds[-1]:
+                bounds.append(cut)
+        bounds.append(file_size)
+
+    return [(bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)
+            if bounds[i] < bounds[i + 1]]
+
+
+def _iter_shard_lines(f, start: int, end: int):
+    """Yield raw lines from the byte range [start, end)."""
+    f.seek(start)
+    pos = start
+    while pos < end:
+        line = f.readline()
+        if not line:
+            break
+        pos += len(line)
+        yield line
+
+
+# ---------------------------------------------------------------------------
+# Byte-level pre-filter: skip decoding/splitting rows that cannot match
+# ---------------------------------------------------------------------------
+
+# Mapped NUCC taxonomy codes (10 characters ending in "X") as bytes
+_TAXONOMY_CODES_BYTES = frozenset(code.encode("ascii") for code in ALL_TAXONOMY_CODES)
+
+
+def _iter_records(lines):
+    """Group raw lines into whole CSV records.
+
+    A record continues onto the next line while it holds an odd number of
+    quote characters (i.e. a quoted field contains a newline).
+    """
+    parts = []
+    quotes = 0
+    for line in lines:
+        quotes += line.count(b'"')
+        if quotes % 2:
+            parts.append(line)
+            continue
+        if parts:
+            parts.append(line)
+            line = b"".join(parts)
+            parts = []
+        quotes = 0
+        yield line
+    if parts:
+        yield b"".join(parts)
+
+
+def _may_be_individual(record: bytes) -> bool:
+    """Cheap test on the raw record: can it be an Entity Type 1 row?
+
+    NPPES quotes every field, so the record starts with "<10-digit NPI>",
+    followed by the quoted entity type. Rows with another layout are passed
+    through to the full parser.
+    """
+    if record[:1] != b'"' or record[11:14] != b'","':
+        return True
+    return record[14:17] == b'1",'
+
+
+def _may_match(record: bytes) -> bool:
+    """Cheap test on the raw record: can it possibly yield a provider?
+
+    On top of `_may_be_individual`, taxonomy codes are found by scanning for
+    the closing `X"` of a quoted code and looking up the 10 bytes before it.
+    """
+    if not _may_be_individual(record):
+        return False
+    pos = record.find(b'X"')
+    while pos != -1:
+        if record[pos - 9:pos + 1] in _TAXONOMY_CODES_BYTES:
+            return True
+        pos = record.find(b'X"', pos + 2)
+    return False
+
+
+# Per-process parse state (set by _init_worker)
+_worker_zcta_lookup: dict[str, tuple[float, float]] = {}
+_worker_cache_dir: str | None = None
+
+
+def _init_worker(zcta_lookup: dict, cache_dir: str | None = None) -> None:
+    global _worker_zcta_lookup, _worker_cache_dir
+    _worker_zcta_lookup = zcta_lookup
+    _worker_cache_dir = cache_dir
+
+
+def _parse_lines(lines, part: int) -> tuple[bytes, int, Counter]:
+    """Parse raw CSV lines. Returns (binary COPY payload, provider rows, counters).
+
+    Only records that pass the byte-level pre-filter are decoded and split
+    into columns. While a provider cache is being built, every individual
+    is kept (not just mapped ones) and written as cache part `part`.
+    """
+    counters = Counter()
+    prefilter = _may_be_individual if _worker_cache_dir else _may_match
+
+    def candidates():
+        for record in _iter_records(lines):
+            if prefilter(record):
+                yield record.decode("utf-8", errors="replace")
+            else:
+                counters["read"] += 1
+
+    rows = []
+    individuals = []
+    for row in csv.reader(candidates()):
+        counters["read"] += 1
+        fields = _individual_fields(row)
+        if fields is None:
+            continue
+        if _worker_cache_dir:
+            individuals.append(fields)
+        provider = _to_provider(fields, _worker_zcta_lookup, counters)
+        if provider is not None:
+            rows.append(provider)
+
+    if _worker_cache_dir:
+        provider_cache.write_part(_worker_cache_dir, part, individuals)
+    return _encode_copy(rows), len(rows), counters
+
+
+def _parse_shard(task: tuple[str, int, int]) -> tuple[bytes, int, Counter, int]:
+    """Parse one byte-range shard of an extracted CSV.
+
+    Returns (binary COPY payload, provider rows, counters, end offset).
+    """
+    csv_path, start, end = task
+    with open(csv_path, "rb") as f:
+        payload, n_rows, counters = _parse_lines(
+            _iter_shard_lines(f, start, end), part=start,
+        )
+    counters["progress"] = end - start
+    return payload, n_rows, counters, end
+
+
+def _parse_block(task: tuple[int, bytes]) -> tuple[bytes, int, Counter, int]:
+    """Parse one block of whole records cut from the zip stream.
+
+    Returns (binary COPY payload, provider rows, counters, end offset).
+    """
+    offset, data = task
+    payload, n_rows, counters = _parse_lines(io.BytesIO(data), part=offset)
+    counters["progress"] = len(data)
+    return payload, n_rows, counters, offset + len(data)
+
+
+# ---------------------------------------------------------------------------
+# Zip streaming: cut the decompressed stream into blocks of whole records
+# ---------------------------------------------------------------------------
+
+BLOCK_SIZE = 64 * 1024 * 1024  # decompressed bytes handed to a worker at once
+ZIP_READ_BUFFER = 4 * 1024 * 1024  # buffer for reading compressed bytes
+
+
+def _last_row_start(buf: bytes) -> int:
+    """Return the index of the last record start in `buf` (0 if none)."""
+    pos = len(buf)
+    while True:
+        pos = buf.rfind(b"\n\"", 0, pos)
+        if pos < 0:
+            return 0
+        if _ROW_START.match(buf, pos + 1):
+            return pos + 1
+
+
+def _iter_zip_blocks(zip_path: str, member: str, start: int | None = None):
+    """Stream `member` out of the zip, yielding (offset, block) pairs.
+
+    Each block holds whole records; `offset` is its position in the
+    decompressed CSV. With `start` (a record boundary, e.g. a checkpoint),
+    everything before it is decompressed and discarded.
+    """
+    with open(zip_path, "rb", buffering=ZIP_READ_BUFFER) as raw, \
+            zipfile.ZipFile(raw) as zf, zf.open(member) as stream:
+        if start is None:
+            offset = len(stream.readline())  # header row
+        else:
+            offset = 0
+            while offset < start:
+                skipped = len(stream.read(min(BLOCK_SIZE, start - offset)))
+                if not skipped:
+                    return
+                offset += skipped
+        carry = b""
+        while True:
+            data = stream.read(BLOCK_SIZE)
+            if not data:
+                if carry:
+                    yield offset, carry
+                return
+            buf = carry + data
+            cut = _last_row_start(buf)
+            if cut == 0:
+                carry = buf
+                continue
+            yield offset, buf[:cut]
+            offset += cut
+            carry = buf[cut:]
+
+
+def _imap_bounded(pool, func, tasks, window: int):
+    """Like pool.imap, but keeps at most `window` tasks in flight.
+
+    Pool.imap drains its input eagerly, which would decompress the whole
+    zip into memory; this pulls the next block only as results come back.
+    """
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.apply_async(func, (task,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+# ---------------------------------------------------------------------------
+# Checkpoints: resume an interrupted load from the last committed batch
+# ---------------------------------------------------------------------------
+
+CHECKPOINT_STAGE = "load_providers"
+
+
+def _load_checkpoint(cur, source_key: dict) -> tuple[int, int, Counter] | None:
+    """Return (byte offset, batch number, counters) to resume from, if usable.
+
+    The checkpoint must belong to the same source file, and the staging
+    table must still hold every row it recorded (UNLOGGED tables are
+    emptied by a server crash).
+    """
+    cur.execute("""
+        SELECT source_key, byte_offset, batch_no, counters
+        FROM etl_checkpoints WHERE stage = %s
+    """, (CHECKPOINT_STAGE,))
+    row = cur.fetchone()
+    if not row or json.loads(row[0]) != source_key:
+        return None
+    byte_offset, batch_no, counters = row[1], row[2], Counter(row[3])
+
+    cur.execute("SELECT to_regclass(%s)", (STAGING_TABLE,))
+    if cur.fetchone()[0] is None:
+        return None
+    cur.execute(f"SELECT COUNT(*) FROM {STAGING_TABLE}")
+    if cur.fetchone()[0] != counters["staged"]:
+        return None
+    return byte_offset, batch_no, counters
+
+
+def _save_checkpoint(cur, source_key: dict, byte_offset: int, batch_no: int,
+                     counters: Counter) -> None:
+    cur.execute("""
+        INSERT INTO etl_checkpoints (stage, source_key, byte_offset, batch_no, counters)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (stage) DO UPDATE SET
+            source_key = EXCLUDED.source_key,
+            byte_offset = EXCLUDED.byte_offset,
+            batch_no = EXCLUDED.batch_no,
+            counters = EXCLUDED.counters,
+            updated_at = NOW()
+    """, (CHECKPOINT_STAGE, json.dumps(source_key), byte_offset, batch_no,
+          json.dumps(dict(counters))))
+
+
+def _clear_checkpoint(cur) -> None:
+    cur.execute("DELETE FROM etl_checkpoints WHERE stage = %s", (CHECKPOINT_STAGE,))
+
+
+def _iter_cached_providers(mapped, n_individuals: int, zcta_lookup: dict,
+                           chunk_size: int = 200_000):
+    """Geocode mapped individuals from the provider cache.
+
+    Yields (binary COPY payload, provider rows, counters, None) like the
+    parsers; cache rebuilds are quick, so there is no resume offset.
+    """
+    for start in range(0, mapped.num_rows, chunk_size):
+        chunk = mapped.slice(start, chunk_size).to_pydict()
+        counters = Counter(
+            read=n_individuals if start == 0 else 0,
+            matched=len(chunk["npi"]),
+            progress=len(chunk["npi"]),
+        )
+        rows = []
+        for npi, name, address, city, state, zipcode, taxonomy_codes, specialties in zip(
+            chunk["npi"], chunk["name"], chunk["address"], chunk["city"],
+            chunk["state"], chunk["zipcode"], chunk["taxonomy_codes"],
+            chunk["specialties"],
+        ):
+            coords = zcta_lookup.get(zipcode)
+            if not coords:
+                continue
+            lat, lon = coords
+            rows.append((
+                npi, 1, name, address, city, state, zipcode,
+                _point_wkb(lon, lat), taxonomy_codes, specialties, True,
+            ))
+        counters["geocoded"] = len(rows)
+        yield _encode_copy(rows), len(rows), counters, None
+
+
+def run(conn, workers: int = 1, use_cache: bool = True, resume: bool = False):
+    """Load providers from NPPES into the database.
+
+    Args:
+        conn: psycopg2 connection
+        workers: number of worker processes used to parse CSV shards
+        use_cache: rebuild from the Parquet provider cache when it matches
+            the NPPES source, and (re)build the cache when it does not
+        resume: continue an interrupted CSV parse from its last checkpoint
+    """
+    print("=== Loading Providers from NPPES ===")
+
+    source_path, member = get_nppes_source()
+    if member:
+        with zipfile.ZipFile(source_path, "r") as zf:
+            data_size = zf.getinfo(member).file_size
+        print(f"  NPPES zip: {source_path} (streaming {member})")
+    else:
+        data_size = os.path.getsize(source_path)
+        print(f"  NPPES CSV: {source_path}")
+    print(f"  File size: {data_size / (1024**3):.1f} GB")
 
     # Build ZCTA lookup
     zcta_lookup = _build_zcta_lookup(conn)
     print(f"  ZCTA centroid lookup: {len(zcta_lookup)} entries")
 
-    with conn.cursor() as cur:
-        cur.execute("DELETE FROM providers")
+    source_key = provider_cache.source_key(source_path, member)
+    from_cache = use_cache and provider_cache.is_current(source_key)
+
+    checkpoint = None
+    if resume and not from_cache:
+        with conn.cursor() as cur:
+            checkpoint = _load_checkpoint(cur, source_key)
+        if checkpoint is None:
+            print("  No usable checkpoint found; starting from the beginning")
+
+    if checkpoint:
+        start_offset, batch_no, totals = checkpoint
+        print(f"  Resuming at byte {start_offset:,} after batch {batch_no} "
+              f"({totals['staged']:,} rows already staged)")
+    else:
+        start_offset, batch_no, totals = None, 0, Counter()
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM providers")
+            _create_staging(cur)
+            _clear_checkpoint(cur)
         conn.commit()
 
-    # Process CSV in chunks
-    chunk_size = 50_000
-    insert_batch_size = 2000
-    total_read = 0
-    total_matched = 0
-    total_geocoded = 0
-    total_inserted = 0
-    pending_rows = []
+    cache_dir = None
+    pool = None
+    plural = "s" if workers != 1 else ""
+
+    if from_cache:
+        print(f"  Rebuilding from provider cache: {provider_cache.CACHE_PATH}")
+        mapped, n_individuals = provider_cache.load_mapped()
+        progress_total = mapped.num_rows
+        results = _iter_cached_providers(mapped, n_individuals, zcta_lookup)
+    else:
+        if use_cache:
+            cache_dir = provider_cache.begin_build(resume_from=start_offset)
+            if cache_dir:
+                print(f"  Building provider cache: {provider_cache.CACHE_PATH}")
+        progress_total = data_size
+        if member:
+            parse = _parse_block
+            tasks = _iter_zip_blocks(source_path, member, start=start_offset)
+            print(f"  Streaming NPPES CSV from zip ({workers} worker{plural})...")
+        else:
+            parse = _parse_shard
+            tasks = [(source_path, start, end) for start, end
+                     in _plan_shards(source_path, workers, start=start_offset)]
+            print(f"  Processing NPPES CSV in {len(tasks)} shards "
+                  f"({workers} worker{plural})...")
+
+        if workers > 1:
+            pool = multiprocessing.Pool(
+                workers, initializer=_init_worker,
+                initargs=(zcta_lookup, cache_dir),
+            )
+            results = _imap_bounded(pool, parse, tasks, window=workers * 2)
+        else:
+            _init_worker(zcta_lookup, cache_dir)
+            results = map(parse, tasks)
 
-    print("  Processing NPPES CSV...")
-
-    with open(csv_path, "r", encoding="utf-8", errors="replace") as f:
-        reader = csv.reader(f)
-        header = next(reader)  # Skip header row
-
-        for row in reader:
-            total_read += 1
-
-            # Progress every 500K rows
-            if total_read % 500_000 == 0:
+    try:
+        with conn.cursor() as cur:
+            for payload, n_rows, counters, end in results:
+                totals.update(counters)
+                totals["staged"] += n_rows
+                _copy_to_staging(cur, payload)
+
+                # Commit each parsed shard/block together with its checkpoint
+                if end is not None:
+                    batch_no += 1
+                    _save_checkpoint(cur, source_key, end, batch_no, totals)
+                    conn.commit()
+
+                pct = totals["progress"] * 100 / progress_total if progress_total else 100
                 sys.stdout.write(
-                    f"\r  Processed {total_read:,} rows | "
-                    f"Matched: {total_matched:,} | "
-                    f"Geocoded: {total_geocoded:,}"
+                    f"\r  [{pct:5.1f}%] Processed {totals['read']:,} rows | "
+                    f"Matched: {totals['matched']:,} | "
+                    f"Geocoded: {totals['geocoded']:,}"
                 )
                 sys.stdout.flush()
+            print()  # newline after progress
 
-            # Filter: Entity Type 1 = Individual
-            if len(row) <= COL_ENTITY_TYPE or row[COL_ENTITY_TYPE].strip() != "1":
-                continue
+            print(f"  Merging {totals['staged']:,} staged rows into providers...")
+            total_inserted = _merge_staging(cur)
+            cur.execute(f"TRUNCATE {STAGING_TABLE}")
+            _clear_checkpoint(cur)
+        conn.commit()
 
-            # Extract taxonomy codes and match to specialties
-            taxonomy_codes = _extract_taxonomy_codes(row)
-            if not taxonomy_codes:
-                continue
+        if cache_dir:
+            provider_cache.commit_build(cache_dir, source_key)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if from_cache:
+        print(f"  Cached individuals: {totals['read']:,}")
+    else:
+        print(f"  Total rows read: {totals['read']:,}")
+    print(f"  Specialty matches: {totals['matched']:,}")
+    print(f"  Geocoded (with ZCTA): {totals['geocoded']:,}")
+    print(f"  Inserted: {total_inserted:,}")
+    print("=== Provider Load Complete ===")
 
-            # Check if any taxonomy code matches our mapping
-            matched_taxonomies = [c for c in taxonomy_codes if c in ALL_TAXONOMY_CODES]
-            if not matched_taxonomies:
-                continue
 
-            specialties = _map_specialties(taxonomy_codes)
-            if not specialties:
-                continue
+# ---------------------------------------------------------------------------
+# Incremental load: apply a weekly NPPES delta file
+# ---------------------------------------------------------------------------
+
+def _is_deactivated(row: list[str]) -> bool:
+    """True if the row carries a deactivation date without a reactivation."""
+    return (
+        len(row) > COL_REACTIVATION_DATE
+        and bool(row[COL_DEACTIVATION_DATE].strip())
+        and not row[COL_REACTIVATION_DATE].strip()
+    )
+
+
+def _iter_delta_lines(delta_path: str):
+    """Yield decoded data lines (no header) from a delta CSV or weekly zip."""
+    if zipfile.is_zipfile(delta_path):
+        with zipfile.ZipFile(delta_path, "r") as zf:
+            member = find_nppes_member(zf)
+            if member is None:
+                raise FileNotFoundError(f"No NPPES CSV found in {delta_path}")
+            with zf.open(member) as f:
+                f.readline()  # header row
+                for line in f:
+                    yield line.decode("utf-8", errors="replace")
+    else:
+        with open(delta_path, "rb") as f:
+            f.readline()  # header row
+            for line in f:
+                yield line.decode("utf-8", errors="replace")
+
+
+def _parse_delta(delta_path: str, zcta_lookup: dict):
+    """Parse a delta file.
+
+    Returns (provider rows to upsert, NPIs to deactivate, counters).
+    """
+    counters = Counter()
+    rows = []
+    dropped = []
+    for row in csv.reader(_iter_delta_lines(delta_path)):
+        if not row or not row[COL_NPI].strip():
+            continue
+        if _is_deactivated(row):
+            counters["read"] += 1
+            counters["deactivated"] += 1
+            provider = None
+        else:
+            provider = _process_row(row, zcta_lookup, counters)
+        if provider is not None:
+            rows.append(provider)
+        else:
+            # Deactivated, no longer a mapped individual, or not geocodable
+            dropped.append(row[COL_NPI].strip())
+    return rows, dropped, counters
+
+
+def _record_changes(cur, batch_id: str) -> None:
+    """Record location/specialty/activity changes implied by the staged delta."""
+    cur.execute(f"""
+        INSERT INTO provider_changes (
+            batch_id, npi, change_type,
+            old_location, new_location, old_specialties, new_specialties
+        )
+        SELECT %(batch)s, s.npi,
+            CASE WHEN p.npi IS NULL THEN 'insert' ELSE 'update' END,
+            CASE WHEN p.is_active THEN p.location END,
+            s.location,
+            CASE WHEN p.is_active THEN p.specialties END,
+            s.specialties
+        FROM (
+            SELECT DISTINCT ON (npi) npi,
+                ST_GeomFromWKB(location, 4326) AS location,
+                specialties::VARCHAR(50)[] AS specialties
+            FROM {DELTA_STAGING_TABLE}
+            ORDER BY npi
+        ) s
+        LEFT JOIN providers p ON p.npi = s.npi
+        WHERE p.npi IS NULL
+           OR NOT p.is_active
+           OR p.location IS DISTINCT FROM s.location
+           OR p.specialties IS DISTINCT FROM s.specialties
+    """, {"batch": batch_id})
+
+    cur.execute("""
+        INSERT INTO provider_changes (
+            batch_id, npi, change_type, old_location, old_specialties
+        )
+        SELECT %(batch)s, p.npi, 'deactivate', p.location, p.specialties
+        FROM providers p
+        JOIN delta_dropped d ON d.npi = p.npi
+        WHERE p.is_active
+    """, {"batch": batch_id})
 
-            total_matched += 1
 
-            # Extract provider info
-            npi = row[COL_NPI].strip()
-            first_name = row[COL_FIRST_NAME].strip() if COL_FIRST_NAME < len(row) else ""
-            last_name = row[COL_LAST_NAME].strip() if COL_LAST_NAME < len(row) else ""
-            name = f"{first_name} {last_name}".strip()
+def _batch_id(delta_path: str) -> str:
+    """Change batch id of a delta file: its name plus a hash of its content.
 
-            address = row[COL_PRACTICE_ADDRESS].strip()[:200] if COL_PRACTICE_ADDRESS < len(row) else ""
-            city = row[COL_PRACTICE_CITY].strip()[:100] if COL_PRACTICE_CITY < len(row) else ""
-            state = row[COL_PRACTICE_STATE].strip()[:2] if COL_PRACTICE_STATE < len(row) else ""
-            zipcode = row[COL_PRACTICE_ZIP].strip()[:5] if COL_PRACTICE_ZIP < len(row) else ""
+    A re-downloaded copy of the same delta gets the same id; a different
+    file with the same name does not.
+    """
+    digest = hashlib.sha256()
+    with open(delta_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return f"{os.path.basename(delta_path)[:83]}@{digest.hexdigest()[:16]}"
 
-            # Geocode via ZCTA centroid
-            coords = zcta_lookup.get(zipcode)
-            if not coords:
-                continue
 
-            total_geocoded += 1
-            lat, lon = coords
+def run_incremental(conn, delta_path: str) -> dict:
+    """Apply a weekly NPPES delta file to the providers table.
 
-            pending_rows.append((
-                npi, 1, name, address, city, state, zipcode,
-                f"SRID=4326;POINT({lon} {lat})",
-                matched_taxonomies, specialties, True,
-            ))
+    A delta whose batch (see _batch_id) is already recorded in
+    provider_changes is not applied again; its change log is kept.
 
-            # Batch insert
-            if len(pending_rows) >= insert_batch_size:
-                _insert_batch(conn, pending_rows)
-                total_inserted += len(pending_rows)
-                pending_rows = []
-
-    # Final batch
-    if pending_rows:
-        _insert_batch(conn, pending_rows)
-        total_inserted += len(pending_rows)
-
-    print()  # newline after progress
-    print(f"  Total rows read: {total_read:,}")
-    print(f"  Specialty matches: {total_matched:,}")
-    print(f"  Geocoded (with ZCTA): {total_geocoded:,}")
-    print(f"  Inserted: {total_inserted:,}")
-    print("=== Provider Load Complete ===")
+    Args:
+        conn: psycopg2 connection
+        delta_path: weekly delta CSV, or the weekly dissemination zip
+
+    Returns:
+        dict with the change batch id, the changed NPIs and the set of
+        specialties whose providers changed
+    """
+    print("=== Applying NPPES Weekly Delta ===")
+    batch_id = _batch_id(delta_path)
+    print(f"  Delta file: {delta_path} (batch {batch_id})")
+
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM provider_changes WHERE batch_id = %s LIMIT 1", (batch_id,))
+        applied = cur.fetchone() is not None
+    conn.commit()
+    if applied:
+        print("  [SKIP] Batch already applied; keeping its recorded changes")
+        print("=== Weekly Delta Applied ===")
+        return {"batch_id": batch_id, "changed_npis": [], "specialties": []}
+
+    zcta_lookup = _build_zcta_lookup(conn)
+    print(f"  ZCTA centroid lookup: {len(zcta_lookup)} entries")
 
+    rows, dropped, counters = _parse_delta(delta_path, zcta_lookup)
+    print(f"  Delta rows read: {counters['read']:,} "
+          f"(deactivated: {counters['deactivated']:,})")
+    print(f"  Qualifying providers: {len(rows):,} | Dropped NPIs: {len(dropped):,}")
 
-def _insert_batch(conn, rows):
-    """Insert a batch of provider rows."""
     with conn.cursor() as cur:
-        execute_values(
-            cur,
-            """INSERT INTO providers (npi, entity_type, name, address_line1,
-               city, state, zipcode, location, taxonomy_codes, specialties,
-               is_active)
-               VALUES %s ON CONFLICT (npi) DO UPDATE SET
-                 name = EXCLUDED.name,
-                 location = EXCLUDED.location,
-                 taxonomy_codes = EXCLUDED.taxonomy_codes,
-                 specialties = EXCLUDED.specialties""",
-            rows,
-            template="(%s, %s, %s, %s, %s, %s, %s, ST_GeomFromEWKT(%s), %s, %s, %s)",
+        _create_delta_staging(cur)
+        _copy_to_staging(cur, _encode_copy(rows), DELTA_STAGING_TABLE)
+
+        cur.execute("CREATE TEMP TABLE delta_dropped (npi VARCHAR(10)) ON COMMIT DROP")
+        cur.copy_expert(
+            "COPY delta_dropped (npi) FROM STDIN",
+            io.StringIO("".join(f"{npi}\n" for npi in dropped)),
         )
+
+        _record_changes(cur, batch_id)
+
+        upserted = _merge_staging(cur, DELTA_STAGING_TABLE)
+        cur.execute("""
+            UPDATE providers p SET is_active = FALSE
+            FROM delta_dropped d
+            WHERE p.npi = d.npi AND p.is_active
+        """)
+        deactivated = cur.rowcount
+
+        cur.execute("""
+            SELECT npi, change_type,
+                   COALESCE(old_specialties, '{}') || COALESCE(new_specialties, '{}')
+            FROM provider_changes
+            WHERE batch_id = %s
+        """, (batch_id,))
+        changes = cur.fetchall()
     conn.commit()
 
+    changed_npis = sorted({npi for npi, _, _ in changes})
+    specialties = sorted({spec for _, _, specs in changes for spec in specs})
+    by_type = Counter(change_type for _, change_type, _ in changes)
+    print(f"  Upserted: {upserted:,} | Deactivated: {deactivated:,}")
+    print(f"  Recorded changes: {len(changes):,} "
+          f"(insert: {by_type['insert']:,}, update: {by_type['update']:,}, "
+          f"deactivate: {by_type['deactivate']:,})")
+    print(f"  Affected specialties: {', '.join(specialties) or 'none'}")
+    print("=== Weekly Delta Applied ===")
+
+    return {
+        "batch_id": batch_id,
+        "changed_npis": changed_npis,
+        "specialties": specialties,
+    }
+
 
 if __name__ == "__main__":
     import psycopg2
@@ -3,17 +3,20 @@
 Input files:
   - ZCTA Gazetteer (2023_Gaz_zcta_national.txt) - centroids
   - ZCTA-County Crosswalk (tab20_zcta520_county20_natl.txt) - ZCTA-to-county mapping
+  - ZCTA Population (zcta_population_2020.json) - 2020 Census counts, used
+    for ZCTA-level provider density
 
 Output: ~33,000 rows in the `zipcodes` table.
 """
 
 import csv
+import json
 import os
 
 from psycopg2.extras import execute_values
 
 from .config import RAW_DIR
-from .download_data import get_zcta_gazetteer_path
+from .download_data import get_zcta_gazetteer_path, get_zcta_population_path
 from .state_fips import CONUS_STATE_FIPS
 
 
@@ -33,6 +36,24 @@ def _load_zcta_centroids() -> dict[str, tuple[float, float]]:
     return centroids
 
 
+def _load_populations() -> dict[str, int]:
+    """Parse the Census API ZCTA population response -> dict of ZCTA -> population.
+
+    The response is a JSON array of rows; the first is the header
+    (["P1_001N", "zip code tabulation area"]).
+    """
+    try:
+        path = get_zcta_population_path()
+    except FileNotFoundError as e:
+        print(f"  WARNING: {e} ZCTA populations left empty.")
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        header, *rows = json.load(f)
+    pop_idx = header.index("P1_001N")
+    zcta_idx = header.index("zip code tabulation area")
+    return {row[zcta_idx]: int(row[pop_idx]) for row in rows if row[pop_idx]}
+
+
 def _load_crosswalk() -> dict[str, str]:
     """Parse ZCTA-County crosswalk -> dict of ZCTA -> county FIPS.
 
@@ -67,6 +88,9 @@ def run(conn):
     crosswalk = _load_crosswalk()
     print(f"  Parsed {len(crosswalk)} ZCTA-county mappings")
 
+    populations = _load_populations()
+    print(f"  Parsed {len(populations)} ZCTA populations")
+
     # Get valid county FIPS from DB
     with conn.cursor() as cur:
         cur.execute("SELECT fips FROM counties")
@@ -88,7 +112,7 @@ def run(conn):
             zcta,
             county_fips,
             abbr,
-            None,  # population - not critical for this pipeline
+            populations.get(zcta),
             None,  # land_area_sqmi
             f"SRID=4326;POINT({lon} {lat})",
         ))
@@ -108,6 +132,7 @@ def run(conn):
                    population, land_area_sqmi, centroid)
                    VALUES %s ON CONFLICT (zcta) DO UPDATE SET
                      county_fips = EXCLUDED.county_fips,
+                     population = EXCLUDED.population,
                      centroid = EXCLUDED.centroid""",
                 batch,
                 template="(%s, %s, %s, %s, %s, ST_GeomFromEWKT(%s))",
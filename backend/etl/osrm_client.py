@@ -0,0 +1,411 @@
+"""Asynchronous OSRM HTTP client with adaptive concurrency.
+
+compute_drivetimes issues thousands of /table (or /route) requests. A fixed
+number of in-flight requests either overloads a slow osrm-routed or leaves
+a fast one idle, so requests pass through an AIMD (additive-increase,
+multiplicative-decrease) limiter instead:
+
+- each successful request whose latency stays within LATENCY_TOLERANCE x
+  the baseline (the lowest recently observed latency) grows the limit by
+  1/limit, i.e. by about one request per round trip;
+- a timeout, connection error, 429/5xx, or a latency above the tolerance
+  halves the limit, at most once per round trip.
+
+Several osrm-routed instances (OSRM_URLS) can share the work: each has its
+own limiter, requests go to the instance with the fewest outstanding
+requests, and an instance that keeps failing is ejected and re-added once
+a health check passes (the last instance in rotation is never ejected).
+Failed requests are retried with full-jitter exponential backoff. Every
+request is recorded in a RequestStats so callers can report throughput
+and latency percentiles.
+"""
+
+import asyncio
+import collections
+import random
+import time
+
+import aiohttp
+import numpy as np
+
+from .config import OSRM_CONCURRENCY, OSRM_RETRIES, OSRM_TIMEOUT, OSRM_URLS
+
+LATENCY_TOLERANCE = 1.5  # latency / baseline above which the limit backs off
+BACKOFF_BASE = 0.25  # seconds; retry n sleeps up to BACKOFF_BASE * 2**n
+BACKOFF_MAX = 10.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+EJECT_AFTER = 5  # consecutive failed requests that take an instance out
+EJECT_SECONDS = 30.0  # before an ejected instance is health-checked again
+NO_ROUTE_CODES = {"NoRoute", "NoSegment"}  # OSRM answers meaning "unroutable"
+
+
+class AimdLimiter:
+    """Concurrency limit that adapts to measured latency and errors."""
+
+    def __init__(self, initial: int = 4, minimum: int = 1,
+                 maximum: int = OSRM_CONCURRENCY, backoff: float = 0.5):
+        self.limit = float(min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.in_flight = 0
+        self.baseline = None
+        self._last_cut = 0.0
+
+    @property
+    def has_capacity(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def acquire(self) -> None:
+        self.in_flight += 1
+
+    def release(self, latency: float, ok: bool) -> None:
+        self.in_flight -= 1
+        self._adjust(latency, ok)
+
+    def _adjust(self, latency: float, ok: bool) -> None:
+        now = time.monotonic()
+        if ok:
+            # The baseline follows the fastest responses but drifts upward
+            # slowly, so a permanently slower server resets it over time.
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                self.baseline *= 1.001
+
+        overloaded = not ok or latency > LATENCY_TOLERANCE * self.baseline
+        if overloaded:
+            # Requests already in flight when the limit was cut report the
+            # same congestion; cut again only after another round trip.
+            if now - self._last_cut > latency:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+                self._last_cut = now
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+
+class RequestStats:
+    """Request count, latencies and errors for one batch of work."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.finished = None
+        self.latencies = []
+        self.retries = 0
+        self.failures = 0
+
+    def record(self, latency: float) -> None:
+        self.latencies.append(latency)
+
+    def finish(self) -> None:
+        self.finished = time.monotonic()
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+
+    def summary(self) -> str:
+        """'N req, X req/s, p50 Yms, p99 Zms' (plus retries/failures if any)."""
+        elapsed = (self.finished or time.monotonic()) - self.started
+        if not self.latencies:
+            return "0 req"
+        p50, p99 = np.percentile(self.latencies, [50, 99]) * 1000
+        text = (f"{self.requests:,} req, {self.requests / max(elapsed, 1e-9):,.1f} req/s, "
+                f"p50 {p50:,.0f}ms, p99 {p99:,.0f}ms")
+        if self.retries or self.failures:
+            text += f", {self.retries:,} retried, {self.failures:,} failed"
+        return text
+
+
+class Endpoint:
+    """One osrm-routed instance: its own AIMD limit and health state."""
+
+    def __init__(self, url: str, max_concurrency: int):
+        self.url = url.rstrip("/")
+        self.limiter = AimdLimiter(maximum=max_concurrency)
+        self.requests = 0
+        self.consecutive_failures = 0
+        self.ejected_until = None  # monotonic time; None while in rotation
+        self.rechecking = False
+
+    def record(self, ok: bool) -> None:
+        """Count a request and its outcome."""
+        self.requests += 1
+        self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+
+    @property
+    def failing(self) -> bool:
+        """EJECT_AFTER or more requests in a row failed."""
+        return self.consecutive_failures >= EJECT_AFTER
+
+    def eject(self, reason: str) -> None:
+        self.ejected_until = time.monotonic() + EJECT_SECONDS
+        print(f"  OSRM {self.url} {reason}; ejected for {EJECT_SECONDS:.0f}s")
+
+
+class OsrmClient:
+    """Pooled aiohttp client balancing requests over osrm-routed instances.
+
+    Each request goes to the healthy instance with the fewest outstanding
+    requests. An instance failing EJECT_AFTER requests in a row is taken
+    out of rotation unless it is the last one in rotation; after
+    EJECT_SECONDS it is health-checked and re-added if it answers. `down`
+    instances (e.g. failed an earlier probe) start out of rotation and are
+    health-checked on first use. While every instance is out, requests wait
+    for the next health check instead of failing.
+
+    Use as `async with OsrmClient() as client:`; the methods return None
+    (rather than raising) when OSRM cannot answer, so callers can fall back.
+    """
+
+    def __init__(self, urls: list[str] = OSRM_URLS,
+                 max_concurrency: int = OSRM_CONCURRENCY,
+                 retries: int = OSRM_RETRIES, timeout: float = OSRM_TIMEOUT,
+                 down: list[str] = ()):
+        self.urls = list(urls)
+        self.down = {url.rstrip("/") for url in down}
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.timeout = timeout
+        self.endpoints = []
+        self._waiters = collections.deque()
+        self._recheck_timer = None
+        self._tasks = set()  # background health checks
+        self._session = None
+
+    async def __aenter__(self):
+        self.endpoints = [Endpoint(url, self.max_concurrency) for url in self.urls]
+        for ep in self.endpoints:
+            if ep.url in self.down:
+                ep.ejected_until = time.monotonic()  # due for a health check
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_concurrency * len(self.urls)),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._recheck_timer is not None:
+            self._recheck_timer.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._session.close()
+
+    async def probe(self) -> dict | None:
+        """Health-check every instance with a test route.
+
+        If any instance answers, those that do not are ejected. Returns the
+        first healthy instance's response, or None if none is reachable.
+        """
+        answers = await asyncio.gather(*(self._check(ep) for ep in self.endpoints))
+        if all(data is None for data in answers):
+            return None
+        for ep, data in zip(self.endpoints, answers):
+            if data is None:
+                ep.eject("failed its health check")
+        return next(data for data in answers if data is not None)
+
+    @property
+    def healthy_urls(self) -> list[str]:
+        return [ep.url for ep in self.endpoints if ep.ejected_until is None]
+
+    def summary(self) -> str:
+        """Requests and settled concurrency limit per instance."""
+        return ", ".join(
+            f"{ep.url} {ep.requests:,} req (limit {ep.limiter.limit:.0f}"
+            f"{', ejected' if ep.ejected_until is not None else ''})"
+            for ep in self.endpoints
+        )
+
+    async def route(self, origin: tuple, dest: tuple,
+                    stats: RequestStats) -> tuple[bool, float | None]:
+        """Driving duration in seconds from origin to dest, both (lon, lat).
+
+        Returns (answered, seconds): seconds is None where OSRM answered
+        that no route exists; answered is False if the request failed.
+        """
+        data = await self._get(
+            f"/route/v1/driving/{origin[0]},{origin[1]};{dest[0]},{dest[1]}",
+            {"overview": "false"}, stats,
+        )
+        if data is None:
+            return False, None
+        if data.get("code") in NO_ROUTE_CODES:
+            return True, None
+        try:
+            return True, data["routes"][0]["duration"]
+        except (KeyError, IndexError):
+            return False, None
+
+    async def table(self, sources: list[tuple], destinations: list[tuple],
+                    stats: RequestStats) -> list[list[float | None]] | None:
+        """Duration matrix (seconds) from every source to every destination.
+
+        Cells OSRM cannot route are None; the whole result is None if the
+        request fails.
+        """
+        coords = ";".join(f"{lon},{lat}" for lon, lat in sources + destinations)
+        data = await self._get(
+            f"/table/v1/driving/{coords}",
+            {
+                "sources": ";".join(str(i) for i in range(len(sources))),
+                "destinations": ";".join(
+                    str(len(sources) + i) for i in range(len(destinations))
+                ),
+                "annotations": "duration",
+            },
+            stats,
+        )
+        if data is None or data.get("code") != "Ok":
+            return None
+        return data.get("durations")
+
+    def _healthy(self) -> list[Endpoint]:
+        """Instances in rotation.
+
+        Ejected instances whose ejection has expired are health-checked in
+        the background and rejoin once they answer.
+        """
+        now = time.monotonic()
+        healthy = []
+        for ep in self.endpoints:
+            if ep.ejected_until is None:
+                healthy.append(ep)
+            elif ep.ejected_until <= now and not ep.rechecking:
+                ep.rechecking = True
+                task = asyncio.get_running_loop().create_task(self._recheck(ep))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        return healthy
+
+    def _pick(self) -> Endpoint | None:
+        """Healthy instance with a free slot and the fewest requests in flight."""
+        free = [ep for ep in self._healthy() if ep.limiter.has_capacity]
+        return min(free, key=lambda ep: ep.limiter.in_flight, default=None)
+
+    def _schedule_recheck(self) -> None:
+        """With every instance ejected, health-check the earliest one when due."""
+        if self._recheck_timer is not None:
+            return
+        due = [ep.ejected_until for ep in self.endpoints
+               if ep.ejected_until is not None and not ep.rechecking]
+        if not due:
+            return
+
+        def fire():
+            self._recheck_timer = None
+            self._healthy()
+
+        self._recheck_timer = asyncio.get_running_loop().call_later(
+            max(0.0, min(due) - time.monotonic()), fire,
+        )
+
+    async def _acquire(self) -> Endpoint | None:
+        """Wait for a request slot.
+
+        Requests queue here, not per instance, so each one goes to whichever
+        instance frees a slot first. While every instance is ejected they
+        wait for the next health check; None if it fails.
+        """
+        if not self._waiters:
+            ep = self._pick()
+            if ep is not None:
+                ep.limiter.acquire()
+                return ep
+        if not self._healthy():
+            self._schedule_recheck()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        return await waiter  # _wake() hands over an acquired instance
+
+    def _wake(self) -> None:
+        """Hand free slots to queued requests.
+
+        While every instance is ejected, queued requests keep waiting for a
+        pending health check; once none is pending they get None.
+        """
+        while self._waiters:
+            if not self._healthy():
+                if self._recheck_timer is not None or any(
+                    ep.rechecking for ep in self.endpoints
+                ):
+                    return
+                for waiter in self._waiters:
+                    if not waiter.done():
+                        waiter.set_result(None)
+                self._waiters.clear()
+                return
+            ep = self._pick()
+            if ep is None:
+                return
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                ep.limiter.acquire()
+                waiter.set_result(ep)
+
+    async def _recheck(self, ep: Endpoint) -> None:
+        if await self._check(ep) is not None:
+            ep.ejected_until = None
+            ep.consecutive_failures = 0
+            print(f"  OSRM {ep.url} healthy again, re-added")
+        else:
+            ep.ejected_until = time.monotonic() + EJECT_SECONDS
+        ep.rechecking = False
+        self._wake()
+
+    async def _check(self, ep: Endpoint) -> dict | None:
+        """Test route on one instance, bypassing balancing and retries."""
+        try:
+            async with self._session.get(
+                f"{ep.url}/route/v1/driving/-73.98,40.74;-73.97,40.75",
+                params={"overview": "false"},
+                timeout=aiohttp.ClientTimeout(total=5),
+            ) as resp:
+                data = await resp.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            return None
+        return data if data.get("code") == "Ok" else None
+
+    async def _get(self, path: str, params: dict, stats: RequestStats) -> dict | None:
+        """GET an OSRM service; the JSON body it answered with, None on failure.
+
+        The body's code may be an error (NoRoute, InvalidQuery, ...); callers
+        interpret it.
+        """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                stats.retries += 1
+                await asyncio.sleep(random.uniform(
+                    0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+                ))
+
+            ep = await self._acquire()
+            if ep is None:
+                continue  # every instance ejected and its health check failed
+
+            start = time.monotonic()
+            ok = False
+            try:
+                async with self._session.get(ep.url + path, params=params) as resp:
+                    if resp.status in RETRY_STATUS:
+                        continue
+                    data = await resp.json(content_type=None)
+                    ok = True
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                continue
+            finally:
+                latency = time.monotonic() - start
+                stats.record(latency)
+                ep.limiter.release(latency, ok)
+                ep.record(ok)
+                if ep.failing and ep.ejected_until is None and len(self._healthy()) > 1:
+                    ep.eject(f"failed {ep.consecutive_failures} requests in a row")
+                self._wake()
+
+            # OSRM answered; an error code (NoRoute, InvalidQuery, ...) will
+            # not change on retry.
+            return data
+
+        stats.failures += 1
+        return None
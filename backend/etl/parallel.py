@@ -0,0 +1,76 @@
+"""Run per-specialty ETL work concurrently over a pool of connections.
+
+compute_metrics and compute_drivetimes split their work into independent
+tasks (one per specialty, or per geography and specialty). `for_each` runs
+them on a psycopg2 ThreadedConnectionPool, one connection per worker
+thread, so several Postgres backends work at once; psycopg2 releases the
+GIL while a query runs. Each task commits on its own connection and its
+completion is reported as it finishes.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from psycopg2.pool import ThreadedConnectionPool
+
+from .config import get_db_params
+
+
+def for_each(conn, tasks: list, func, workers: int, describe=str) -> list:
+    """Call `func(conn, task)` for every task and return results in task order.
+
+    With workers <= 1 the tasks run one after another on `conn`. Otherwise
+    they run `workers` at a time, each on a pooled connection that is
+    committed after the task (rolled back if it raises). `describe(task)`
+    labels the progress line printed when a task finishes.
+    """
+    results = [None] * len(tasks)
+    total = len(tasks)
+
+    if workers <= 1 or total <= 1:
+        for i, task in enumerate(tasks):
+            start = time.time()
+            results[i] = func(conn, task)
+            conn.commit()
+            _report(i + 1, total, describe(task), time.time() - start)
+        return results
+
+    workers = min(workers, total)
+    pool = ThreadedConnectionPool(1, workers, **get_db_params())
+    lock = threading.Lock()
+    done = [0]
+
+    def run_task(task):
+        start = time.time()
+        task_conn = pool.getconn()
+        try:
+            result = func(task_conn, task)
+            task_conn.commit()
+        except Exception:
+            task_conn.rollback()
+            raise
+        finally:
+            pool.putconn(task_conn)
+        with lock:
+            done[0] += 1
+            _report(done[0], total, describe(task), time.time() - start)
+        return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(run_task, task): i for i, task in enumerate(tasks)}
+            try:
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+    finally:
+        pool.closeall()
+    return results
+
+
+def _report(done: int, total: int, label: str, elapsed: float) -> None:
+    print(f"    [{done}/{total}] {label:<28} {elapsed:6.1f}s")
@@ -0,0 +1,151 @@
+"""Columnar (Parquet) cache of the NPPES individual-provider subset.
+
+A full NPPES parse keeps every Entity Type 1 row's NPI, name, practice
+address/ZIP and taxonomy codes in DATA_DIR/cache/nppes_individuals/ (one
+Parquet part per shard or block, ~100MB in total). The cache is keyed by
+the source file's name, size and mtime.
+
+Later runs against the same source rebuild `providers` from the cache with
+a vectorized taxonomy -> specialty mapping instead of parsing the 9.7 GB
+CSV again, so changes to `taxonomy_mapping.SPECIALTY_MAPPING` take seconds.
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from .config import CACHE_DIR
+from .taxonomy_mapping import SPECIALTY_BITS, SPECIALTY_CODES, SPECIALTY_MAPPING
+
+CACHE_PATH = os.path.join(CACHE_DIR, "nppes_individuals")
+KEY_FILE = "_source.json"  # leading underscore: ignored by the Parquet reader
+
+SCHEMA = pa.schema([
+    ("npi", pa.string()),
+    ("name", pa.string()),
+    ("address", pa.string()),
+    ("city", pa.string()),
+    ("state", pa.string()),
+    ("zipcode", pa.string()),
+    ("taxonomy_codes", pa.list_(pa.string())),
+])
+
+
+def source_key(path: str, member: str | None) -> dict:
+    """Identify an NPPES source file by name, size and mtime."""
+    stat = os.stat(path)
+    return {
+        "source": os.path.basename(path),
+        "member": member,
+        "size": stat.st_size,
+        "mtime": int(stat.st_mtime),
+    }
+
+
+def is_current(key: dict) -> bool:
+    """True if the cache was built from the source identified by `key`."""
+    try:
+        with open(os.path.join(CACHE_PATH, KEY_FILE)) as f:
+            return json.load(f) == key
+    except (OSError, ValueError):
+        return False
+
+
+def begin_build(resume_from: int | None = None) -> str | None:
+    """Prepare the directory for a cache build and return its path.
+
+    A fresh build starts empty. When a load resumes at byte offset
+    `resume_from`, parts written before it are kept and later (possibly
+    partial) ones removed; returns None if there is no build to resume.
+    """
+    build_dir = CACHE_PATH + ".building"
+    if resume_from is None:
+        shutil.rmtree(build_dir, ignore_errors=True)
+        os.makedirs(build_dir)
+        return build_dir
+
+    if not os.path.isdir(build_dir):
+        return None
+    for name in os.listdir(build_dir):
+        if name.startswith("part-") and int(name[5:20]) >= resume_from:
+            os.remove(os.path.join(build_dir, name))
+    return build_dir
+
+
+def write_part(build_dir: str, part: int, individuals: list[tuple]) -> None:
+    """Write one shard's individuals as a Parquet part file.
+
+    `individuals` holds (npi, name, address, city, state, zipcode,
+    taxonomy_codes) tuples; `part` is the shard's byte offset, so a resumed
+    load can tell which parts precede its checkpoint.
+    """
+    columns = list(zip(*individuals)) if individuals else [[]] * len(SCHEMA)
+    table = pa.Table.from_arrays(
+        [pa.array(col, type=field.type) for col, field in zip(columns, SCHEMA)],
+        schema=SCHEMA,
+    )
+    pq.write_table(
+        table, os.path.join(build_dir, f"part-{part:015d}.parquet"),
+        compression="zstd",
+    )
+
+
+def commit_build(build_dir: str, key: dict) -> None:
+    """Stamp a finished build with its source key and make it current."""
+    with open(os.path.join(build_dir, KEY_FILE), "w") as f:
+        json.dump(key, f)
+    shutil.rmtree(CACHE_PATH, ignore_errors=True)
+    os.rename(build_dir, CACHE_PATH)
+
+
+def load_mapped() -> tuple[pa.Table, int]:
+    """Read the cache and map taxonomy codes to specialties, vectorized.
+
+    Returns (table of individuals with at least one mapped taxonomy,
+    number of cached individuals). The table has the cache columns, with
+    `taxonomy_codes` reduced to the mapped codes (original order kept), plus
+    `specialties` (sorted specialty codes).
+    """
+    table = pq.read_table(CACHE_PATH, schema=SCHEMA)
+    n_individuals = table.num_rows
+
+    taxonomies = table.column("taxonomy_codes").combine_chunks()
+    flat = pc.list_flatten(taxonomies)
+    parents = pc.list_parent_indices(taxonomies).to_numpy()
+
+    codes = pa.array(sorted(SPECIALTY_MAPPING))
+    code_bits = np.array(
+        [SPECIALTY_BITS[SPECIALTY_MAPPING[c]] for c in codes.to_pylist()],
+        dtype=np.int64,
+    )
+    code_idx = pc.fill_null(pc.index_in(flat, value_set=codes), -1).to_numpy()
+    hit = code_idx >= 0
+
+    masks = np.zeros(n_individuals, dtype=np.int64)
+    np.bitwise_or.at(masks, parents[hit], code_bits[code_idx[hit]])
+    keep = masks > 0
+
+    # Mapped codes are contiguous per row in the flattened array, so the
+    # kept rows' lists can be rebuilt from per-row hit counts.
+    counts = np.bincount(parents[hit], minlength=n_individuals)[keep]
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int32)
+    matched = pa.ListArray.from_arrays(pa.array(offsets), flat.filter(pa.array(hit)))
+
+    # Decode each distinct specialty bitmask once
+    unique_masks, inverse = np.unique(masks[keep], return_inverse=True)
+    decoded = [
+        sorted(code for i, code in enumerate(SPECIALTY_CODES) if m >> i & 1)
+        for m in unique_masks.tolist()
+    ]
+    specialties = pa.array([decoded[i] for i in inverse.tolist()],
+                           type=pa.list_(pa.string()))
+
+    mapped = table.filter(pa.array(keep)).drop_columns(["taxonomy_codes"])
+    mapped = mapped.append_column("taxonomy_codes", matched)
+    mapped = mapped.append_column("specialties", specialties)
+    return mapped, n_individuals
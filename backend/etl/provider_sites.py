@@ -0,0 +1,54 @@
+"""Collapse active providers into weighted provider sites.
+
+load_providers geocodes every provider to its ZCTA centroid, so ~1.5M
+providers sit on at most ~33k distinct points. `provider_sites` holds one
+row per distinct location with, for each specialty (in
+taxonomy_mapping.SPECIALTY_CODES order), the number of active providers
+there and a representative NPI (the lowest). Nearest-provider searches in
+compute_metrics run against these sites, weighting each by its counts, so
+results are the same as searching individual providers.
+
+Output: ~33k rows in the `provider_sites` table, rebuilt after every
+provider load.
+"""
+
+from .taxonomy_mapping import SPECIALTY_BITS, SPECIALTY_CODES
+
+
+def run(conn):
+    """Rebuild provider_sites from the active providers."""
+    print("=== Building Provider Sites ===")
+
+    has_specialty = [
+        f"(p.specialty_mask & {SPECIALTY_BITS[code]}) <> 0" for code in SPECIALTY_CODES
+    ]
+    counts = ",\n".join(f"COUNT(*) FILTER (WHERE {cond})" for cond in has_specialty)
+    npis = ",\n".join(f"MIN(p.npi) FILTER (WHERE {cond})" for cond in has_specialty)
+
+    with conn.cursor() as cur:
+        cur.execute("TRUNCATE provider_sites RESTART IDENTITY")
+        cur.execute(f"""
+            INSERT INTO provider_sites (
+                location, provider_count, specialty_counts, specialty_mask,
+                representative_npis
+            )
+            SELECT
+                p.location,
+                COUNT(*),
+                ARRAY[{counts}]::INTEGER[],
+                BIT_OR(p.specialty_mask),
+                ARRAY[{npis}]::VARCHAR(10)[]
+            FROM providers p
+            WHERE p.is_active = TRUE
+              AND p.location IS NOT NULL
+              AND p.specialty_mask <> 0
+            GROUP BY p.location
+        """)
+        n_sites = cur.rowcount
+        cur.execute("ANALYZE provider_sites")
+        cur.execute("SELECT COALESCE(SUM(provider_count), 0) FROM provider_sites")
+        n_providers = cur.fetchone()[0]
+        conn.commit()
+
+    print(f"  {n_providers:,} active providers at {n_sites:,} sites")
+    print("=== Provider Sites Complete ===")
@@ -0,0 +1,414 @@
+"""Routing backends: where compute_drivetimes gets drive times from.
+
+Every backend answers a list of distinct (origin, destination) pairs,
+each ((lon, lat), (lon, lat)), with {pair: duration_seconds}; a None
+duration means no route exists, and unanswered pairs fall back to the
+distance proxy. Backends:
+
+- osrm:   live OSRM (osrm_client), batched into /table requests
+- record: osrm, and every drive time of the run is written to a recording
+- replay: answers from a recording; no OSRM needed (offline and CI runs)
+- proxy:  a model of minutes per straight-line mile by origin state and
+          distance band, fitted on the OSRM drive times in drivetime_cache
+
+Pairs already in drivetime_cache are taken from the cache before a
+backend is asked. Proxy answers are estimates: they are flagged as such
+and never written to the cache.
+"""
+
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from . import drivetime_cache
+from .config import (
+    DRIVETIME_CACHE_DECIMALS, DRIVETIME_PROXY_FACTOR, OSRM_TABLE_SIZE, OSRM_URLS,
+    ROUTING_RECORDING,
+)
+from .osrm_client import OsrmClient, RequestStats
+from .provider_index import EARTH_RADIUS_MILES
+
+# Proxy model: upper edges (miles) of the straight-line distance bands, and
+# the fewest routed pairs a (state, band) needs to get its own factor
+DISTANCE_BANDS = np.array([5.0, 10.0, 25.0, 50.0, 100.0])
+MIN_SAMPLES = 20
+
+
+class RoutingBackend(ABC):
+    """Source of drive times for (origin, destination) pairs.
+
+    Subclasses implement route(); the other methods have defaults.
+    """
+
+    name = "base"
+    estimated = False  # answers are model estimates rather than routes
+
+    def open(self) -> bool:
+        """Prepare the backend; False if it cannot answer this run."""
+        return True
+
+    def dataset_version(self) -> str | None:
+        """Road-network version keying drivetime_cache (None: no cache)."""
+        return None
+
+    def describe(self) -> str:
+        return self.name
+
+    @abstractmethod
+    def route(self, pairs: list[tuple], states: dict) -> dict:
+        """Drive times of `pairs`; `states` maps origins to state abbreviations."""
+
+    def close(self, durations: dict) -> None:
+        """Called with every drive time the run resolved (cache + backend)."""
+
+
+# ---------------------------------------------------------------------------
+# OSRM
+# ---------------------------------------------------------------------------
+
+def _plan_tables(pairs: list[tuple], max_coords: int) -> list[list[tuple]]:
+    """Group (origin, destination) pairs into /table batches of at most
+    `max_coords` coordinates.
+
+    Pairs are sorted by destination then origin so pairs sharing a provider
+    (or an origin) land in the same batch; a batch is closed when its
+    distinct origins plus distinct destinations would exceed `max_coords`.
+    """
+    batches = []
+    batch, origins, dests = [], set(), set()
+    for origin, dest in sorted(pairs, key=lambda p: (p[1], p[0])):
+        added = (origin not in origins) + (dest not in dests)
+        if batch and len(origins) + len(dests) + added > max_coords:
+            batches.append(batch)
+            batch, origins, dests = [], set(), set()
+        batch.append((origin, dest))
+        origins.add(origin)
+        dests.add(dest)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def _route_one(client: OsrmClient, pair: tuple, stats: RequestStats) -> dict:
+    """Query OSRM for a single origin->provider route.
+
+    Returns {pair: duration_seconds or None (no route)}, or {} if the
+    request failed.
+    """
+    answered, duration_sec = await client.route(pair[0], pair[1], stats)
+    return {pair: duration_sec} if answered else {}
+
+
+async def _route_table(client: OsrmClient, pairs: list[tuple],
+                       stats: RequestStats) -> dict:
+    """Query one OSRM duration matrix for a batch of origin->provider pairs.
+
+    The matrix spans the batch's distinct origins (sources) and providers
+    (destinations); each pair reads its own cell, which is None where OSRM
+    found no route.
+
+    Returns {pair: duration_seconds or None}, or {} if the request failed.
+    """
+    origins = list(dict.fromkeys(origin for origin, _ in pairs))
+    dests = list(dict.fromkeys(dest for _, dest in pairs))
+    src_idx = {pt: i for i, pt in enumerate(origins)}
+    dst_idx = {pt: i for i, pt in enumerate(dests)}
+    durations = await client.table(origins, dests, stats)
+    if durations is None:
+        return {}
+    return {(origin, dest): durations[src_idx[origin]][dst_idx[dest]]
+            for origin, dest in pairs}
+
+
+async def _route_pairs(client: OsrmClient, pairs: list[tuple],
+                       stats: RequestStats) -> dict:
+    """Route distinct (origin, destination) pairs.
+
+    Returns {pair: duration_seconds or None} for the pairs OSRM answered.
+    """
+    if OSRM_TABLE_SIZE > 1:
+        answers = await asyncio.gather(*(
+            _route_table(client, batch, stats)
+            for batch in _plan_tables(pairs, OSRM_TABLE_SIZE)
+        ))
+    else:
+        answers = await asyncio.gather(*(_route_one(client, pair, stats) for pair in pairs))
+    stats.finish()
+    return {pair: sec for answer in answers for pair, sec in answer.items()}
+
+
+async def _probe(urls: list[str]) -> tuple[dict | None, list[str]]:
+    """Health-check the OSRM instances: (a test-route response, healthy URLs)."""
+    async with OsrmClient(urls) as client:
+        return await client.probe(), client.healthy_urls
+
+
+async def _route_all(pairs: list[tuple], urls: list[str], down: list[str]) -> dict:
+    """Route pairs over the OSRM instances and print request statistics.
+
+    `down` instances failed the probe; they start out of rotation and
+    rejoin once a health check passes.
+    """
+    stats = RequestStats()
+    async with OsrmClient(urls, down=down) as client:
+        durations = await _route_pairs(client, pairs, stats)
+    fallback = sum(1 for pair in pairs if durations.get(pair) is None)
+    print(f"  Routed {len(pairs):,} pairs | {stats.summary()} | "
+          f"unrouted {fallback / len(pairs):.1%}")
+    print(f"  Instances: {client.summary()}")
+    return durations
+
+
+class OsrmBackend(RoutingBackend):
+    """Live OSRM routing over the OSRM_URLS instances."""
+
+    name = "osrm"
+
+    def __init__(self, urls: list[str] = OSRM_URLS):
+        self.urls = list(urls)
+        self.down = []
+        self._probe = None
+
+    def open(self) -> bool:
+        self._probe, healthy = asyncio.run(_probe(self.urls))
+        self.down = [url for url in self.urls if url.rstrip("/") not in healthy]
+        return self._probe is not None
+
+    def dataset_version(self) -> str | None:
+        return drivetime_cache.dataset_version(self._probe)
+
+    def describe(self) -> str:
+        mode = (f"table batches of {OSRM_TABLE_SIZE} coordinates"
+                if OSRM_TABLE_SIZE > 1 else "one request per pair")
+        urls = ", ".join(url + (" (down)" if url in self.down else "") for url in self.urls)
+        return f"OSRM at {urls} ({mode})"
+
+    def route(self, pairs: list[tuple], states: dict) -> dict:
+        return asyncio.run(_route_all(pairs, self.urls, self.down))
+
+
+# ---------------------------------------------------------------------------
+# Record / replay
+# ---------------------------------------------------------------------------
+
+class RecordingBackend(OsrmBackend):
+    """OSRM routing that also records the run's drive times for replay.
+
+    The recording is JSON lines: a {"dataset_version": ...} header, then one
+    [origin_lon, origin_lat, dest_lon, dest_lat, seconds] line per pair.
+    Each run rewrites it with every drive time it resolved, cached or
+    routed, so replaying it reproduces the run.
+    """
+
+    name = "record"
+
+    def __init__(self, path: str = ROUTING_RECORDING, urls: list[str] = OSRM_URLS):
+        super().__init__(urls)
+        self.path = path
+
+    def describe(self) -> str:
+        return f"{super().describe()}, recording to {self.path}"
+
+    def close(self, durations: dict) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".part"
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps({"dataset_version": self.dataset_version()}) + "\n")
+            for (origin, dest), seconds in durations.items():
+                f.write(json.dumps([*origin, *dest, seconds]) + "\n")
+        os.replace(tmp_path, self.path)
+        print(f"  Recorded {len(durations):,} drive times to {self.path}")
+
+
+class ReplayBackend(RoutingBackend):
+    """Drive times replayed from a recording; pairs it lacks are unanswered."""
+
+    name = "replay"
+
+    def __init__(self, path: str = ROUTING_RECORDING):
+        self.path = path
+        self.version = None
+        self.recorded = {}
+
+    def open(self) -> bool:
+        if not os.path.exists(self.path):
+            print(f"  No recording at {self.path}")
+            return False
+        with open(self.path) as f:
+            self.version = json.loads(f.readline())["dataset_version"]
+            for line in f:
+                o_lon, o_lat, d_lon, d_lat, seconds = json.loads(line)
+                self.recorded[drivetime_cache.quantize(((o_lon, o_lat), (d_lon, d_lat)))] = seconds
+        return True
+
+    def dataset_version(self) -> str | None:
+        return self.version
+
+    def describe(self) -> str:
+        return f"replay of {len(self.recorded):,} drive times from {self.path}"
+
+    def route(self, pairs: list[tuple], states: dict) -> dict:
+        durations = {}
+        for pair in pairs:
+            key = drivetime_cache.quantize(pair)
+            if key in self.recorded:
+                durations[pair] = self.recorded[key]
+        return durations
+
+
+# ---------------------------------------------------------------------------
+# Proxy model
+# ---------------------------------------------------------------------------
+
+def haversine_miles(o_lon, o_lat, d_lon, d_lat) -> np.ndarray:
+    """Great-circle miles between origin and destination arrays."""
+    o_lon, o_lat, d_lon, d_lat = (np.radians(np.asarray(a, dtype=np.float64))
+                                  for a in (o_lon, o_lat, d_lon, d_lat))
+    a = (np.sin((d_lat - o_lat) / 2) ** 2
+         + np.cos(o_lat) * np.cos(d_lat) * np.sin((d_lon - o_lon) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(a))
+
+
+class ProxyModel:
+    """Drive minutes per straight-line mile by origin state and distance band.
+
+    Each (state, band) with at least MIN_SAMPLES routed pairs gets the
+    median minutes-per-mile of its pairs; other states use the band's
+    national median, and bands without data DRIVETIME_PROXY_FACTOR.
+    """
+
+    def __init__(self, states: list[str], factors: np.ndarray, band_factors: np.ndarray):
+        self.state_idx = {state: i for i, state in enumerate(states)}
+        self.factors = factors  # (n_states, n_bands), NaN where unfitted
+        self.band_factors = band_factors  # (n_bands,)
+
+    @staticmethod
+    def band(miles: np.ndarray) -> np.ndarray:
+        return np.searchsorted(DISTANCE_BANDS, miles, side="right")
+
+    @classmethod
+    def fit(cls, states: np.ndarray, miles: np.ndarray, minutes: np.ndarray) -> "ProxyModel":
+        n_bands = len(DISTANCE_BANDS) + 1
+        usable = miles > 0.5  # minutes per mile is meaningless for tiny hops
+        states, miles, minutes = states[usable], miles[usable], minutes[usable]
+        ratio = minutes / miles
+        bands = cls.band(miles)
+
+        band_factors = np.full(n_bands, DRIVETIME_PROXY_FACTOR)
+        for b in range(n_bands):
+            in_band = bands == b
+            if in_band.sum() >= MIN_SAMPLES:
+                band_factors[b] = np.median(ratio[in_band])
+
+        state_list = sorted(set(states.tolist()))
+        state_idx = {state: i for i, state in enumerate(state_list)}
+        state_codes = np.array([state_idx[s] for s in states], dtype=np.int64)
+        factors = np.full((len(state_list), n_bands), np.nan)
+        for s in range(len(state_list)):
+            in_state = state_codes == s
+            for b in range(n_bands):
+                cell = in_state & (bands == b)
+                if cell.sum() >= MIN_SAMPLES:
+                    factors[s, b] = np.median(ratio[cell])
+        return cls(state_list, factors, band_factors)
+
+    def predict(self, states: list[str], miles: np.ndarray) -> np.ndarray:
+        """Drive minutes for straight-line `miles` from origins in `states`."""
+        bands = self.band(miles)
+        factor = self.band_factors[bands]
+        idx = np.array([self.state_idx.get(s, -1) for s in states], dtype=np.int64)
+        known = idx >= 0
+        if known.any():
+            fitted = self.factors[idx[known], bands[known]]
+            factor[known] = np.where(np.isnan(fitted), factor[known], fitted)
+        return miles * factor
+
+
+class ProxyBackend(RoutingBackend):
+    """Drive times estimated by a ProxyModel fitted on drivetime_cache.
+
+    Fits and reads only the cache of the most recently routed dataset, so
+    pairs OSRM has routed before keep their real drive times, only the
+    rest are estimated, and older road networks do not enter the fit.
+    """
+
+    name = "proxy"
+    estimated = True
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.version = None
+        self.model = None
+        self.n_fitted = 0
+
+    def open(self) -> bool:
+        scale = 10 ** DRIVETIME_CACHE_DECIMALS
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT dataset_version FROM drivetime_cache
+                ORDER BY routed_at DESC LIMIT 1
+            """)
+            row = cur.fetchone()
+            self.version = row[0] if row else None
+            cur.execute(f"""
+                WITH origins AS (
+                    SELECT state_abbr,
+                        ROUND(ST_X(centroid) * {scale})::BIGINT AS lon,
+                        ROUND(ST_Y(centroid) * {scale})::BIGINT AS lat
+                    FROM counties WHERE centroid IS NOT NULL
+                    UNION
+                    SELECT state_abbr,
+                        ROUND(ST_X(centroid) * {scale})::BIGINT,
+                        ROUND(ST_Y(centroid) * {scale})::BIGINT
+                    FROM zipcodes WHERE centroid IS NOT NULL
+                )
+                SELECT DISTINCT ON (dc.origin_lon, dc.origin_lat, dc.dest_lon, dc.dest_lat)
+                    o.state_abbr, dc.origin_lon, dc.origin_lat, dc.dest_lon, dc.dest_lat,
+                    dc.duration_seconds
+                FROM drivetime_cache dc
+                JOIN origins o ON o.lon = dc.origin_lon AND o.lat = dc.origin_lat
+                WHERE dc.dataset_version = %s
+                  AND dc.duration_seconds IS NOT NULL
+                ORDER BY dc.origin_lon, dc.origin_lat, dc.dest_lon, dc.dest_lat, o.state_abbr
+            """, (self.version,))
+            rows = cur.fetchall()
+        self.conn.commit()
+
+        self.n_fitted = len(rows)
+        states = np.array([r[0] for r in rows], dtype=object)
+        coords = np.array([r[1:5] for r in rows], dtype=np.float64).reshape(-1, 4) / scale
+        minutes = np.array([r[5] for r in rows], dtype=np.float64) / 60.0
+        miles = haversine_miles(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3])
+        self.model = ProxyModel.fit(states, miles, minutes)
+        return True
+
+    def dataset_version(self) -> str | None:
+        return self.version
+
+    def describe(self) -> str:
+        return (f"proxy model fitted on {self.n_fitted:,} routed pairs "
+                f"({len(self.model.state_idx)} states)")
+
+    def route(self, pairs: list[tuple], states: dict) -> dict:
+        if not pairs:
+            return {}
+        coords = np.array([(*o, *d) for o, d in pairs], dtype=np.float64)
+        miles = haversine_miles(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3])
+        minutes = self.model.predict([states.get(o) for o, _ in pairs], miles)
+        return {pair: float(m) * 60.0 for pair, m in zip(pairs, minutes)}
+
+
+def get_backend(name: str, conn) -> RoutingBackend:
+    """Routing backend by name: osrm, record, replay or proxy."""
+    if name == "osrm":
+        return OsrmBackend()
+    if name == "record":
+        return RecordingBackend()
+    if name == "replay":
+        return ReplayBackend()
+    if name == "proxy":
+        return ProxyBackend(conn)
+    raise ValueError(f"Unknown routing backend: {name}")
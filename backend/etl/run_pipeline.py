@@ -4,10 +4,23 @@ Connects to the database and runs:
 1. download_data - download NPPES, Census files to SSD
 2. load_counties - parse Census Gazetteer + population -> counties table
 3. load_zipcodes - parse ZCTA Gazetteer + crosswalk -> zipcodes table
-4. load_providers - parse NPPES CSV (chunked) -> providers table
+4. load_providers - parse NPPES CSV -> providers table (sharded, or
+   streamed straight from the zip)
 5. compute_metrics - calculate per-county provider metrics
-6. compute_drivetimes - query OSRM for actual drive times (optional)
+6. compute_drivetimes - route drive times (OSRM, replay or proxy; optional)
 7. compute_scores - compute dearth scores from metrics
+
+Step 4 is followed by provider_sites, which collapses providers into
+distinct locations for the spatial searches of step 5.
+
+With --if-changed, the pipeline stops after step 1 when the inputs are
+the ones the last completed run processed (download_data.inputs_digest);
+a run that fails part-way does not count, so the next one retries.
+
+With --delta, steps 1-4 are replaced by applying a weekly NPPES delta
+file to the existing providers table (load_providers.run_incremental),
+and steps 5-6 only recompute the rows the changes can affect
+(compute_metrics.run_incremental).
 """
 
 import argparse
@@ -15,50 +28,79 @@ import time
 
 import psycopg2
 
-from .config import get_db_params
+from .config import DB_WORKERS, METRICS_ENGINE, ROUTING_BACKEND, get_db_params
 from . import download_data
 from . import load_counties
 from . import load_zipcodes
 from . import load_providers
+from . import provider_sites
 from . import compute_metrics
 from . import compute_drivetimes
 from . import compute_scores
 
 
-def run(skip_download: bool = False, skip_drivetimes: bool = False):
-    """Execute the full ETL pipeline."""
+def run(skip_download: bool = False, skip_drivetimes: bool = False,
+        workers: int = 1, extract_nppes: bool = False,
+        delta_path: str | None = None, provider_cache: bool = True,
+        resume: bool = False, if_changed: bool = False,
+        metrics_engine: str = METRICS_ENGINE, db_workers: int = DB_WORKERS,
+        routing_backend: str = ROUTING_BACKEND):
+    """Execute the full ETL pipeline (or a weekly delta refresh)."""
     print("=" * 60)
     print("Healthcare Dearth Map - Real Data ETL Pipeline")
     print("=" * 60)
     start = time.time()
 
     # Step 1: Download data files
-    if not skip_download:
-        download_data.run()
+    if delta_path:
+        print(f"[SKIP] Data download (applying delta {delta_path})")
+    elif not skip_download:
+        download_data.run(extract_nppes=extract_nppes)
     else:
         print("[SKIP] Data download (--skip-download)")
 
+    inputs = None if delta_path else download_data.inputs_digest()
+    if if_changed and inputs is not None and inputs == download_data.last_processed():
+        print("[SKIP] Database steps (inputs already processed, --if-changed)")
+        return
+
     # Step 2-7: Database operations
     db_params = get_db_params()
     print(f"Connecting to database: {db_params['dbname']}@{db_params['host']}:{db_params['port']}")
 
     conn = psycopg2.connect(**db_params)
     try:
-        # Step 2: Load counties
-        load_counties.run(conn)
+        if delta_path:
+            # Step 4 (incremental): Apply the weekly NPPES delta
+            load_providers.run_incremental(conn, delta_path)
+        else:
+            if resume:
+                print("[SKIP] County and ZCTA loads (--resume)")
+            else:
+                # Step 2: Load counties
+                load_counties.run(conn)
+
+                # Step 3: Load ZCTAs
+                load_zipcodes.run(conn)
 
-        # Step 3: Load ZCTAs
-        load_zipcodes.run(conn)
+            # Step 4: Load providers from NPPES
+            load_providers.run(
+                conn, workers=workers, use_cache=provider_cache, resume=resume,
+            )
 
-        # Step 4: Load providers from NPPES
-        load_providers.run(conn)
+        # Step 4b: Collapse providers into distinct sites
+        provider_sites.run(conn)
 
         # Step 5: Compute metrics
-        compute_metrics.run(conn)
+        row_ids = None
+        if delta_path:
+            row_ids = compute_metrics.run_incremental(conn, workers=db_workers)
+        else:
+            compute_metrics.run(conn, engine=metrics_engine, workers=db_workers)
 
         # Step 6: Compute drive times via OSRM
         if not skip_drivetimes:
-            compute_drivetimes.run(conn)
+            compute_drivetimes.run(conn, row_ids=row_ids, backend=routing_backend)
         else:
             print("[SKIP] Drive time computation (--skip-drivetimes)")
 
@@ -68,6 +110,9 @@ def run(skip_download: bool = False, skip_drivetimes: bool = False):
     finally:
         conn.close()
 
+    if inputs is not None:
+        download_data.mark_processed(inputs)
+
     elapsed = time.time() - start
     print("=" * 60)
     print(f"ETL Pipeline Complete! ({elapsed:.0f}s)")
@@ -86,5 +131,71 @@ if __name__ == "__main__":
         action="store_true",
         help="Skip OSRM drive time computation (use proxy values)",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes for parsing the NPPES CSV (default: 1)",
+    )
+    parser.add_argument(
+        "--extract-nppes",
+        action="store_true",
+        help="Extract the NPPES CSV to disk instead of streaming it from the zip",
+    )
+    parser.add_argument(
+        "--delta",
+        metavar="PATH",
+        help="Apply a weekly NPPES delta file (CSV or zip) instead of a full reload",
+    )
+    parser.add_argument(
+        "--no-provider-cache",
+        action="store_true",
+        help="Always parse the NPPES CSV; do not read or write the Parquet provider cache",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume an interrupted provider load from its last checkpoint "
+             "(counties and ZCTAs are assumed to be loaded already)",
+    )
+    parser.add_argument(
+        "--if-changed",
+        action="store_true",
+        help="Stop after downloading if the last completed run processed the same inputs",
+    )
+    parser.add_argument(
+        "--metrics-engine",
+        choices=["balltree", "postgis"],
+        default=METRICS_ENGINE,
+        help="Nearest-provider search: in-memory BallTree or PostGIS KNN "
+             f"(default: {METRICS_ENGINE})",
+    )
+    parser.add_argument(
+        "--db-workers",
+        type=int,
+        default=DB_WORKERS,
+        help="Database connections for per-specialty metric work "
+             f"(default: {DB_WORKERS})",
+    )
+    parser.add_argument(
+        "--routing-backend",
+        choices=["osrm", "record", "replay", "proxy"],
+        default=ROUTING_BACKEND,
+        help="Drive time source: live OSRM, OSRM + save a recording, replay the "
+             "recording, or a proxy model fitted on cached OSRM drive times "
+             f"(default: {ROUTING_BACKEND})",
+    )
     args = parser.parse_args()
-    run(skip_download=args.skip_download, skip_drivetimes=args.skip_drivetimes)
+    run(
+        skip_download=args.skip_download,
+        skip_drivetimes=args.skip_drivetimes,
+        workers=args.workers,
+        extract_nppes=args.extract_nppes,
+        delta_path=args.delta,
+        provider_cache=not args.no_provider_cache,
+        resume=args.resume,
+        if_changed=args.if_changed,
+        metrics_engine=args.metrics_engine,
+        db_workers=args.db_workers,
+        routing_backend=args.routing_backend,
+    )
@@ -0,0 +1,150 @@
+"""What-if scoring: re-score every geography under other weights in memory.
+
+Percentile ranks depend only on the metrics, not on the weights, so the
+engine loads dearth_scores once, ranks every scoring component once, and
+then evaluates any weight vector with a weighted sum and a label lookup
+(milliseconds for all counties, ZCTAs and specialties). Nothing is
+written back; compute_scores stores the weights in SCORE_WEIGHTS.
+
+Usage:
+    python -m backend.etl.scenarios --weights density=0.5,drivetime=0.5
+    python -m backend.etl.scenarios --weights density=1 \\
+        --weights density=0.4,drivetime=0.4,distance=0.2 --specialty cardiology
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from . import scoring
+from .config import SCORE_WEIGHTS
+
+
+class ScenarioEngine:
+    """Component scores of every dearth_scores row, ready for re-weighting."""
+
+    def __init__(self, data: dict[str, np.ndarray]):
+        self.geo_type = data["geo_type"]
+        self.geo_id = data["geo_id"]
+        self.specialty_code = data["specialty_code"]
+        self.scores = scoring.component_scores(data, scoring.COMPONENTS)
+        self.baseline_weights = scoring.check_weights(SCORE_WEIGHTS)
+        self.baseline_score, self.baseline_label = self.evaluate(self.baseline_weights)
+
+    @classmethod
+    def load(cls, conn) -> "ScenarioEngine":
+        with conn.cursor() as cur:
+            data = scoring.load_metrics(cur)
+        conn.commit()
+        return cls(data)
+
+    def __len__(self) -> int:
+        return len(self.geo_id)
+
+    def evaluate(self, weights: dict[str, float],
+                 mask: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """Dearth scores and labels under `weights` of every row, or the `mask` rows."""
+        weights = scoring.check_weights(weights)
+        scores = self.scores if mask is None else {
+            name: self.scores[name][mask] for name in weights
+        }
+        dearth = scoring.composite(scores, weights)
+        return dearth, scoring.labels(dearth)
+
+    def select(self, geo_type: str | None = None, specialty: str | None = None) -> np.ndarray:
+        """Boolean mask of the rows of one geography type and/or specialty."""
+        mask = np.ones(len(self), dtype=bool)
+        if geo_type:
+            mask &= self.geo_type == geo_type
+        if specialty:
+            mask &= self.specialty_code == specialty
+        return mask
+
+    def compare(self, weights: dict[str, float], mask: np.ndarray | None = None) -> dict:
+        """Summary of a scenario against the SCORE_WEIGHTS baseline.
+
+        Label counts of both, how many rows change label (toward a worse or
+        a better band), and the mean and largest absolute score shift.
+        """
+        weights = scoring.check_weights(weights)
+        if mask is None:
+            mask = np.ones(len(self), dtype=bool)
+        dearth = scoring.composite({name: self.scores[name][mask] for name in weights}, weights)
+        base = self.baseline_score[mask]
+
+        band, base_band = scoring.bands(dearth), scoring.bands(base)
+        counts = np.bincount(band, minlength=len(scoring.LABELS))
+        base_counts = np.bincount(base_band, minlength=len(scoring.LABELS))
+        shift = np.abs(dearth - base)
+        return {
+            "weights": weights,
+            "baseline_weights": self.baseline_weights,
+            "rows": int(mask.sum()),
+            "labels": dict(zip(scoring.LABELS, counts.tolist())),
+            "baseline_labels": dict(zip(scoring.LABELS, base_counts.tolist())),
+            "label_changes": int((band != base_band).sum()),
+            "worse": int((band > base_band).sum()),
+            "better": int((band < base_band).sum()),
+            "mean_abs_shift": float(shift.mean()) if len(shift) else 0.0,
+            "max_abs_shift": float(shift.max()) if len(shift) else 0.0,
+        }
+
+
+def _print_comparison(name: str, summary: dict) -> None:
+    weights = ", ".join(f"{c}={w:g}" for c, w in summary["weights"].items())
+    print(f"  {name}: {weights} ({summary['rows']:,} rows)")
+    for label in scoring.LABELS:
+        before = summary["baseline_labels"][label]
+        after = summary["labels"][label]
+        print(f"    {label:<22} {before:>8,} -> {after:>8,} ({after - before:+,})")
+    print(f"    label changes: {summary['label_changes']:,} "
+          f"(worse {summary['worse']:,}, better {summary['better']:,}) | "
+          f"score shift mean {summary['mean_abs_shift']:.1f}, "
+          f"max {summary['max_abs_shift']:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare dearth score weightings against SCORE_WEIGHTS"
+    )
+    parser.add_argument(
+        "--weights", action="append", required=True,
+        help='Weight vector, e.g. "density=0.5,drivetime=0.5" (repeatable)',
+    )
+    parser.add_argument("--geo-type", choices=["county", "zipcode"], default="county")
+    parser.add_argument("--specialty", help="Only this specialty code")
+    args = parser.parse_args()
+
+    try:
+        scenarios = [scoring.parse_weights(w) for w in args.weights]
+    except ValueError as e:
+        parser.error(str(e))
+
+    import psycopg2
+    from .config import get_db_params
+
+    print("=== Weighting Scenarios ===")
+    conn = psycopg2.connect(**get_db_params())
+    try:
+        start = time.perf_counter()
+        engine = ScenarioEngine.load(conn)
+    finally:
+        conn.close()
+    print(f"  Loaded and ranked {len(engine):,} rows in {time.perf_counter() - start:.2f}s")
+
+    mask = engine.select(args.geo_type, args.specialty)
+    scope = args.geo_type + (f" / {args.specialty}" if args.specialty else "")
+    print(f"  Baseline: {', '.join(f'{c}={w:g}' for c, w in engine.baseline_weights.items())} "
+          f"| scope: {scope}")
+    for i, weights in enumerate(scenarios, start=1):
+        start = time.perf_counter()
+        summary = engine.compare(weights, mask)
+        elapsed = time.perf_counter() - start
+        _print_comparison(f"Scenario {i} ({elapsed * 1000:.0f} ms)", summary)
+
+    print("=== Weighting Scenarios Complete ===")
+
+
+if __name__ == "__main__":
+    main()
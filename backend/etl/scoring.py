@@ -0,0 +1,173 @@
+"""Vectorized dearth scoring.
+
+Each scoring component turns one metric column of dearth_scores into a
+0-100 score (higher = worse access) from its percentile rank within the
+(geo_type, specialty) partition. The dearth score is the weighted sum of
+the component scores, and the label follows from DEARTH_LABELS.
+
+Percentile ranks reproduce PostgreSQL's PERCENT_RANK() OVER (PARTITION BY
+geo_type, specialty_code ORDER BY metric): (rank - 1) / (rows - 1), tied
+values share the lowest rank, NULLs sort last (and tie with each other),
+and a single-row partition ranks 0.
+
+compute_scores scores the whole table this way in one pass; scenarios
+reuses it to re-score under other weights.
+"""
+
+import numpy as np
+
+from .config import DEARTH_LABELS
+
+# Scoring components: name -> (metric column, score column, higher metric
+# is worse access). A component is scored when it has a weight.
+COMPONENTS = {
+    "density": ("provider_density", "density_score", False),
+    "distance": ("nearest_distance_miles", "distance_score", True),
+    "drivetime": ("drive_time_minutes", "drivetime_score", True),
+    "waittime": ("wait_time_days", "waittime_score", True),
+}
+
+MISSING_SCORE = 50.0  # stands in for a NULL component score in the composite
+
+_LABEL_THRESHOLDS = np.array([threshold for threshold, _ in DEARTH_LABELS], dtype=np.float64)
+LABELS = np.array([label for _, label in DEARTH_LABELS], dtype=object)
+
+
+METRICS_QUERY = f"""
+    SELECT id, geo_type, geo_id, specialty_code,
+           {', '.join(metric for metric, _, _ in COMPONENTS.values())}
+    FROM dearth_scores
+    ORDER BY id
+"""
+
+
+def metrics_from_rows(rows) -> dict[str, np.ndarray]:
+    """Arrays of METRICS_QUERY result rows, keyed by column name.
+
+    Adds "partition": an integer code per (geo_type, specialty_code).
+    NULL metrics are NaN.
+    """
+    data = {
+        "id": np.array([r[0] for r in rows], dtype=np.int64),
+        "geo_type": np.array([r[1] for r in rows], dtype=object),
+        "geo_id": np.array([r[2] for r in rows], dtype=object),
+        "specialty_code": np.array([r[3] for r in rows], dtype=object),
+    }
+    for i, (metric, _, _) in enumerate(COMPONENTS.values(), start=4):
+        data[metric] = np.array(
+            [np.nan if r[i] is None else r[i] for r in rows], dtype=np.float64,
+        )
+    keys = [f"{g}\t{s}" for g, s in zip(data["geo_type"], data["specialty_code"])]
+    _, data["partition"] = np.unique(np.array(keys, dtype=object), return_inverse=True)
+    return data
+
+
+def load_metrics(cur) -> dict[str, np.ndarray]:
+    """Load ids, partitions and every component metric of dearth_scores."""
+    cur.execute(METRICS_QUERY)
+    return metrics_from_rows(cur.fetchall())
+
+
+def percent_rank(partition: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """PERCENT_RANK() of `values` (NaN = NULL, sorted last) within partitions."""
+    n = len(values)
+    if n == 0:
+        return np.zeros(0)
+    # Sort by value (NumPy sorts NaN last), then stably by partition; small
+    # integer partition codes take NumPy's radix sort.
+    order = np.argsort(values)
+    keys = partition.astype(np.int16) if partition.max() < 2 ** 15 else partition
+    order = order[np.argsort(keys[order], kind="stable")]
+    part, vals = partition[order], values[order]
+    nulls = np.isnan(vals)
+
+    positions = np.arange(n)
+    new_part = np.ones(n, dtype=bool)
+    new_part[1:] = part[1:] != part[:-1]
+    part_start = np.maximum.accumulate(np.where(new_part, positions, 0))
+    part_size = np.bincount(part, minlength=part.max() + 1)[part]
+
+    # A tie run starts at a new partition or a different value (NULLs tie)
+    same = (vals[1:] == vals[:-1]) | (nulls[1:] & nulls[:-1])
+    new_tie = new_part.copy()
+    new_tie[1:] |= ~same
+    rank0 = np.maximum.accumulate(np.where(new_tie, positions, 0)) - part_start
+
+    ranks = np.zeros(n)
+    multi = part_size > 1
+    ranks[multi] = rank0[multi] / (part_size[multi] - 1)
+    out = np.empty(n)
+    out[order] = ranks
+    return out
+
+
+def component_scores(data: dict[str, np.ndarray], names) -> dict[str, np.ndarray]:
+    """0-100 score (higher = worse access) of each named component."""
+    scores = {}
+    for name in names:
+        metric, _, higher_is_worse = COMPONENTS[name]
+        rank = percent_rank(data["partition"], data[metric])
+        scores[name] = 100.0 * (rank if higher_is_worse else 1.0 - rank)
+    return scores
+
+
+def composite(scores: dict[str, np.ndarray], weights: dict[str, float]) -> np.ndarray:
+    """Weighted dearth score in [0, 100]; NULL component scores count as 50."""
+    total = None
+    for name, weight in weights.items():
+        term = weight * np.where(np.isnan(scores[name]), MISSING_SCORE, scores[name])
+        total = term if total is None else total + term
+    return np.clip(total, 0.0, 100.0)
+
+
+def bands(dearth: np.ndarray) -> np.ndarray:
+    """Index into DEARTH_LABELS of each score (upper bounds inclusive)."""
+    return np.minimum(np.searchsorted(_LABEL_THRESHOLDS, dearth, side="left"), len(LABELS) - 1)
+
+
+def labels(dearth: np.ndarray) -> np.ndarray:
+    """Dearth label of each score (per DEARTH_LABELS)."""
+    out = LABELS[bands(dearth)]
+    out[np.isnan(dearth)] = None
+    return out
+
+
+def check_weights(weights: dict[str, float]) -> dict[str, float]:
+    """Validate a {component name: weight} vector; zero weights are dropped."""
+    unknown = set(weights) - set(COMPONENTS)
+    if unknown:
+        raise ValueError(
+            f"Unknown scoring components {sorted(unknown)}; "
+            f"expected some of {sorted(COMPONENTS)}"
+        )
+    weights = {name: float(w) for name, w in weights.items() if w}
+    if not weights:
+        raise ValueError("At least one scoring component needs a non-zero weight")
+    return weights
+
+
+def parse_weights(text: str) -> dict[str, float]:
+    """Parse "density=0.5,drivetime=0.5" into a checked weight vector."""
+    weights = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        name, sep, weight = item.partition("=")
+        if not sep:
+            raise ValueError(f"Expected component=weight, got {item.strip()!r}")
+        try:
+            weights[name.strip()] = float(weight)
+        except ValueError:
+            raise ValueError(f"Invalid weight for {name.strip()!r}: {weight!r}") from None
+    return check_weights(weights)
+
+
+def score(data: dict[str, np.ndarray], weights: dict[str, float]) -> dict[str, np.ndarray]:
+    """Component scores, dearth score and label of every row.
+
+    Returns {component name: scores, "dearth_score": ..., "dearth_label": ...}.
+    """
+    result = component_scores(data, weights)
+    result["dearth_score"] = composite(result, weights)
+    result["dearth_label"] = labels(result["dearth_score"])
+    return result
@@ -19,6 +19,10 @@ PBF_URL="https://download.geofabrik.de/north-america/us-latest.osm.pbf"
 PBF_FILE="${DATA_DIR}/raw/us-latest.osm.pbf"
 ROADS_PBF="${OSRM_DIR}/us-roads.osm.pbf"
 OSRM_IMAGE="osrm/osrm-backend:latest"
+# Road-network version stamped into the extract (osrm-extract --data_version).
+# drivetime_cache keys cached drive times by it, so a rebuilt network never
+# reuses the previous one's. Defaults to the PBF's replication timestamp.
+DATA_VERSION="${OSRM_DATASET_VERSION:-}"
 
 mkdir -p "${OSRM_DIR}"
 
@@ -28,7 +32,8 @@ if [ -f "${PBF_FILE}" ]; then
     echo "  Size: $(du -h "${PBF_FILE}" | cut -f1)"
 else
     echo "Downloading US PBF from Geofabrik (~9GB)..."
-    curl -L -o "${PBF_FILE}" "${PBF_URL}"
+    # Parallel ranged download; re-running resumes an interrupted .part file
+    python -m backend.etl.download_data --url "${PBF_URL}" --dest "${PBF_FILE}"
     echo "  Downloaded: $(du -h "${PBF_FILE}" | cut -f1)"
 fi
 
@@ -50,11 +55,19 @@ fi
 if [ -f "${OSRM_DIR}/us-roads.osrm" ]; then
     echo "OSRM extract already exists, skipping..."
 else
-    echo "Running OSRM extract (this takes 10-20 minutes)..."
+    if [ -z "${DATA_VERSION}" ]; then
+        PBF_STAMP="$(osmium fileinfo -g header.option.osmosis_replication_timestamp "${PBF_FILE}" 2>/dev/null || true)"
+        if [ -z "${PBF_STAMP}" ]; then
+            # No replication timestamp in the header: use the PBF's mtime
+            PBF_STAMP="$(date -r "${PBF_FILE}" +%Y-%m-%dT%H:%M:%S)"
+        fi
+        DATA_VERSION="us-roads-${PBF_STAMP}"
+    fi
+    echo "Running OSRM extract (this takes 10-20 minutes), data version ${DATA_VERSION}..."
     docker run --rm -t \
         -v "${OSRM_DIR}:/data" \
         "${OSRM_IMAGE}" \
-        osrm-extract -p /opt/car.lua /data/us-roads.osm.pbf
+        osrm-extract -p /opt/car.lua --data_version "${DATA_VERSION}" /data/us-roads.osm.pbf
 fi
 
 # ─── Step 4: OSRM Partition ──────────────────────────────────────────
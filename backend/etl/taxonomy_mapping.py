@@ -194,6 +194,20 @@ SPECIALTY_DISPLAY_NAMES: dict[str, str] = {
     "pediatrics": "Pediatrics",
 }
 
+# Specialty codes in a fixed order (matches the seed order in db/schema.sql)
+SPECIALTY_CODES: list[str] = list(SPECIALTY_DISPLAY_NAMES)
+
+# Specialty code -> bit in providers.specialty_mask / provider_sites.specialty_mask
+SPECIALTY_BITS: dict[str, int] = {code: 1 << i for i, code in enumerate(SPECIALTY_CODES)}
+
+
+def specialty_mask(specialties: list[str]) -> int:
+    """Encode specialty codes as a SPECIALTY_BITS bitmask."""
+    mask = 0
+    for code in specialties:
+        mask |= SPECIALTY_BITS[code]
+    return mask
+
 # Reverse mapping: specialty code -> list of taxonomy codes
 SPECIALTY_TAXONOMIES: dict[str, list[str]] = {}
 for taxonomy, specialty in SPECIALTY_MAPPING.items():
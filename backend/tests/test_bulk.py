@@ -0,0 +1,49 @@
+"""COPY encoding and the UPDATE ... FROM statement of etl.bulk."""
+
+import numpy as np
+
+from backend.etl import bulk
+
+
+class FakeCursor:
+    """Records executed SQL and COPY payloads."""
+
+    def __init__(self, rowcount=0):
+        self.statements = []
+        self.copied = []
+        self.rowcount = rowcount
+
+    def execute(self, sql, params=None):
+        self.statements.append(" ".join(sql.split()))
+
+    def copy_expert(self, sql, buf):
+        self.copied.append((" ".join(sql.split()), buf.read()))
+
+
+def test_copy_values_encode_nulls_and_escapes():
+    assert bulk._copy_value(None) == r"\N"
+    assert bulk._copy_value(float("nan")) == r"\N"
+    assert bulk._copy_value(np.float64("nan")) == r"\N"
+    assert bulk._copy_value(np.float64(1.5)) == "1.5"
+    assert bulk._copy_value(np.int64(7)) == "7"
+    assert bulk._copy_value(np.bool_(True)) == "t"
+    assert bulk._copy_value(False) == "f"
+    assert bulk._copy_value("a\tb\nc\\d") == "a\\tb\\nc\\\\d"
+
+
+def test_update_from_copies_rows_and_applies_where():
+    cur = FakeCursor(rowcount=1)
+    updated = bulk.update_from(
+        cur, "dearth_scores", [("id", "INTEGER"), ("dearth_score", "FLOAT")],
+        [(1, 12.5), (2, None)], key=["id"],
+        where="t.dearth_score IS DISTINCT FROM v.dearth_score",
+    )
+
+    assert updated == 1
+    assert cur.copied == [("COPY bulk_dearth_scores (id, dearth_score) FROM STDIN",
+                           "1\t12.5\n2\t\\N\n")]
+    update = next(s for s in cur.statements if s.startswith("UPDATE"))
+    assert update == ("UPDATE dearth_scores t SET dearth_score = v.dearth_score "
+                      "FROM bulk_dearth_scores v WHERE t.id = v.id AND "
+                      "t.dearth_score IS DISTINCT FROM v.dearth_score")
+    assert cur.statements[-1] == "DROP TABLE bulk_dearth_scores"
@@ -0,0 +1,155 @@
+"""Conditional, resumable downloads against a local HTTP server."""
+
+import hashlib
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from backend.etl import download_data
+
+
+class FileServer(ThreadingHTTPServer):
+    """Serves one in-memory file with ETag, HEAD, Range and If-Range support."""
+
+    daemon_threads = True
+
+    def __init__(self, payload: bytes, etag: str):
+        super().__init__(("127.0.0.1", 0), FileHandler)
+        self.payload = payload
+        self.etag = etag
+        self.truncate = 0  # GET responses to cut off halfway (an interrupted download)
+        self.gets = []  # Range header of every GET (None for a full request)
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/data.bin"
+
+
+class FileHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        if self.headers.get("If-None-Match") == self.server.etag:
+            self.send_response(304)
+            self.send_header("ETag", self.server.etag)
+            self.end_headers()
+            return
+        self._send(200, self.server.payload, head=True)
+
+    def do_GET(self):
+        server = self.server
+        range_header = self.headers.get("Range")
+        with server.lock:
+            server.gets.append(range_header)
+            cut = server.truncate > 0
+            server.truncate -= cut
+        if_range = self.headers.get("If-Range")
+        if range_header and if_range in (None, server.etag):
+            start, end = re.match(r"bytes=(\d+)-(\d*)", range_header).groups()
+            end = int(end) if end else len(server.payload) - 1
+            body = server.payload[int(start):end + 1]
+            self._send(206, body, content_range=f"bytes {start}-{end}/{len(server.payload)}",
+                       cut=cut)
+        else:
+            self._send(200, server.payload, cut=cut)
+
+    def _send(self, status, body, head=False, content_range=None, cut=False):
+        self.send_response(status)
+        self.send_header("ETag", self.server.etag)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(body)))
+        if content_range:
+            self.send_header("Content-Range", content_range)
+        self.end_headers()
+        if head:
+            return
+        self.wfile.write(body[:len(body) // 2] if cut else body)
+        self.wfile.flush()
+        self.close_connection = True
+
+
+@pytest.fixture
+def server():
+    server = FileServer(os.urandom(256 * 1024), '"v1"')
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(download_data, "CHUNK_SIZE", 4096)
+
+
+def test_interrupted_ranged_download_resumes_byte_identical(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(download_data, "RANGE_THRESHOLD", 64 * 1024)
+    monkeypatch.setattr(download_data, "RANGE_SEGMENTS", 4)
+    dest = str(tmp_path / "data.bin")
+
+    server.truncate = 4  # every segment stops halfway
+    with pytest.raises((requests.RequestException, OSError)):
+        download_data._download_file(server.url, dest, "test file")
+    assert os.path.exists(dest + ".part") and os.path.exists(dest + ".part.json")
+    assert not os.path.exists(dest)
+
+    server.gets.clear()
+    entry, changed = download_data._download_file(server.url, dest, "test file")
+    assert changed
+    with open(dest, "rb") as f:
+        assert f.read() == server.payload
+    # Only the missing second half of each segment was requested again
+    seg_size = len(server.payload) // 4
+    assert sorted(server.gets) == sorted(
+        f"bytes={i * seg_size + seg_size // 2}-{(i + 1) * seg_size - 1}" for i in range(4)
+    )
+    assert not os.path.exists(dest + ".part.json")
+
+
+def test_unchanged_file_is_skipped_without_get(server, tmp_path):
+    dest = str(tmp_path / "data.bin")
+    entry, changed = download_data._download_file(server.url, dest, "test file")
+    assert changed and len(server.gets) == 1
+
+    again, changed = download_data._download_file(server.url, dest, "test file", entry=entry)
+    assert not changed
+    assert again == entry
+    assert len(server.gets) == 1
+
+
+def test_changed_etag_forces_full_download(server, tmp_path):
+    dest = str(tmp_path / "data.bin")
+    entry, _ = download_data._download_file(server.url, dest, "test file")
+
+    # A stale partial download of the old version must not be resumed either
+    with open(dest + ".part", "wb") as f:
+        f.write(server.payload[:1000])
+    server.payload, server.etag = os.urandom(200 * 1024), '"v2"'
+    server.gets.clear()
+
+    new_entry, changed = download_data._download_file(server.url, dest, "test file", entry=entry)
+    assert changed
+    assert server.gets == [None]
+    with open(dest, "rb") as f:
+        assert f.read() == server.payload
+    assert new_entry["etag"] == '"v2"'
+
+
+def test_manifest_records_sha256_and_validators(server, tmp_path):
+    dest = str(tmp_path / "data.bin")
+    entry, _ = download_data._download_file(server.url, dest, "test file")
+    assert entry == {
+        "url": server.url,
+        "etag": '"v1"',
+        "last_modified": None,
+        "size": len(server.payload),
+        "sha256": hashlib.sha256(server.payload).hexdigest(),
+    }
@@ -0,0 +1,52 @@
+"""Routing backends: the fitted proxy model and record/replay."""
+
+import numpy as np
+import pytest
+
+from backend.etl import drivetime_cache, routing
+from backend.etl.config import DRIVETIME_PROXY_FACTOR
+
+
+def test_proxy_model_fits_state_and_band_factors():
+    n = routing.MIN_SAMPLES
+    states = np.array(["CO"] * n + ["KS"] * n + ["NE"] * 3)
+    miles = np.full(len(states), 20.0)  # one distance band
+    minutes = np.concatenate([np.full(n, 40.0), np.full(n, 20.0), np.full(3, 100.0)])
+    model = routing.ProxyModel.fit(states, miles, minutes)
+
+    predicted = model.predict(["CO", "KS", "NE", "TX"], np.array([10.0, 10.0, 10.0, 10.0]))
+    band_median = np.median(minutes / miles)
+    # Fitted states use their own factor; sparse and unseen states the band median
+    np.testing.assert_allclose(predicted, [20.0, 10.0, 10 * band_median, 10 * band_median])
+
+    # Bands without enough samples fall back to DRIVETIME_PROXY_FACTOR
+    np.testing.assert_allclose(model.predict(["CO"], np.array([200.0])),
+                               [200.0 * DRIVETIME_PROXY_FACTOR])
+
+
+def test_abstract_backend_cannot_be_instantiated():
+    with pytest.raises(TypeError):
+        routing.RoutingBackend()
+
+
+def test_replay_reproduces_a_recording(tmp_path, monkeypatch):
+    monkeypatch.setattr(drivetime_cache, "OSRM_DATASET_VERSION", "")
+    path = str(tmp_path / "routes.jsonl")
+    recorder = routing.RecordingBackend(path, urls=[])
+    recorder._probe = {"data_version": "us-roads-2026-01-01"}
+    routed = {((-104.99, 39.74), (-105.27, 40.01)): 1830.5,
+              ((-97.34, 37.69), (-98.49, 29.42)): None}  # OSRM "no route"
+    recorder.close(routed)
+
+    replay = routing.ReplayBackend(path)
+    assert replay.open()
+    assert replay.dataset_version() == "us-roads-2026-01-01"
+    # Pairs match on quantized coordinates; unrecorded pairs stay unanswered
+    nearby = ((-104.99 + 1e-9, 39.74), (-105.27, 40.01))
+    unrecorded = ((-100.0, 40.0), (-101.0, 41.0))
+    durations = replay.route([nearby, ((-97.34, 37.69), (-98.49, 29.42)), unrecorded], {})
+    assert durations == {nearby: 1830.5, ((-97.34, 37.69), (-98.49, 29.42)): None}
+
+
+def test_replay_without_a_recording_does_not_open(tmp_path):
+    assert not routing.ReplayBackend(str(tmp_path / "missing.jsonl")).open()
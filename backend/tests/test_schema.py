@@ -0,0 +1,39 @@
+"""upgrade.sql stays in step with schema.sql."""
+
+import os
+import re
+
+from backend.etl.taxonomy_mapping import SPECIALTY_BITS
+
+DB_DIR = os.path.join(os.path.dirname(__file__), "..", "db")
+
+
+def _read(name: str) -> str:
+    with open(os.path.join(DB_DIR, name)) as f:
+        return f.read()
+
+
+def _statements(sql: str) -> dict[str, str]:
+    """CREATE TABLE/INDEX statements by object name, IF NOT EXISTS removed."""
+    sql = sql.replace(" IF NOT EXISTS", "")
+    found = re.findall(r"^(CREATE (?:TABLE|INDEX) (\w+).*?;)$", sql, re.MULTILINE | re.DOTALL)
+    return {name: statement for statement, name in found}
+
+
+def test_upgrade_creates_objects_exactly_as_schema_does():
+    schema = _statements(_read("schema.sql"))
+    upgrade = _statements(_read("upgrade.sql"))
+    assert upgrade
+    for name, statement in upgrade.items():
+        assert statement == schema[name], name
+
+
+def test_upgrade_statements_are_idempotent():
+    sql = _read("upgrade.sql")
+    assert not re.search(r"^CREATE (TABLE|INDEX) (?!IF NOT EXISTS)", sql, re.MULTILINE)
+    assert not re.search(r"ADD COLUMN (?!IF NOT EXISTS)", sql)
+
+
+def test_upgrade_backfills_the_taxonomy_mapping_bits():
+    bits = re.findall(r"\('(\w+)', (\d+)\)", _read("upgrade.sql"))
+    assert {code: int(bit) for code, bit in bits} == SPECIALTY_BITS
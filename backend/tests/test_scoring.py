@@ -0,0 +1,79 @@
+"""PERCENT_RANK parity and label boundaries of etl.scoring."""
+
+import numpy as np
+import pytest
+
+from backend.etl import scoring
+
+nan = np.nan
+
+
+def test_percent_rank_matches_postgres():
+    # PERCENT_RANK() OVER (PARTITION BY p ORDER BY v): (rank - 1) / (n - 1),
+    # ties share the lowest rank, NULLs sort last and tie with each other.
+    partition = np.array([0, 0, 0, 0, 0, 0, 1, 1, 1])
+    values = np.array([3.0, 1.0, nan, 3.0, 2.0, nan, 5.0, 4.0, 4.0])
+    expected = np.array([0.4, 0.0, 0.8, 0.4, 0.2, 0.8, 1.0, 0.0, 0.0])
+    np.testing.assert_allclose(scoring.percent_rank(partition, values), expected)
+
+
+def test_percent_rank_single_row_and_empty_partitions():
+    partition = np.array([0, 1, 1, 2])
+    values = np.array([7.0, nan, 2.0, nan])
+    np.testing.assert_allclose(scoring.percent_rank(partition, values), [0.0, 1.0, 0.0, 0.0])
+    assert scoring.percent_rank(np.array([], dtype=np.int64), np.array([])).shape == (0,)
+
+
+def test_percent_rank_ignores_row_order():
+    rng = np.random.default_rng(0)
+    partition = rng.integers(0, 5, 200)
+    values = rng.integers(0, 10, 200).astype(float)
+    values[rng.random(200) < 0.1] = nan
+    ranks = scoring.percent_rank(partition, values)
+    perm = rng.permutation(200)
+    np.testing.assert_allclose(scoring.percent_rank(partition[perm], values[perm]), ranks[perm])
+
+
+def test_component_direction():
+    data = {
+        "partition": np.array([0, 0, 0]),
+        "provider_density": np.array([10.0, 20.0, 30.0]),
+        "drive_time_minutes": np.array([10.0, 20.0, 30.0]),
+    }
+    scores = scoring.component_scores(data, ["density", "drivetime"])
+    # Higher density is better access; longer drives are worse
+    np.testing.assert_allclose(scores["density"], [100.0, 50.0, 0.0])
+    np.testing.assert_allclose(scores["drivetime"], [0.0, 50.0, 100.0])
+
+
+def test_composite_weights_missing_scores_and_clipping():
+    scores = {"density": np.array([100.0, nan]), "drivetime": np.array([0.0, 100.0])}
+    np.testing.assert_allclose(
+        scoring.composite(scores, {"density": 0.6, "drivetime": 0.4}), [60.0, 70.0],
+    )
+    np.testing.assert_allclose(scoring.composite(scores, {"density": 2.0}), [100.0, 100.0])
+
+
+@pytest.mark.parametrize("score, label", [
+    (0.0, "Well Served"),
+    (20.0, "Well Served"),
+    (20.001, "Adequate"),
+    (40.0, "Adequate"),
+    (40.5, "Moderate Shortage"),
+    (60.0, "Moderate Shortage"),
+    (60.01, "Significant Shortage"),
+    (80.0, "Significant Shortage"),
+    (80.01, "Severe Shortage"),
+    (100.0, "Severe Shortage"),
+])
+def test_label_boundaries(score, label):
+    assert scoring.labels(np.array([score]))[0] == label
+
+
+def test_weights_validation():
+    assert scoring.parse_weights("density=0.5, drivetime=0.5,waittime=0") == {
+        "density": 0.5, "drivetime": 0.5,
+    }
+    for text in ("speed=1", "density", "density=x", "density=0"):
+        with pytest.raises(ValueError):
+            scoring.parse_weights(text)
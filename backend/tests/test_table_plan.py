@@ -0,0 +1,25 @@
+"""Batching of (origin, destination) pairs into OSRM /table requests."""
+
+import numpy as np
+
+from backend.etl import routing
+
+
+def test_plan_tables_covers_every_pair_within_the_coordinate_limit():
+    rng = np.random.default_rng(0)
+    origins = [(float(x), 0.0) for x in range(30)]
+    dests = [(0.0, float(y)) for y in range(12)]
+    pairs = list({(origins[i], dests[j])
+                  for i, j in zip(rng.integers(0, 30, 200), rng.integers(0, 12, 200))})
+
+    batches = routing._plan_tables(pairs, 10)
+    assert sorted(p for batch in batches for p in batch) == sorted(pairs)
+    for batch in batches:
+        assert len({o for o, _ in batch}) + len({d for _, d in batch}) <= 10
+
+
+def test_plan_tables_shares_destinations():
+    dest = (1.0, 1.0)
+    pairs = [((float(x), 0.0), dest) for x in range(5)]
+    assert routing._plan_tables(pairs, 100) == [sorted(pairs, key=lambda p: (p[1], p[0]))]
+    assert routing._plan_tables([], 100) == []